@@ -1,8 +1,13 @@
+import os
+import sys
 import pandas as pd
 
-# Load the CSV files
-pfsi_df = pd.read_csv('/home/abundis/PycharmProjects/HopeisHope/ds/csv/equi/llm_tatuajes_procesados_PFSI.csv')
-repd_df = pd.read_csv('/home/abundis/PycharmProjects/HopeisHope/ds/csv/equi/llm_tatuajes_procesados_REPD.csv')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ds'))
+from results_store import load_results
+
+# Load the LLM-processed datasets and the list of probable cases
+pfsi_df = load_results('llm_tatuajes_procesados_PFSI')
+repd_df = load_results('llm_tatuajes_procesados_REPD')
 matches_df = pd.read_csv('/home/abundis/PycharmProjects/HopeisHope/csv/cross_examples/person_matches_name_age.csv').sample(30000)
 
 # Function to compare locations
@@ -1,11 +1,9 @@
+import os
+import sys
 import pandas as pd
-import unidecode
 
-def normalize_text(text):
-    """Normalize text by lowercasing, removing accents, and trimming"""
-    if pd.isna(text):
-        return ''
-    return unidecode.unidecode(text.strip().lower())
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from text_normalization import normalize_series, normalize_text
 
 def preprocess_list_field(field):
     """Convert comma-separated values into a list of normalized strings"""
@@ -23,7 +21,7 @@ for df in [df1, df2]:
         lambda x: preprocess_list_field(x) if pd.notna(x) else [])
     df['categorias_processed'] = df['categorias'].apply(preprocess_list_field)
     df['palabras_clave_processed'] = df['palabras_clave'].apply(preprocess_list_field)
-    df['texto_extraido_processed'] = df['texto_extraido'].apply(normalize_text)
+    df['texto_extraido_processed'] = normalize_series(df['texto_extraido'])
 
 matches = []
 threshold = 5  # Minimum similarity score to consider a match
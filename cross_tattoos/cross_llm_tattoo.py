@@ -6,41 +6,38 @@ cross_llm_tattoo.py - Compares tattoos between two CSV files to find relationshi
 based on location, figure/category, and description
 """
 
+import os
+import sys
 import pandas as pd
-import re
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from tqdm import tqdm  # Add tqdm for progress bar
+from location_extractor import LOCATION_EXTRACTOR
 
-# File paths
-PFSI_FILE = '/home/abundis/PycharmProjects/HopeisHope/ds/csv/equi/llm_tatuajes_procesados_PFSI.csv'
-REPD_FILE = '/home/abundis/PycharmProjects/HopeisHope/ds/csv/equi/llm_tatuajes_procesados_REPD.csv'
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from text_normalization import preprocess_text
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ds'))
+from results_store import load_results
+
+# LLM-processed datasets (ds/csv/equi)
+PFSI_DATASET = 'llm_tatuajes_procesados_PFSI'
+REPD_DATASET = 'llm_tatuajes_procesados_REPD'
 MAX_ROWS = 1  # Number of rows to analyze from PFSI file
 
-def load_data(file_path, limit=None):
-    """Load data from CSV and limit to first n rows if limit is specified"""
+def load_data(dataset_name, limit=None):
+    """Load an LLM-processed dataset and limit to first n rows if limit is specified"""
     try:
-        df = pd.read_csv(file_path)
-        df = df[df['descripcion_original'].str.lower() != 'no presenta']  # Filter out records with 'No presenta'
+        df = load_results(dataset_name)
+        df = df[df['descripcion_original'].fillna('').str.lower() != 'no presenta']  # Filter out records with 'No presenta'
         if limit:
             df = df.head(limit)
-        print(f"Loaded {len(df)} records from {file_path}")
+        print(f"Loaded {len(df)} records from {dataset_name}")
         return df
     except Exception as e:
-        print(f"Error loading {file_path}: {e}")
+        print(f"Error loading {dataset_name}: {e}")
         return pd.DataFrame()
 
-def clean_text(text):
-    """Clean and normalize text for comparison"""
-    if pd.isna(text) or text is None:
-        return ""
-    
-    # Convert to lowercase and remove special characters
-    text = str(text).lower()
-    text = re.sub(r'[^\w\s]', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
 def calculate_text_similarity(text1, text2):
     """Calculate similarity between two texts using TF-IDF and cosine similarity"""
     if not text1 or not text2:
@@ -55,25 +52,18 @@ def calculate_text_similarity(text1, text2):
 
 def is_location_match(loc1, loc2, threshold=0.6):
     """Check if two tattoo locations match"""
-    loc1_clean = clean_text(loc1)
-    loc2_clean = clean_text(loc2)
-    
-    # Direct match for common body parts
-    body_parts = ['brazo', 'antebrazo', 'pierna', 'pecho', 'espalda', 'mano', 
-                 'hombro', 'cuello', 'tobillo', 'muñeca', 'torso', 'abdomen']
-    
-    for part in body_parts:
-        if part in loc1_clean and part in loc2_clean:
-            return True
+    # Direct match when both locations mention the same body part
+    if LOCATION_EXTRACTOR.body_parts(loc1) & LOCATION_EXTRACTOR.body_parts(loc2):
+        return True
     
     # If no direct match, use similarity score
-    return calculate_text_similarity(loc1_clean, loc2_clean) >= threshold
+    return calculate_text_similarity(preprocess_text(loc1), preprocess_text(loc2)) >= threshold
 
 def is_figure_match(cat1, cat2, keys1, keys2, threshold=0.5):
     """Check if tattoo figures/categories match"""
     # Combine categories and keywords for better matching
-    text1 = f"{clean_text(cat1)} {clean_text(keys1)}"
-    text2 = f"{clean_text(cat2)} {clean_text(keys2)}"
+    text1 = f"{preprocess_text(cat1)} {preprocess_text(keys1)}"
+    text2 = f"{preprocess_text(cat2)} {preprocess_text(keys2)}"
     
     # Check for common categories
     common_categories = ['religiosos', 'figura humana', 'animales', 'letras-números',
@@ -88,8 +78,8 @@ def is_figure_match(cat1, cat2, keys1, keys2, threshold=0.5):
 
 def is_description_match(desc1, desc2, threshold=0.5):
     """Check if tattoo descriptions match"""
-    desc1_clean = clean_text(desc1)
-    desc2_clean = clean_text(desc2)
+    desc1_clean = preprocess_text(desc1)
+    desc2_clean = preprocess_text(desc2)
     return calculate_text_similarity(desc1_clean, desc2_clean) >= threshold
 
 def find_tattoo_relationships(pfsi_df, repd_df):
@@ -153,8 +143,8 @@ def main():
     print("------------------------")
     
     # Load data
-    pfsi_data = load_data(PFSI_FILE, limit=MAX_ROWS)
-    repd_data = load_data(REPD_FILE)
+    pfsi_data = load_data(PFSI_DATASET, limit=MAX_ROWS)
+    repd_data = load_data(REPD_DATASET)
     
     if pfsi_data.empty or repd_data.empty:
         print("Error: One or both datasets could not be loaded.")
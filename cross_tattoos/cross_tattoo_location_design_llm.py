@@ -2,17 +2,20 @@ import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-import re
 import time
 import os
+import sys
 from tqdm import tqdm  # For progress bars
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ds'))
+from results_store import load_results
+
 def load_data():
     """Load and prepare the LLM-processed tattoo datasets and the list of probable cases."""
     print("Loading LLM-processed PFSI dataset...")
-    pfsi_df = pd.read_csv('ds/csv/equi/llm_tatuajes_procesados_PFSI.csv')
+    pfsi_df = load_results('llm_tatuajes_procesados_PFSI')
     print("Loading LLM-processed REPD dataset...")
-    repd_df = pd.read_csv('ds/csv/equi/llm_tatuajes_procesados_REPD.csv')
+    repd_df = load_results('llm_tatuajes_procesados_REPD')
     print("Loading probable cases dataset...")
     probable_cases_df = pd.read_csv('csv/cross_examples/person_matches_name_age.csv').sample(30000)
 
@@ -27,15 +30,6 @@ def load_data():
     
     return pfsi_df, repd_df, probable_cases_df
 
-def preprocess_text(text):
-    """Clean and standardize text for comparison."""
-    if not isinstance(text, str):
-        return ""
-    text = text.lower()
-    text = re.sub(r'[^\w\s]', ' ', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
 def calculate_simple_matches(pfsi_df, repd_df, probable_cases_df):
     """
     Calculate simple matches based on location and design only.
@@ -2,10 +2,14 @@ import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-import re
 import time
+import os
+import sys
 from tqdm import tqdm  # For progress bars
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from text_normalization import preprocess_series
+
 def load_data():
     """Load and prepare the tattoo datasets and the list of probable cases."""
     print("Loading PFSI dataset...")
@@ -25,18 +29,6 @@ def load_data():
     
     return pfsi_df, repd_df, probable_cases_df
 
-def preprocess_text(text):
-    """Clean and standardize text for comparison."""
-    if not isinstance(text, str):
-        return ""
-    # Convert to lowercase
-    text = text.lower()
-    # Remove punctuation
-    text = re.sub(r'[^\w\s]', ' ', text)
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
 def calculate_similarity_scores_strict(pfsi_df, repd_df, probable_cases_df):
     """
     Calculate similarity scores between tattoos only for specific person pairs 
@@ -56,7 +48,7 @@ def calculate_similarity_scores_strict(pfsi_df, repd_df, probable_cases_df):
             df['palabras_clave']
         )
         # Apply preprocessing
-        df['combined_features'] = df['combined_features'].apply(preprocess_text)
+        df['combined_features'] = preprocess_series(df['combined_features'])
     
     # Create TF-IDF vectors
     print("Creating TF-IDF vectors for combined features...")
@@ -2,11 +2,17 @@ import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-import re
 import time
 import os
+import sys
 from tqdm import tqdm  # For progress bars
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ds'))
+from results_store import load_results
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from text_normalization import preprocess_series
+
 def load_data():
     """Load and prepare the LLM-processed tattoo datasets and the list of probable cases."""
     print("\n" + "="*80)
@@ -14,7 +20,7 @@ def load_data():
     
     print("Loading LLM-processed PFSI dataset...")
     try:
-        pfsi_df = pd.read_csv('ds/csv/equi/llm_tatuajes_procesados_PFSI.csv')
+        pfsi_df = load_results('llm_tatuajes_procesados_PFSI')
         print(f"DEBUG: PFSI dataset loaded successfully with shape: {pfsi_df.shape}")
         print(f"DEBUG: PFSI columns: {pfsi_df.columns.tolist()}")
     except Exception as e:
@@ -23,7 +29,7 @@ def load_data():
     
     print("Loading LLM-processed REPD dataset...")
     try:
-        repd_df = pd.read_csv('ds/csv/equi/llm_tatuajes_procesados_REPD.csv')
+        repd_df = load_results('llm_tatuajes_procesados_REPD')
         print(f"DEBUG: REPD dataset loaded successfully with shape: {repd_df.shape}")
         print(f"DEBUG: REPD columns: {repd_df.columns.tolist()}")
     except Exception as e:
@@ -72,31 +78,6 @@ def load_data():
     print("DEBUG: Completed load_data()")
     return pfsi_df, repd_df, probable_cases_df
 
-def preprocess_text(text):
-    """Clean and standardize text for comparison."""
-    debug_output = False  # Set to True for verbose text processing debugging
-    
-    if debug_output:
-        print(f"DEBUG: preprocess_text() input: '{text}' ({type(text)})")
-    
-    if not isinstance(text, str):
-        if debug_output:
-            print(f"DEBUG: preprocess_text() not a string, returning empty string")
-        return ""
-    
-    # Convert to lowercase
-    text = text.lower()
-    # Remove punctuation
-    text_before = text
-    text = re.sub(r'[^\w\s]', ' ', text)
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    if debug_output:
-        print(f"DEBUG: preprocess_text() output: '{text}'")
-    
-    return text
-
 def analyze_similarity_distribution(pfsi_df, repd_df, probable_cases_df, sample_size=100):
     """
     Analyze the distribution of similarity scores to help determine appropriate thresholds
@@ -500,7 +481,7 @@ def calculate_similarity_scores_strict(pfsi_df, repd_df, probable_cases_df):
             
         # Apply preprocessing
         print(f"DEBUG: {df_name} - Applying text preprocessing...")
-        df['combined_features'] = df['combined_features'].apply(preprocess_text)
+        df['combined_features'] = preprocess_series(df['combined_features'])
         
         # Check for empty features
         empty_features = (df['combined_features'] == '').sum()
@@ -0,0 +1,234 @@
+"""
+hybrid_cat_tattoo.py - Rule-first tattoo categorization that only sends ambiguous
+descriptions to the LLM.
+
+Every description goes through the deterministic extractors of cat_tattoo_PFSI /
+cat_tattoo_RPED first. Descriptions whose rule result scores below the confidence
+threshold (multiple tattoos, free text, missing or ambiguous locations) are
+queued for the LLM; the rest are written directly.
+
+    python hybrid_cat_tattoo.py --source pfsi
+    python hybrid_cat_tattoo.py --source repd --process-queue --backend local
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import pandas as pd
+
+import cat_tattoo_PFSI
+import cat_tattoo_RPED
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ds'))
+from results_store import OUTPUT_DIR, ResultWriter
+
+# Descriptions longer than this are treated as free text
+FREE_TEXT_WORDS = 12
+CONFIDENCE_THRESHOLD = 0.75
+
+SOURCES = {
+    'pfsi': {
+        'module': cat_tattoo_PFSI,
+        'id_column': 'ID',
+        'text_column': 'Tatuajes',
+        'label': 'PFSI',
+    },
+    'repd': {
+        'module': cat_tattoo_RPED,
+        'id_column': 'id_cedula_busqueda',
+        'text_column': 'descripcion',
+        'label': 'REPD',
+    },
+}
+
+
+def load_descriptions(source):
+    """Load the tattoo descriptions of a source as (id_persona, descripcion) rows."""
+    config = SOURCES[source]
+    df = config['module'].load_csv_file()
+    if df is None:
+        return None
+    if source == 'pfsi':
+        df = df[df['Tatuajes'] != 'No presenta']
+    else:
+        df = df[df['tipo_sena'] == 'TATUAJES']
+    df = df[[config['id_column'], config['text_column']]].dropna()
+    df.columns = ['id_persona', 'descripcion']
+    return df
+
+
+def apply_rules(description, module):
+    """Run the deterministic extractors over one description."""
+    palabras_from_desc = []
+    text = description
+    if module is cat_tattoo_PFSI:
+        palabras_from_desc = module.parse_palabras_clave(description)
+        text = module.PALABRAS_CLAVE_SECTION.sub('', description).strip()
+
+    tattoos = []
+    for part in module.split_tattoos(text):
+        if len(part) < 3:
+            continue
+        categories, keywords = module.categorize_keywords(part)
+        if palabras_from_desc:
+            categories, keywords = palabras_from_desc, []
+        tattoos.append({
+            'descripcion_tattoo': part,
+            'ubicacion': module.extract_location(part),
+            'texto_extraido': module.extract_text_in_quotes(part),
+            'categorias': ', '.join(categories),
+            'palabras_clave': ', '.join(keywords),
+            'diseño': keywords[0].split(', ')[0] if keywords else '',
+        })
+    return tattoos
+
+
+def distinct_locations(ubicacion):
+    """Distinct body parts of an extracted location string."""
+    return list(dict.fromkeys(loc.split(' ')[0] for loc in ubicacion.split(', ') if loc))
+
+
+def rule_confidence(description, tattoos):
+    """Score how much the rule result can be trusted, with the reasons for any penalty."""
+    score = 1.0
+    reasons = []
+
+    if len(tattoos) != 1:
+        score -= 0.5
+        reasons.append('multiple_tattoos' if tattoos else 'no_tattoo')
+
+    for tattoo in tattoos:
+        locations = distinct_locations(tattoo['ubicacion'])
+        if not locations:
+            score -= 0.3
+            reasons.append('no_location')
+        elif len(locations) > 1:
+            score -= 0.3
+            reasons.append('ambiguous_location')
+        if not tattoo['categorias']:
+            score -= 0.3
+            reasons.append('no_category')
+
+    if len(description.split()) > FREE_TEXT_WORDS:
+        score -= 0.3
+        reasons.append('free_text')
+
+    return max(score, 0.0), sorted(set(reasons))
+
+
+def process_queue(queue_df, label, backend, server):
+    """Send the escalated descriptions to the LLM and store the parsed tattoos."""
+    from dotenv import load_dotenv
+    from shared import build_categorization_prompt, clean_response, generate_response
+    from telemetry import TELEMETRY
+
+    load_dotenv()
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    if backend == 'deepseek' and not api_key:
+        print("Error: DEEPSEEK_API_KEY not found in environment variables.")
+        return 0
+
+    calls = 0
+    TELEMETRY.start_run(f'hybrid_cat_tattoo_{label}')
+    with ResultWriter(f'llm_tatuajes_procesados_{label}', batch_size=50) as writer:
+        for row in queue_df.itertuples():
+            prompt = build_categorization_prompt(row.id_persona, row.descripcion)
+            TELEMETRY.set_description(row.id_persona)
+            response = generate_response(prompt, api_key, backend, server)
+            calls += 1
+            if not response:
+                print("Failed to generate response.")
+                continue
+            try:
+                tattoo_array = json.loads(clean_response(response))
+                writer.add(tattoo_array)
+                TELEMETRY.record_parse(True, records=len(tattoo_array))
+            except (json.JSONDecodeError, ValueError) as e:
+                TELEMETRY.record_parse(False, error=e)
+                print(f"Failed to parse response as JSON: {e}")
+    TELEMETRY.write()
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rule-first tattoo categorization with LLM escalation.')
+    parser.add_argument('--source', choices=sorted(SOURCES), default='pfsi')
+    parser.add_argument('--threshold', type=float, default=CONFIDENCE_THRESHOLD,
+                        help='Minimum rule confidence to skip the LLM')
+    parser.add_argument('--process-queue', action='store_true',
+                        help='Send escalated descriptions to the LLM right away')
+    parser.add_argument('--backend', choices=['deepseek', 'local'], default='deepseek')
+    parser.add_argument('--server', default='http://127.0.0.1:8765')
+    args = parser.parse_args()
+
+    config = SOURCES[args.source]
+    label = config['label']
+    df = load_descriptions(args.source)
+    if df is None:
+        return
+    print(f"Loaded {len(df)} tattoo descriptions from {label}")
+
+    # Identical descriptions are resolved once, like the LLM scripts do
+    unique_df = df.drop_duplicates(subset='descripcion')
+
+    rule_start = time.time()
+    escalated = []
+    reason_counts = {}
+    with ResultWriter(f'reglas_tatuajes_procesados_{label}', batch_size=1000) as writer:
+        for row in unique_df.itertuples():
+            tattoos = apply_rules(row.descripcion, config['module'])
+            score, reasons = rule_confidence(row.descripcion, tattoos)
+            if score >= args.threshold:
+                writer.add([
+                    {'id_persona': row.id_persona, 'descripcion_original': row.descripcion, **tattoo}
+                    for tattoo in tattoos
+                ])
+            else:
+                escalated.append({'id_persona': row.id_persona, 'descripcion': row.descripcion,
+                                  'confianza': round(score, 2), 'motivos': ', '.join(reasons)})
+                for reason in reasons:
+                    reason_counts[reason] = reason_counts.get(reason, 0) + 1
+    rule_seconds = time.time() - rule_start
+
+    total = len(unique_df)
+    resolved = total - len(escalated)
+    queue_df = pd.DataFrame(escalated, columns=['id_persona', 'descripcion', 'confianza', 'motivos'])
+    queue_path = os.path.join(OUTPUT_DIR, f'pendientes_llm_{label}.csv')
+    queue_df.to_csv(queue_path, index=False)
+    print(f"Queued {len(queue_df)} descriptions for the LLM in {queue_path}")
+
+    llm_calls = 0
+    llm_seconds = 0.0
+    if args.process_queue and not queue_df.empty:
+        llm_start = time.time()
+        llm_calls = process_queue(queue_df, label, args.backend, args.server)
+        llm_seconds = time.time() - llm_start
+
+    report = {
+        'source': label,
+        'unique_descriptions': total,
+        'rule_resolved': resolved,
+        'llm_escalated': len(queue_df),
+        'api_call_reduction_pct': round(100.0 * resolved / total, 2) if total else 0.0,
+        'escalation_reasons': reason_counts,
+        'rule_seconds': round(rule_seconds, 3),
+        'rule_descriptions_per_second': round(total / rule_seconds, 1) if rule_seconds else None,
+        'llm_calls': llm_calls,
+        'llm_seconds': round(llm_seconds, 3),
+        'llm_descriptions_per_second': round(llm_calls / llm_seconds, 3) if llm_seconds else None,
+        'threshold': args.threshold,
+    }
+    report_path = os.path.join(OUTPUT_DIR, f'hybrid_report_{label}.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print("\nHybrid categorization report:")
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+    print(f"Report saved to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
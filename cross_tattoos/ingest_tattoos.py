@@ -0,0 +1,171 @@
+"""
+ingest_tattoos.py - Chunked, parallel rule-based tattoo ingest for PFSI and REPD.
+
+The registry CSV is read in chunks; each chunk is split into one row per
+tattoo, categorized and located with column operations in a worker process,
+and appended to the output CSV as soon as it is ready. Memory use depends on
+the chunk size, not on the size of the registry.
+
+    python ingest_tattoos.py --source all --workers 4 --chunksize 5000
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import cat_tattoo_PFSI
+import cat_tattoo_RPED
+from keyword_engine import KEYWORD_ENGINE
+from location_extractor import LOCATION_EXTRACTOR
+
+CSV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'csv', 'equi')
+
+OUTPUT_COLUMNS = [
+    'id_persona',
+    'descripcion_original',
+    'descripcion_tattoo',
+    'ubicacion',
+    'texto_extraido',
+    'categorias',
+    'palabras_clave',
+]
+
+SOURCES = {
+    'pfsi': {
+        'module': cat_tattoo_PFSI,
+        'input': 'pfsi_v2_principal.csv',
+        'output': 'tatuajes_procesados_PFSI.csv',
+        'id_column': 'ID',
+        'text_column': 'Tatuajes',
+        'usecols': ['ID', 'Tatuajes'],
+    },
+    'repd': {
+        'module': cat_tattoo_RPED,
+        'input': 'repd_vp_cedulas_senas.csv',
+        'output': 'tatuajes_procesados_REPD.csv',
+        'id_column': 'id_cedula_busqueda',
+        'text_column': 'descripcion',
+        'usecols': ['id_cedula_busqueda', 'tipo_sena', 'descripcion'],
+    },
+}
+
+
+def map_unique(series, func):
+    """Apply a scalar function once per distinct value of a Series."""
+    codes, uniques = pd.factorize(series)
+    values = [func(value) for value in uniques]
+    return pd.Series([values[code] for code in codes], index=series.index, dtype=object)
+
+
+def filter_rows(chunk, source):
+    """Keep the rows that describe tattoos, as the original scripts did."""
+    if source == 'pfsi':
+        chunk = chunk[chunk['Tatuajes'] != 'No presenta']
+    else:
+        chunk = chunk[chunk['tipo_sena'] == 'TATUAJES']
+    return chunk[chunk[SOURCES[source]['text_column']].notna()]
+
+
+def process_chunk(chunk, source):
+    """Turn a chunk of registry rows into one row per individual tattoo."""
+    config = SOURCES[source]
+    module = config['module']
+    chunk = filter_rows(chunk, source)
+
+    df = pd.DataFrame({
+        'id_persona': chunk[config['id_column']],
+        'descripcion_original': chunk[config['text_column']],
+    })
+    text = df['descripcion_original']
+    if source == 'pfsi':
+        # PALABRAS CLAVE, when present, replace the keyword categories
+        df['palabras_desc'] = map_unique(text, module.parse_palabras_clave)
+        text = text.str.replace(module.PALABRAS_CLAVE_SECTION, '', regex=True).str.strip()
+
+    df['descripcion_tattoo'] = map_unique(text, module.split_tattoos)
+    df = df.explode('descripcion_tattoo')
+    df = df[df['descripcion_tattoo'].notna() & (df['descripcion_tattoo'].str.len() >= 3)]
+    if df.empty:
+        # No tattoos in this chunk ('No presenta', empty or no TATUAJES rows)
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+    tattoos = df['descripcion_tattoo']
+    keywords = KEYWORD_ENGINE.categorize_series(tattoos)
+    df['ubicacion'] = LOCATION_EXTRACTOR.extract_series(tattoos)
+    df['texto_extraido'] = tattoos.str.findall(module.QUOTED_TEXT).str.join(', ')
+    df['categorias'] = keywords['categorias'].str.join(', ')
+    df['palabras_clave'] = keywords['palabras_clave'].str.join(', ')
+
+    if source == 'pfsi':
+        override = df['palabras_desc'].str.len() > 0
+        df.loc[override, 'categorias'] = df.loc[override, 'palabras_desc'].str.join(', ')
+        df.loc[override, 'palabras_clave'] = ''
+
+    return df[OUTPUT_COLUMNS]
+
+
+def ingest(source, chunksize=5000, workers=None, output_path=None):
+    """Stream a registry through process_chunk and append the results to a CSV."""
+    config = SOURCES[source]
+    input_path = os.path.join(CSV_DIR, config['input'])
+    output_path = output_path or os.path.join(CSV_DIR, config['output'])
+    tmp_path = f"{output_path}.tmp"
+    workers = workers or os.cpu_count() or 1
+
+    start = time.time()
+    rows_in = 0
+    rows_out = 0
+    header = True
+    reader = pd.read_csv(input_path, usecols=config['usecols'], chunksize=chunksize)
+
+    def write(result):
+        nonlocal header, rows_out
+        result.to_csv(tmp_path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+        rows_out += len(result)
+
+    if workers == 1:
+        for chunk in reader:
+            rows_in += len(chunk)
+            write(process_chunk(chunk, source))
+    else:
+        # Bounded number of chunks in flight keeps memory flat; results are written in input order
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for chunk in reader:
+                rows_in += len(chunk)
+                pending.append(executor.submit(process_chunk, chunk, source))
+                if len(pending) >= workers * 2:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+
+    if header:
+        pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+
+    elapsed = time.time() - start
+    print(f"{source.upper()}: {rows_in} registry rows -> {rows_out} tattoos in {elapsed:.1f}s "
+          f"({rows_in / elapsed:.0f} rows/s)")
+    print(f"Results saved to {output_path}")
+    return rows_out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chunked rule-based tattoo ingest for PFSI and REPD.')
+    parser.add_argument('--source', choices=['pfsi', 'repd', 'all'], default='all')
+    parser.add_argument('--chunksize', type=int, default=5000, help='Registry rows per chunk')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    args = parser.parse_args()
+
+    sources = ['pfsi', 'repd'] if args.source == 'all' else [args.source]
+    for source in sources:
+        ingest(source, args.chunksize, args.workers)
+
+
+if __name__ == "__main__":
+    main()
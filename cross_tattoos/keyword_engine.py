@@ -0,0 +1,187 @@
+"""
+keyword_engine.py - Compiled keyword categorizer for tattoo descriptions.
+
+The category keyword lists are compiled once into a single regex trie. One
+scan of the lowercased description finds, at every position, the longest
+keyword starting there; every shorter keyword that is a prefix of it is
+implied, so the set of matched keywords is exactly the set a
+``term in description`` check over every keyword would find. Output keeps
+the category order and the duplicated terms of the original lists.
+
+    python keyword_engine.py --benchmark
+"""
+
+import argparse
+import os
+import re
+import time
+from functools import lru_cache
+
+import pandas as pd
+
+# Category keyword lists, in output order; duplicates are intentional because
+# the triggering fragments have always repeated them
+TATTOO_KEYWORDS = {
+    "Figura Humana": ["rostro", "figura", "hombre", "mujer", "persona", "cuerpo", "ojos", "silueta", "humana", "humano", "cráneo", "calavera", "busto", "caricatura", "personaje"],
+    "Letras-Números": ["letra", "números", "leyenda", "palabras", "texto", "nombre", "frase", "cursiva", "manuscrita", "mayúsculas", "cursivo", "tipografía", "tipologia", "script", "leyendas", "numeros", "romanos", "cursivas", "letras", "palabra", "numeros", "tipografia", "mayusculas"],
+    "Simbolos": ["símbolo", "cruz", "rojo", "negro", "símbolos", "machete", "corazón", "estrella", "infinito", "triángulo", "cruz cristiana", "cruzpalabras", "corazon", "corazones", "estrellas", "triangulo", "círculo", "circulo", "geométrico", "geométricos", "guadaña", "ancla", "flecha", "espada", "daga", "signo", "trébol", "trebol", "diamante", "asterisco", "asteriscos", "piramide", "playboy", "atrapasueños", "brujula", "mandala", "yin", "yang", "ying", "calendario", "egipcio", "baraja", "carta", "cartas", "reloj", "bandera", "logotipo", "logo", "alegoría", "alegoria"],
+    "Animales": ["tigre", "león", "zorro", "lobo", "perro", "gallo", "pez", "pájaro", "conejo", "águila", "aguila", "serpiente", "dragón", "dragon", "mariposa", "pantera", "gato", "felino", "buho", "búho", "aves", "ave", "cobra", "alacrán", "alacran", "escorpión", "araña", "pavo", "paloma", "colibrí", "colibri", "tortuga", "ballena", "delfín", "delfin", "murciélago", "murcielago", "halcón", "halcon", "águila", "aguila", "leopardo", "jaguar", "rinoceronte", "elefante", "tiburón", "tiburon", "orca", "ballena", "delfín", "delfin", "murciélago", "murcielago", "halcón", "halcon", "águila", "aguila", "leopardo", "jaguar", "rinoceronte", "elefante", "tiburón", "tiburon", "orca"],
+    "Religiosos": ["santa muerte", "cruz cristiana", "anj", "horus", "dios", "ángel", "santo", "religión", "virgen", "jesús", "jesucristo", "cristo", "maría", "guadalupe", "san", "judas", "sagrado", "oración", "oracion", "rosario", "biblia", "santísima", "santisima", "santos", "ángeles", "demonios", "demonio", "diablo", "infierno", "cielo", "paraíso", "paraiso", "altar", "templo", "iglesia", "católica", "catolica", "buda", "zen", "mandala", "yoga", "meditación", "meditacion", "karma", "chakra", "om", "símbolo religioso", "simbolo religioso"],
+    "Nombre": ["jose", "alberto", "juan", "adriana", "carlos", "maria", "luis", "ana", "david", "eduardo", "martha", "victor", "tadeo", "alejandra", "santiago", "alejandro", "laura", "raul", "lopez", "silvia", "jesus", "juan", "maria", "luis", "ana", "david", "eduardo", "martha", "victor", "tadeo", "alejandra", "santiago", "alejandro", "laura", "raul", "lopez", "silvia", "jesus"],
+    "Otros": ["irreconocible", "indeterminado", "abstracto", "floral", "combinado", "fantasía", "demonio", "manga", "cuerno", "flores", "planta", "hojas", "ramas", "árbol", "arbol", "paisaje", "naturaleza", "sol", "luna", "estrella", "estrellas", "cielo", "nube", "mar", "océano", "oceano", "montaña", "montana", "fuego", "llamas", "agua", "tierra", "viento", "vientos", "rayo", "rayos", "trueno", "truenos", "arcoíris", "arcoiris", "galaxia", "universo", "planeta", "satélite", "satelite", "cometa", "meteorito", "asteroide", "espacio", "cosmos", "alien", "ovni", "robot", "androide", "cibernético", "cibernetico", "futurista", "retro", "vintage", "moderno", "clásico", "clasico", "arte", "dibujo", "pintura", "escultura", "grafiti", "graffiti", "mural", "cartel", "poster", "bandera", "emblema", "insignia", "medalla", "trofeo", "premio", "trofeo", "copa", "copa", "trofeo", "premio", "trofeo", "copa", "copa"]
+}
+
+
+def build_trie_pattern(terms):
+    """Regex matching the longest of ``terms`` at the current position."""
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def to_pattern(node):
+        terminal = '' in node
+        branches = [re.escape(char) + to_pattern(child)
+                    for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Greedy optional group: try the longer keyword first, fall back to this one
+        if terminal:
+            return '(?:' + body + ')?'
+        return body
+
+    return to_pattern(trie)
+
+
+class KeywordEngine:
+    """Categorize text against a {category: [terms]} mapping in a single pass."""
+
+    def __init__(self, keywords=TATTOO_KEYWORDS, cache_size=65536):
+        self.categories = list(keywords)
+        # Where each lowercased term appears: [(category index, list position)]
+        self.term_entries = {}
+        self.term_labels = {}
+        for cat_index, (category, terms) in enumerate(keywords.items()):
+            for position, term in enumerate(terms):
+                key = term.lower()
+                self.term_entries.setdefault(key, []).append((cat_index, position))
+                self.term_labels[(cat_index, position)] = term
+
+        unique_terms = sorted(self.term_entries)
+        self.pattern = re.compile('(?=(' + build_trie_pattern(unique_terms) + '))')
+        # Every term that is a prefix of a longest match is matched at the same position
+        self.implied = {
+            term: frozenset(other for other in unique_terms if term.startswith(other))
+            for term in unique_terms
+        }
+        self.categorize = lru_cache(maxsize=cache_size)(self._categorize)
+        self._group = lru_cache(maxsize=cache_size)(self._group_matches)
+
+    def matched_terms(self, text):
+        """Set of lowercased terms contained in ``text``."""
+        found = set()
+        for longest in set(self.pattern.findall(text.lower())):
+            if longest:
+                found.update(self.implied[longest])
+        return found
+
+    def _group_matches(self, terms):
+        """Categories and triggering fragments for a set of matched terms."""
+        entries = sorted(entry for term in terms for entry in self.term_entries[term])
+        categories = []
+        fragments = []
+        current = None
+        for cat_index, position in entries:
+            if cat_index != current:
+                current = cat_index
+                categories.append(self.categories[cat_index])
+                fragments.append([])
+            fragments[-1].append(self.term_labels[(cat_index, position)])
+        return tuple(categories), tuple(', '.join(terms) for terms in fragments)
+
+    def _categorize(self, text):
+        if not text:
+            return (), ()
+        # Many descriptions share the same keywords, so grouping is cached per match set
+        return self._group(frozenset(self.matched_terms(text)))
+
+    def categorize_text(self, text):
+        """Return (categories, triggering_fragments) lists for one description."""
+        if pd.isna(text):
+            return [], []
+        categories, fragments = self.categorize(text)
+        return list(categories), list(fragments)
+
+    def categorize_series(self, series):
+        """Categorize a Series; each distinct description is only scanned once.
+
+        Returns a DataFrame indexed like ``series`` with list columns
+        ``categorias`` and ``palabras_clave``.
+        """
+        codes, uniques = pd.factorize(series)
+        results = [self.categorize(text) if isinstance(text, str) else ((), ()) for text in uniques]
+        categories = [list(c) for c, _ in results] + [[]]
+        fragments = [list(f) for _, f in results] + [[]]
+        # factorize marks missing values with -1, which picks the trailing empty result
+        return pd.DataFrame({
+            'categorias': [categories[code] for code in codes],
+            'palabras_clave': [fragments[code] for code in codes],
+        }, index=series.index)
+
+
+KEYWORD_ENGINE = KeywordEngine()
+
+
+def reference_categorize(text, keywords=TATTOO_KEYWORDS):
+    """The original per-term substring scan, kept to check the engine against."""
+    categories = []
+    triggering_fragments = []
+    for category, terms in keywords.items():
+        matched_terms = [term for term in terms if term.lower() in text.lower()]
+        if matched_terms:
+            categories.append(category)
+            triggering_fragments.append(', '.join(matched_terms))
+    return categories, triggering_fragments
+
+
+def benchmark(descriptions):
+    """Check the engine against the reference scan and time both."""
+    descriptions = [d for d in descriptions if isinstance(d, str)]
+    engine = KeywordEngine()
+
+    start = time.perf_counter()
+    expected = [reference_categorize(d) for d in descriptions]
+    reference_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = engine.categorize_series(pd.Series(descriptions))
+    engine_seconds = time.perf_counter() - start
+
+    mismatches = sum(
+        (cats, frags) != (exp_cats, exp_frags)
+        for cats, frags, (exp_cats, exp_frags) in zip(result['categorias'], result['palabras_clave'], expected)
+    )
+    print(f"{len(descriptions)} descriptions ({len(set(descriptions))} distinct)")
+    print(f"Reference scan: {reference_seconds:.3f}s ({len(descriptions) / reference_seconds:.0f}/s)")
+    print(f"Keyword engine: {engine_seconds:.3f}s ({len(descriptions) / engine_seconds:.0f}/s)")
+    print(f"Speedup: {reference_seconds / engine_seconds:.1f}x, mismatches: {mismatches}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the compiled keyword engine.')
+    parser.add_argument('--benchmark', action='store_true')
+    parser.add_argument('--input', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        'csv', 'equi', 'pfsi_v2_principal.csv'))
+    parser.add_argument('--column', default='Tatuajes')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        df = pd.read_csv(args.input, usecols=[args.column])
+        benchmark(df[args.column].tolist())
+
+
+if __name__ == "__main__":
+    main()
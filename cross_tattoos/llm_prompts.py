@@ -1,25 +1,10 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-import torch
+import argparse
+from llm_server import DEFAULT_SERVER, generate_with_local_model
 
-# Load the tokenizer and model
-model_name = "EleutherAI/gpt-neo-1.3B"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForCausalLM.from_pretrained(
-    model_name,
-    torch_dtype=torch.float32,  # Use half-precision for faster inference
-    device_map="auto"  # Automatically place layers on GPU/CPU
-)
-
-# Add this after loading the tokenizer
-if tokenizer.pad_token is None:
-    tokenizer.pad_token = tokenizer.eos_token
-
-# Create a text generation pipeline
-generator = pipeline(
-    "text-generation",
-    model=model,
-    tokenizer=tokenizer
-)
+# The model is served by llm_server.py, so this script no longer loads it on every run
+parser = argparse.ArgumentParser(description="Send a tattoo categorization prompt to the local model server.")
+parser.add_argument("--server", default=DEFAULT_SERVER, help="http://host:port or unix:/path/to/socket")
+args = parser.parse_args()
 
 # Example tattoo description
 tattoo_description = "ANTEBRAZO DERECHO, PIERNA DERECHA EN FORMA DE TRIANGULO"
@@ -56,15 +41,15 @@ Ejemplo de salida:
 Por favor, sigue el formato de salida estrictamente y proporciona la información en español claro y preciso. No incluyas información adicional ni irrelevante."""
 
 # Generate response
-response = generator(
+response = generate_with_local_model(
     prompt,
+    server=args.server,
     max_new_tokens=250,  # Increase token limit for longer responses
-    num_return_sequences=3,
+    num_return_sequences=1,  # Only the first sequence was ever used
     temperature=0.2,  # Control randomness
     top_p=0.2,  # Nucleus sampling
-    pad_token_id=tokenizer.eos_token_id,  # Ensure padding token is used
     repetition_penalty=2.2 # Penalize repetition to avoid gibberish
 )
 
 # Print the response
-print(response[0]['generated_text'])
+print(response)
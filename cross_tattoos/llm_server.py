@@ -0,0 +1,259 @@
+"""
+llm_server.py - Long-lived local text-generation service for the tattoo categorizers.
+
+The model and tokenizer are loaded once. Concurrent requests are grouped by a
+batching thread and generated together, so the categorizers only pay an HTTP
+round trip per prompt instead of a model load per run.
+
+    python llm_server.py --port 8765 --dtype bfloat16
+    python llm_server.py --socket /tmp/llm_server.sock --dtype int8
+"""
+
+import argparse
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODEL = "EleutherAI/gpt-neo-1.3B"
+DEFAULT_SERVER = "http://127.0.0.1:8765"
+
+# Generation settings that can be overridden per request
+GENERATION_DEFAULTS = {
+    "max_new_tokens": 250,
+    "num_return_sequences": 1,
+    "temperature": 0.2,
+    "top_p": 0.2,
+    "repetition_penalty": 2.2,
+}
+
+
+def load_model(model_name, dtype="float32"):
+    """Load the tokenizer and model for CPU inference in the requested precision."""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    # Left padding keeps the prompt adjacent to the generated tokens in a batch
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    torch_dtype = torch.bfloat16 if dtype == "bfloat16" else torch.float32
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch_dtype)
+    if dtype == "int8":
+        # Dynamic quantization of the linear layers; activations stay in float32
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    return tokenizer, model
+
+
+class BatchingGenerator:
+    """Collect concurrent prompts and run them through the model in batches."""
+
+    def __init__(self, tokenizer, model, max_batch_size=8, max_wait_ms=20):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, prompt, **params):
+        """Queue a prompt and return a Future with its list of generated texts."""
+        settings = dict(GENERATION_DEFAULTS)
+        settings.update({k: v for k, v in params.items() if k in GENERATION_DEFAULTS})
+        future = Future()
+        self.requests.put((prompt, settings, future))
+        return future
+
+    def _collect_batch(self):
+        """Block for one request, then gather more until the batch is full or the wait expires."""
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            # Requests can only share a generate() call if their settings agree
+            groups = {}
+            for prompt, settings, future in batch:
+                key = tuple(sorted(settings.items()))
+                groups.setdefault(key, []).append((prompt, future))
+            for key, items in groups.items():
+                try:
+                    outputs = self._generate([prompt for prompt, _ in items], dict(key))
+                    for (_, future), texts in zip(items, outputs):
+                        future.set_result(texts)
+                except Exception as e:
+                    for _, future in items:
+                        future.set_exception(e)
+
+    def _generate(self, prompts, settings):
+        import torch
+
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        with torch.inference_mode():
+            output_ids = self.model.generate(
+                **inputs,
+                do_sample=True,
+                pad_token_id=self.tokenizer.eos_token_id,
+                **settings
+            )
+        # generate() returns num_return_sequences rows per prompt, in prompt order
+        prompt_length = inputs["input_ids"].shape[1]
+        texts = self.tokenizer.batch_decode(output_ids[:, prompt_length:], skip_special_tokens=True)
+        per_prompt = settings["num_return_sequences"]
+        return [texts[i * per_prompt:(i + 1) * per_prompt] for i in range(len(prompts))]
+
+
+class GenerationHandler(BaseHTTPRequestHandler):
+    """JSON API: POST /generate {"prompt": ...} and GET /health."""
+
+    generator = None
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not isinstance(request, dict):
+                raise ValueError("body must be a JSON object")
+            prompt = request.pop("prompt")
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": f"invalid request: {e}"})
+            return
+        try:
+            texts = self.generator.submit(prompt, **request).result()
+            self._send_json(200, {"generated_text": texts})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that talks to a Unix domain socket."""
+
+    def __init__(self, socket_path, timeout=300):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _connect(server, timeout):
+    """Open a connection to an http://host:port URL or a unix:/path socket."""
+    if server.startswith("unix:"):
+        return UnixHTTPConnection(server[len("unix:"):], timeout=timeout)
+    address = server.split("://", 1)[-1].rstrip("/")
+    return http.client.HTTPConnection(address, timeout=timeout)
+
+
+def generate_with_local_model(prompt, server=DEFAULT_SERVER, timeout=300, **params):
+    """Send a prompt to the local server and return the first generated text."""
+    conn = _connect(server, timeout)
+    try:
+        body = json.dumps({"prompt": prompt, **params}).encode("utf-8")
+        conn.request("POST", "/generate", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        payload = json.loads(response.read().decode("utf-8"))
+        if response.status != 200:
+            print(f"Error calling local model server: {payload.get('error')}")
+            return None
+        texts = payload["generated_text"]
+        return texts[0] if texts else None
+    except (OSError, ValueError) as e:
+        print(f"Error calling local model server: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local causal LM for tattoo categorization.")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Hugging Face model name or path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", default=None, help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--dtype", choices=["float32", "bfloat16", "int8"], default="float32",
+                        help="CPU precision: bfloat16 weights or int8 dynamic quantization")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=int, default=20,
+                        help="How long to wait for more requests before running a batch")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    print(f"Loading {args.model} ({args.dtype})...")
+    start = time.time()
+    tokenizer, model = load_model(args.model, args.dtype)
+    print(f"Model loaded in {time.time() - start:.1f}s")
+
+    GenerationHandler.generator = BatchingGenerator(tokenizer, model, args.max_batch_size, args.max_wait_ms)
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, GenerationHandler)
+        print(f"Listening on unix:{args.socket}")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), GenerationHandler)
+        print(f"Listening on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
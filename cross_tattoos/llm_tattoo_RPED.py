@@ -1,7 +1,10 @@
 import pandas as pd
 import os
 import re
+import argparse
 from transformers import pipeline
+from llm_server import generate_with_local_model
+from location_extractor import LOCATION_EXTRACTOR
 
 def load_csv_file():
     """Load the cedulas_senas CSV file."""
@@ -56,41 +59,7 @@ def categorize_keywords(tattoo_description, classifier):
 # Function to extract tattoo locations from descriptions
 def extract_location(description):
     """Extract body locations from tattoo descriptions."""
-    if pd.isna(description):
-        return ""
-        
-    locations = [
-        'ROSTRO', 'CUERPO', 'BRAZO', 'HOMBRO', 'MANO', 'PIERNA', 'TORSO', 'ESCAPULA', 
-        'CABEZA', 'CLAVICULA', 'PECTORAL', 'FLANCO', 'ANTEBRAZO', 'OJO', 'CARA', 'CUELLO', 
-        'ESPALDA', 'EXTREMIDAD', 'MUSLO', 'RODILLA', 'DORSO', 'ABDOMEN', 'TORAX', 
-        'MUÑECA', 'OREJA', 'PECHO', 'COSTADO', 'PANTORRILLA', 'DORSAL', 'CRANEO', 'PULGAR', 
-        'DEDOS', 'INDICE', 'MEÑIQUE', 'TOBILLO', 'CADERA', 'LENGUA', 'NARIZ', 'CEJA', 
-        'BUSTO', 'CODO', 'FALANGE', 'LUMBAR', 'TALON', 'PLANTA', 'NUCA', 'OMBLIGO', 
-        'PALMA', 'GLÚTEO', 'ENTREPIERNA', 'INGLE', 'ESPINILLA', 'LABIO', 'MEJILLA', 
-        'SENO', 'HUESO', 'TRAPECIO', 'INTERCOSTAL', 'AXILA', 'PIE', 'TALÓN', 'EMPEINE', 
-        'DEDO GORDO', 'NUDILLO', 'COSTILLAS'
-    ]
-    
-    laterality = ['DERECHO', 'DERECHA', 'IZQUIERDO', 'IZQUIERDA']
-    
-    found_locations = []
-    description_upper = description.upper()
-    
-    for loc in locations:
-        if loc in description_upper:
-            # Check for laterality near the location
-            position = description_upper.find(loc)
-            context = description_upper[max(0, position-10):min(len(description_upper), position+25)]
-            side = ""
-            for lat in laterality:
-                if lat in context:
-                    side = lat
-                    break
-                    
-            complete_loc = f"{loc} {side}".strip()
-            found_locations.append(complete_loc)
-    
-    return ', '.join(found_locations)
+    return LOCATION_EXTRACTOR.extract_location(description)
 
 # Function to split tattoo descriptions into individual tattoos
 def split_tattoos(text):
@@ -144,15 +113,28 @@ def extract_text_in_quotes(text):
     matches = re.findall(r'[""]([^""]+)[""]', text)
     return ', '.join(matches) if matches else ""
 
-def complete_description(tattoo_description, generator):
-    """Complete the tattoo description using a language model."""
+def complete_description(tattoo_description, generator=None, server=None):
+    """Complete the tattoo description using a language model.
+
+    When ``server`` is given the prompt goes to the warm llm_server.py instance
+    instead of a pipeline loaded by this script.
+    """
     prompt = f"Actúa como médico forense y retoma: {tattoo_description} para sintetizar y completar la descripción del tatuaje."
-    completion = generator(prompt, max_new_tokens=10, num_return_sequences=1)
+    if server:
+        completion = generate_with_local_model(prompt, server=server, max_new_tokens=10, num_return_sequences=1)
+        completed = prompt + (completion or "")
+    else:
+        completed = generator(prompt, max_new_tokens=10, num_return_sequences=1)[0]['generated_text']
     print(f"Prompt: {prompt}")
-    print(f"Completion: {completion[0]['generated_text']}")
-    return completion[0]['generated_text']
+    print(f"Completion: {completed}")
+    return completed
 
 def main():
+    parser = argparse.ArgumentParser(description='Process REPD tattoos with language models.')
+    parser.add_argument('--server', default=None,
+                        help='llm_server.py address (http://host:port or unix:/path); loads a local pipeline if omitted')
+    args = parser.parse_args()
+
     # Load the CSV file
     df = load_csv_file()
     if df is None:
@@ -162,7 +144,9 @@ def main():
     
     # Initialize the language model classifier and generator
     classifier = pipeline('ner', model='mrm8488/bert-spanish-cased-finetuned-ner', tokenizer='mrm8488/bert-spanish-cased-finetuned-ner')
-    generator = pipeline('text-generation', model='datificate/gpt2-small-spanish', tokenizer='datificate/gpt2-small-spanish')
+    generator = None
+    if not args.server:
+        generator = pipeline('text-generation', model='datificate/gpt2-small-spanish', tokenizer='datificate/gpt2-small-spanish')
     
     # Filter for tattoo entries
     tattoo_df = df[df['tipo_sena'] == 'TATUAJES'].copy()
@@ -188,7 +172,7 @@ def main():
             categories, keywords = categorize_keywords(tattoo, classifier)
             location = extract_location(tattoo)
             text = extract_text_in_quotes(tattoo)
-            completed_description = complete_description(tattoo, generator)
+            completed_description = complete_description(tattoo, generator, args.server)
             
             all_tattoos.append({
                 'id_persona': person_id,
@@ -0,0 +1,141 @@
+"""
+location_extractor.py - Single-pass body-location and laterality extraction.
+
+Body parts and laterality words are compiled into one regex with word
+boundaries, optional plurals and accent-insensitive matching. A description is
+scanned once and every (body_part, laterality, span) triple is returned,
+including repeated parts, instead of only the first occurrence of each name.
+
+    from location_extractor import LOCATION_EXTRACTOR
+    LOCATION_EXTRACTOR.extract("TATUAJE EN ANTEBRAZO DERECHO Y MANO IZQUIERDA")
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import pandas as pd
+
+# Canonical body-part names; matching ignores accents and a trailing S/ES
+BODY_PARTS = [
+    'ROSTRO', 'CUERPO', 'BRAZO', 'HOMBRO', 'MANO', 'PIERNA', 'TORSO', 'ESCAPULA',
+    'CABEZA', 'CLAVICULA', 'PECTORAL', 'FLANCO', 'ANTEBRAZO', 'OJO', 'CARA', 'CUELLO',
+    'ESPALDA', 'EXTREMIDAD', 'MUSLO', 'RODILLA', 'DORSO', 'ABDOMEN', 'TORAX',
+    'MUÑECA', 'OREJA', 'PECHO', 'COSTADO', 'PANTORRILLA', 'DORSAL', 'CRANEO', 'PULGAR',
+    'DEDO', 'INDICE', 'MEÑIQUE', 'TOBILLO', 'CADERA', 'LENGUA', 'NARIZ', 'CEJA',
+    'BUSTO', 'CODO', 'FALANGE', 'LUMBAR', 'TALON', 'PLANTA', 'NUCA', 'OMBLIGO',
+    'PALMA', 'GLÚTEO', 'ENTREPIERNA', 'INGLE', 'ESPINILLA', 'LABIO', 'MEJILLA',
+    'SENO', 'HUESO', 'TRAPECIO', 'INTERCOSTAL', 'AXILA', 'PIE', 'EMPEINE',
+    'DEDO GORDO', 'NUDILLO', 'COSTILLA',
+]
+
+LATERALITY = ['DERECHO', 'DERECHA', 'IZQUIERDO', 'IZQUIERDA']
+
+# A laterality word is attached to the part it follows within this many
+# characters, or else to the part it directly precedes
+LATERALITY_AFTER = 25
+LATERALITY_BEFORE = 10
+
+# One-to-one accent folding so that spans in the folded text match the original
+ACCENT_FOLD = str.maketrans('ÁÉÍÓÚÜáéíóúü', 'AEIOUUaeiouu')
+
+Location = namedtuple('Location', ['body_part', 'laterality', 'start', 'end'])
+
+
+def fold(text):
+    """Uppercase and strip accents (except Ñ) without changing the text length."""
+    return text.translate(ACCENT_FOLD).upper()
+
+
+class LocationExtractor:
+    """Compiled extractor shared by the categorizers and the matchers."""
+
+    def __init__(self, body_parts=BODY_PARTS, laterality=LATERALITY, cache_size=65536):
+        self.canonical = {}
+        for part in body_parts:
+            folded = fold(part)
+            self.canonical[folded] = part
+            # Texts typed without Ñ still match MUÑECA / MEÑIQUE
+            self.canonical[folded.replace('Ñ', 'N')] = part
+        self.laterality = {fold(side): side for side in laterality}
+
+        # Longest names first so DEDO GORDO wins over DEDO
+        parts = sorted(self.canonical, key=len, reverse=True)
+        sides = sorted(self.laterality, key=len, reverse=True)
+        part_alternation = '|'.join(re.escape(p).replace(r'\ ', r'\s+') for p in parts)
+        self.pattern = re.compile(
+            r'(?<![^\W\d_])(?:'
+            r'(?P<part>' + part_alternation + r')(?:ES|S)?'
+            r'|(?P<side>' + '|'.join(sides) + r')S?'
+            r')(?![^\W\d_])'
+        )
+        self.extract = lru_cache(maxsize=cache_size)(self._extract)
+
+    def _extract(self, text):
+        """Tuple of Location triples for one description, in text order."""
+        if not isinstance(text, str) or not text:
+            return ()
+        parts = []
+        sides = []
+        for match in self.pattern.finditer(fold(text)):
+            if match.group('part'):
+                name = re.sub(r'\s+', ' ', match.group('part'))
+                parts.append((self.canonical[name], match.start(), match.end()))
+            else:
+                sides.append((self.laterality[match.group('side')], match.start(), match.end()))
+
+        # A laterality word belongs to the part right before it ("MANO DERECHA");
+        # only unclaimed words can apply to the part after them ("DERECHO DEL CUELLO")
+        assigned = [''] * len(parts)
+        claimed = set()
+        for i, (_, _, end) in enumerate(parts):
+            next_start = parts[i + 1][1] if i + 1 < len(parts) else len(text)
+            for j, (side, s_start, _) in enumerate(sides):
+                if end <= s_start <= min(end + LATERALITY_AFTER, next_start):
+                    assigned[i] = side
+                    claimed.add(j)
+                    break
+        for i, (_, start, _) in enumerate(parts):
+            if assigned[i]:
+                continue
+            for j in range(len(sides) - 1, -1, -1):
+                side, _, s_end = sides[j]
+                if j not in claimed and start - LATERALITY_BEFORE <= s_end <= start:
+                    assigned[i] = side
+                    claimed.add(j)
+                    break
+        return tuple(Location(part, side, start, end) for (part, start, end), side in zip(parts, assigned))
+
+    def body_parts(self, text):
+        """Set of canonical body parts mentioned in a text."""
+        return {location.body_part for location in self.extract(text)}
+
+    def extract_location(self, text):
+        """Comma-separated 'PART SIDE' string, the format of the ubicacion column."""
+        if pd.isna(text):
+            return ""
+        labels = [f"{loc.body_part} {loc.laterality}".strip() for loc in self.extract(text)]
+        return ', '.join(dict.fromkeys(labels))
+
+    def extract_series(self, series):
+        """Vectorized extract_location over a Series; each distinct text is scanned once."""
+        codes, uniques = pd.factorize(series)
+        labels = [self.extract_location(text) for text in uniques] + [""]
+        return pd.Series([labels[code] for code in codes], index=series.index, dtype=object)
+
+    def extract_frame(self, series):
+        """Long DataFrame with one row per (body_part, laterality, span) triple.
+
+        The ``row`` column holds the index label of the originating value.
+        """
+        codes, uniques = pd.factorize(series)
+        triples = [self.extract(text) for text in uniques]
+        rows = [
+            (index, *location)
+            for index, code in zip(series.index, codes) if code >= 0
+            for location in triples[code]
+        ]
+        return pd.DataFrame(rows, columns=['row', 'body_part', 'laterality', 'start', 'end'])
+
+
+LOCATION_EXTRACTOR = LocationExtractor()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ingest_tattoos import OUTPUT_COLUMNS, process_chunk
+
+
+def test_chunk_without_tattoos_returns_empty_frame():
+    pfsi = pd.DataFrame({'ID': [1, 2], 'Tatuajes': ['No presenta', None]})
+    repd = pd.DataFrame({'id_cedula_busqueda': [1], 'tipo_sena': ['CICATRIZ'], 'descripcion': ['en el brazo']})
+    for chunk, source in ((pfsi, 'pfsi'), (pfsi.iloc[[0]], 'pfsi'), (repd, 'repd')):
+        result = process_chunk(chunk, source)
+        assert result.empty
+        assert list(result.columns) == OUTPUT_COLUMNS
+
+
+def test_chunk_with_tattoo():
+    chunk = pd.DataFrame({'ID': [1, 2], 'Tatuajes': ['No presenta', 'BRAZO DERECHO: ROSA CON LEYENDA "MAMA"']})
+    result = process_chunk(chunk, 'pfsi')
+    assert result['id_persona'].tolist() == [2]
+    assert result['texto_extraido'].tolist() == ['MAMA']
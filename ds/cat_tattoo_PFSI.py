@@ -3,7 +3,10 @@
 import pandas as pd
 import os
 import json
-from shared import generate_with_deepseek_api, clean_response, save_results
+import argparse
+from shared import build_categorization_prompt, generate_response, clean_response, DEFAULT_SERVER
+from results_store import ResultWriter
+from telemetry import TELEMETRY
 from dotenv import load_dotenv
 
 def load_csv_file():
@@ -25,6 +28,13 @@ def load_csv_file():
     return None
 
 def main():
+    parser = argparse.ArgumentParser(description='Process tattoo descriptions from the PFSI dataset.')
+    parser.add_argument('--backend', choices=['deepseek', 'local'], default='deepseek',
+                        help='Send prompts to the DeepSeek API or to the local llm_server.py')
+    parser.add_argument('--server', default=DEFAULT_SERVER,
+                        help='Local model server address (http://host:port or unix:/path)')
+    args = parser.parse_args()
+
     df = load_csv_file()
     if df is None:
         return
@@ -38,70 +48,52 @@ def main():
     df = df[df['Tatuajes'].notna()]
     load_dotenv()
     api_key = os.getenv("DEEPSEEK_API_KEY")
-    if not api_key:
+    if args.backend == 'deepseek' and not api_key:
         print("Error: DEEPSEEK_API_KEY not found in environment variables.")
         return
     
     unique_tattoos = set()
+    TELEMETRY.start_run('cat_tattoo_PFSI')
+    # The context manager flushes the buffered responses even if the loop is interrupted
+    with ResultWriter('llm_tatuajes_procesados_PFSI', batch_size=50) as writer:
     
-    for _, row in df.iterrows():
-        id_persona = row['ID']
-        tattoo_description = row['Tatuajes']
-        if pd.isna(tattoo_description):
-            continue
+        for _, row in df.iterrows():
+            id_persona = row['ID']
+            tattoo_description = row['Tatuajes']
+            if pd.isna(tattoo_description):
+                continue
             
-        if tattoo_description in unique_tattoos:
-            print(f"Skipping duplicate tattoo description: {tattoo_description}")
-            continue
-        unique_tattoos.add(tattoo_description)
+            if tattoo_description in unique_tattoos:
+                print(f"Skipping duplicate tattoo description: {tattoo_description}")
+                continue
+            unique_tattoos.add(tattoo_description)
             
-        prompt = f"""
-        Eres un médico forense experto en tatuajes. Tu tarea es categorizar los siguientes tatuajes en un arreglo de Python. Para cada tatuaje, crea un registro y proporciona una descripción clara y concisa que incluya su ubicación, texto extraído, categorías y palabras clave.
-
-        Instrucciones:
-        1. Asegúrate de que cada tatuaje se describa solo una vez. No repitas tatuajes.
-        2. Devuelve un arreglo JSON válido y completo.
-        3. Si hay múltiples tatuajes, crea un registro separado para cada uno.
-
-        Tatuajes:
-        {tattoo_description}
-
-        Formato de salida:
-        [
-            {{
-                "id_persona": "{id_persona}",
-                "descripcion_original": "{tattoo_description}",
-                "descripcion_tattoo": "Descripción del tatuaje individual",
-                "ubicacion": "Ubicación del tatuaje",
-                "texto_extraido": "Texto extraído del tatuaje individual",
-                "categorias": "Categorías del tatuaje individual",
-                "palabras_clave": "Palabras clave del tatuaje individual, separadas por coma",
-                "diseño": "Diseño específico del tatuaje individual"
-            }}
-        ]
-        """
+            prompt = build_categorization_prompt(id_persona, tattoo_description)
         
-        response = generate_with_deepseek_api(prompt, api_key)
+            TELEMETRY.set_description(id_persona)
+            response = generate_response(prompt, api_key, args.backend, args.server)
         
-        if response:
-            print(f"Raw Response: {response}")
+            if response:
+                print(f"Raw Response: {response}")
             
-            try:
-                cleaned_response = clean_response(response)
-                print(f"Cleaned Response: {cleaned_response}")
-                
-                tattoo_array = json.loads(cleaned_response)
-                print("Parsed Array:", tattoo_array)
+                try:
+                    cleaned_response = clean_response(response)
+                    print(f"Cleaned Response: {cleaned_response}")
                 
-                result_df = pd.DataFrame(tattoo_array)
-                result_df.drop_duplicates(inplace=True)
+                    tattoo_array = json.loads(cleaned_response)
+                    print("Parsed Array:", tattoo_array)
                 
-                save_results(result_df, 'llm_tatuajes_procesados_PFSI.csv')
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"Failed to parse response as JSON: {e}")
-        else:
-            print("Failed to generate response.")
-        print("-" * 80)
+                    writer.add(tattoo_array)
+                    TELEMETRY.record_parse(True, records=len(tattoo_array))
+                except (json.JSONDecodeError, ValueError) as e:
+                    TELEMETRY.record_parse(False, error=e)
+                    print(f"Failed to parse response as JSON: {e}")
+            else:
+                print("Failed to generate response.")
+            print("-" * 80)
+
+    print(f"Saved {writer.rows_written} rows to {writer.dataset_dir}")
+    TELEMETRY.write()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
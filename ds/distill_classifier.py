@@ -0,0 +1,326 @@
+"""
+distill_classifier.py - Distil the accumulated LLM tattoo labels into a fast local model.
+
+Trains hashed character n-gram linear classifiers on the rows stored in
+llm_tatuajes_procesados_PFSI / _REPD and labels new tattoos without API calls:
+
+    python distill_classifier.py train
+    python distill_classifier.py predict --input ../csv/equi/tatuajes_procesados_PFSI.csv --source PFSI
+
+Each label group gets its own model: categorias (multi-label), ubicacion codes
+(multi-label body parts) and diseño (single label). Rows whose confidence falls
+below the threshold are written to a queue with the same layout as
+pendientes_llm_<SRC>.csv so they can be sent back to the LLM.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.multiclass import OneVsRestClassifier
+from sklearn.preprocessing import LabelEncoder, MultiLabelBinarizer
+
+from results_store import OUTPUT_DIR, load_results
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cross_tattoos'))
+from location_extractor import LOCATION_EXTRACTOR
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from text_normalization import strip_accents
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+MODEL_PATH = os.path.join(MODEL_DIR, 'tattoo_classifier.joblib')
+CONFIDENCE_THRESHOLD = 0.6
+OTHER_DESIGN = 'OTRO'
+
+
+def split_labels(value):
+    """Split a comma-separated LLM field into normalized labels."""
+    if not isinstance(value, str):
+        return []
+    return sorted({label.strip().lower() for label in value.split(',') if label.strip()})
+
+
+def location_codes(value):
+    """Map a free-text LLM location to the body-part codes it mentions."""
+    return sorted(LOCATION_EXTRACTOR.body_parts(value))
+
+
+def design_label(value):
+    """Normalize the diseño field to a single class label."""
+    if not isinstance(value, str) or not value.strip():
+        return OTHER_DESIGN
+    return strip_accents(value.strip().lower())
+
+
+def tattoo_text(df):
+    """Text fed to the classifier: the individual tattoo, or the original description."""
+    text = df['descripcion_tattoo'].where(df['descripcion_tattoo'].notna(), df['descripcion_original'])
+    return text.fillna('').astype(str)
+
+
+def build_vectorizer():
+    # Hashing keeps the model vocabulary-free and lets prediction run on unseen words
+    return HashingVectorizer(analyzer='char_wb', ngram_range=(3, 5), n_features=2 ** 20,
+                             alternate_sign=False, norm='l2', lowercase=True)
+
+
+def build_linear_model():
+    return SGDClassifier(loss='log_loss', alpha=1e-5, max_iter=20, tol=None, random_state=42)
+
+
+def multilabel_confidence(probabilities):
+    """Per-row confidence of a multi-label prediction: the least certain label decision."""
+    if probabilities.shape[1] == 0:
+        return np.ones(probabilities.shape[0])
+    return np.maximum(probabilities, 1 - probabilities).min(axis=1)
+
+
+def calibration_table(confidence, correct, bins=10):
+    """Observed accuracy per predicted-confidence bin."""
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    rows = []
+    for low, high in zip(edges[:-1], edges[1:]):
+        mask = (confidence >= low) & (confidence < high if high < 1.0 else confidence <= high)
+        if mask.any():
+            rows.append({
+                'bin': f"{low:.1f}-{high:.1f}",
+                'rows': int(mask.sum()),
+                'mean_confidence': round(float(confidence[mask].mean()), 3),
+                'accuracy': round(float(correct[mask].mean()), 3),
+            })
+    return rows
+
+
+class TattooClassifier:
+    """Multi-head linear classifier over hashed character n-grams."""
+
+    def __init__(self, min_count=5):
+        self.min_count = min_count
+        self.vectorizer = build_vectorizer()
+        self.category_binarizer = None
+        self.location_binarizer = None
+        self.design_encoder = None
+        self.category_model = None
+        self.location_model = None
+        self.design_model = None
+
+    def _frequent(self, label_lists):
+        counts = Counter(label for labels in label_lists for label in labels)
+        keep = {label for label, count in counts.items() if count >= self.min_count}
+        return [[label for label in labels if label in keep] for labels in label_lists], sorted(keep)
+
+    def _fit_multilabel(self, X, label_lists):
+        """Binarizer and one-vs-rest model of a multi-label head; the model is None when no label is frequent."""
+        label_lists, classes = self._frequent(label_lists)
+        binarizer = MultiLabelBinarizer(classes=classes).fit(label_lists)
+        if not classes:
+            return binarizer, None
+        model = OneVsRestClassifier(build_linear_model(), n_jobs=-1)
+        model.fit(X, binarizer.transform(label_lists))
+        return binarizer, model
+
+    def fit(self, texts, categories, locations, designs):
+        design_counts = Counter(designs)
+        designs = [d if design_counts[d] >= self.min_count else OTHER_DESIGN for d in designs]
+        if len(set(designs)) < 2:
+            raise ValueError(f"Need at least two diseño classes with {self.min_count} or more rows to train, "
+                             f"found {sorted(set(designs))}; lower --min-count or label more tattoos")
+
+        X = self.vectorizer.transform(texts)
+        self.category_binarizer, self.category_model = self._fit_multilabel(X, categories)
+        self.location_binarizer, self.location_model = self._fit_multilabel(X, locations)
+        for head, binarizer in [('categorias', self.category_binarizer), ('ubicacion', self.location_binarizer)]:
+            if not len(binarizer.classes_):
+                print(f"No {head} label reaches --min-count {self.min_count}; the head predicts no labels")
+
+        self.design_encoder = LabelEncoder().fit(designs)
+        self.design_model = build_linear_model()
+        self.design_model.fit(X, self.design_encoder.transform(designs))
+        return self
+
+    @staticmethod
+    def _multilabel_proba(model, X):
+        if model is None:
+            return np.zeros((X.shape[0], 0))
+        if model.multilabel_:
+            return model.predict_proba(X)
+        # With a single label OneVsRestClassifier answers as a binary model: (not label, label)
+        classes = model.label_binarizer_.classes_
+        if len(classes) == 1:  # The label was on every training row (or on none)
+            return np.full((X.shape[0], 1), float(classes[0]))
+        return model.predict_proba(X)[:, 1:]
+
+    def predict(self, texts):
+        """Return a DataFrame with the predicted labels and per-head confidences."""
+        X = self.vectorizer.transform(texts)
+
+        category_proba = self._multilabel_proba(self.category_model, X)
+        location_proba = self._multilabel_proba(self.location_model, X)
+        design_proba = self.design_model.predict_proba(X)
+
+        category_sets = self.category_binarizer.inverse_transform(category_proba >= 0.5)
+        location_sets = self.location_binarizer.inverse_transform(location_proba >= 0.5)
+        design_index = design_proba.argmax(axis=1)
+
+        result = pd.DataFrame({
+            'categorias': [', '.join(labels) for labels in category_sets],
+            'ubicacion': [', '.join(codes) for codes in location_sets],
+            'diseño': self.design_encoder.inverse_transform(design_index),
+            'confianza_categorias': multilabel_confidence(category_proba),
+            'confianza_ubicacion': multilabel_confidence(location_proba),
+            'confianza_diseño': design_proba.max(axis=1),
+        })
+        result['confianza'] = result[['confianza_categorias', 'confianza_ubicacion', 'confianza_diseño']].min(axis=1)
+        return result
+
+
+def load_training_data():
+    """Load and label every LLM-processed tattoo from both registries."""
+    frames = []
+    for label in ['PFSI', 'REPD']:
+        try:
+            df = load_results(f'llm_tatuajes_procesados_{label}')
+            df['fuente'] = label
+            frames.append(df)
+            print(f"Loaded {len(df)} LLM-labelled rows from {label}")
+        except FileNotFoundError:
+            print(f"No LLM output found for {label}, skipping")
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    df['texto'] = tattoo_text(df)
+    return df[df['texto'].str.strip() != ''].reset_index(drop=True)
+
+
+def train(args):
+    df = load_training_data()
+    if df is None:
+        return
+
+    categories = df['categorias'].map(split_labels).tolist()
+    locations = df['ubicacion'].map(location_codes).tolist()
+    designs = df['diseño'].map(design_label).tolist()
+
+    indices = np.arange(len(df))
+    train_idx, test_idx = train_test_split(indices, test_size=args.test_size, random_state=42)
+
+    start = time.time()
+    try:
+        model = TattooClassifier(min_count=args.min_count).fit(
+            df['texto'].iloc[train_idx],
+            [categories[i] for i in train_idx],
+            [locations[i] for i in train_idx],
+            [designs[i] for i in train_idx],
+        )
+    except ValueError as e:
+        print(f"Cannot train: {e}")
+        return
+    print(f"Trained on {len(train_idx)} rows in {time.time() - start:.1f}s")
+
+    predicted = model.predict(df['texto'].iloc[test_idx])
+    report = {'train_rows': int(len(train_idx)), 'test_rows': int(len(test_idx)), 'heads': {}}
+    for head, truth, column in [
+        ('categorias', [categories[i] for i in test_idx], 'categorias'),
+        ('ubicacion', [locations[i] for i in test_idx], 'ubicacion'),
+    ]:
+        predicted_sets = predicted[column].map(split_labels if head == 'categorias' else
+                                               lambda v: v.split(', ') if v else [])
+        correct = np.array([set(p) == set(t) for p, t in zip(predicted_sets, truth)])
+        confidence = predicted[f'confianza_{head}'].to_numpy()
+        report['heads'][head] = {
+            'exact_match': round(float(correct.mean()), 3),
+            'calibration': calibration_table(confidence, correct),
+        }
+
+    known_designs = set(model.design_encoder.classes_)
+    design_truth = np.array([d if d in known_designs else OTHER_DESIGN for d in (designs[i] for i in test_idx)])
+    correct = predicted['diseño'].to_numpy() == design_truth
+    report['heads']['diseño'] = {
+        'accuracy': round(float(correct.mean()), 3),
+        'calibration': calibration_table(predicted['confianza_diseño'].to_numpy(), correct),
+    }
+    low = predicted['confianza'] < args.threshold
+    report['low_confidence_share'] = round(float(low.mean()), 3)
+    report['threshold'] = args.threshold
+
+    # Refit on every row before saving; the split above only measures quality
+    model = TattooClassifier(min_count=args.min_count).fit(df['texto'], categories, locations, designs)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    joblib.dump(model, MODEL_PATH)
+    print(f"Model saved to {MODEL_PATH}")
+
+    report_path = os.path.join(OUTPUT_DIR, 'distill_calibration_report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"Calibration report saved to {report_path}")
+
+
+def predict(args):
+    model = joblib.load(MODEL_PATH)
+    df = pd.read_csv(args.input)
+    texts = df[args.text_column].fillna('').astype(str)
+
+    start = time.time()
+    predicted = model.predict(texts)
+    elapsed = time.time() - start
+    print(f"Labelled {len(df)} rows in {elapsed:.2f}s ({len(df) / max(elapsed, 1e-9):.0f} rows/s)")
+
+    result = pd.concat([
+        df[[args.id_column]].rename(columns={args.id_column: 'id_persona'}).reset_index(drop=True),
+        texts.rename('descripcion_tattoo').reset_index(drop=True),
+        predicted,
+    ], axis=1)
+    output_path = args.output or os.path.join(OUTPUT_DIR, f'distill_tatuajes_procesados_{args.source}.parquet')
+    result.to_parquet(output_path, index=False)
+    print(f"Predictions saved to {output_path}")
+
+    # Same layout as the hybrid categorizer queue, so both can feed the LLM scripts
+    low = result[result['confianza'] < args.threshold]
+    queue_df = pd.DataFrame({
+        'id_persona': low['id_persona'],
+        'descripcion': low['descripcion_tattoo'],
+        'confianza': low['confianza'].round(2),
+        'motivos': 'low_model_confidence',
+    })
+    queue_path = os.path.join(OUTPUT_DIR, f'pendientes_llm_distill_{args.source}.csv')
+    queue_df.to_csv(queue_path, index=False)
+    print(f"{len(queue_df)} low-confidence rows ({len(queue_df) / max(len(result), 1):.1%}) queued in {queue_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Distilled local tattoo classifier.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='Train on the accumulated LLM output')
+    train_parser.add_argument('--min-count', type=int, default=5, help='Minimum examples per label')
+    train_parser.add_argument('--test-size', type=float, default=0.2)
+    train_parser.add_argument('--threshold', type=float, default=CONFIDENCE_THRESHOLD)
+
+    predict_parser = subparsers.add_parser('predict', help='Label new tattoos without API calls')
+    predict_parser.add_argument('--input', required=True, help='CSV with one tattoo per row')
+    predict_parser.add_argument('--source', default='PFSI', help='Label used in output file names')
+    predict_parser.add_argument('--text-column', default='descripcion_tattoo')
+    predict_parser.add_argument('--id-column', default='id_persona')
+    predict_parser.add_argument('--output', default=None)
+    predict_parser.add_argument('--threshold', type=float, default=CONFIDENCE_THRESHOLD)
+
+    args = parser.parse_args()
+    if args.command == 'train':
+        train(args)
+    else:
+        predict(args)
+
+
+if __name__ == "__main__":
+    main()
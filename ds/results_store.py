@@ -0,0 +1,120 @@
+# results_store.py
+
+import os
+import time
+import pandas as pd
+
+# Fixed column order for every categorized tattoo, whatever keys the model returned
+RESULT_COLUMNS = [
+    "id_persona",
+    "descripcion_original",
+    "descripcion_tattoo",
+    "ubicacion",
+    "texto_extraido",
+    "categorias",
+    "palabras_clave",
+    "diseño",
+]
+
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'csv', 'equi')
+
+
+def normalize_record(record):
+    """Project a raw LLM record onto RESULT_COLUMNS, coercing every value to a string."""
+    normalized = {}
+    for column in RESULT_COLUMNS:
+        value = record.get(column) if isinstance(record, dict) else None
+        if isinstance(value, (list, tuple, set)):
+            value = ', '.join(str(v) for v in value)
+        elif value is not None and not isinstance(value, str):
+            value = None if pd.isna(value) else str(value)
+        normalized[column] = value
+    return normalized
+
+
+class ResultWriter:
+    """Buffer categorized tattoos and flush them in batches to a Parquet dataset.
+
+    Each flush writes one part file to ``csv/equi/<dataset_name>/`` through a
+    temporary file followed by an atomic rename, so readers never see a
+    half-written part and an interrupted run keeps every completed batch.
+    """
+
+    def __init__(self, dataset_name, batch_size=200, output_dir=OUTPUT_DIR):
+        self.dataset_dir = os.path.join(output_dir, dataset_name)
+        self.batch_size = batch_size
+        self.buffer = []
+        self.rows_written = 0
+        self.part_prefix = f"part-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+        self.part_index = 0
+        os.makedirs(self.dataset_dir, exist_ok=True)
+
+    def add(self, records):
+        """Queue one or more records; flush when the buffer reaches batch_size."""
+        if isinstance(records, dict):
+            records = [records]
+        self.buffer.extend(normalize_record(record) for record in records)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records as a new part file."""
+        if not self.buffer:
+            return
+        batch_df = pd.DataFrame(self.buffer, columns=RESULT_COLUMNS).astype('string')
+        batch_df.drop_duplicates(inplace=True)
+
+        part_name = f"{self.part_prefix}-{self.part_index:05d}.parquet"
+        # Dot-prefixed files are ignored by Parquet dataset readers until renamed
+        tmp_path = os.path.join(self.dataset_dir, f".{part_name}.tmp")
+        final_path = os.path.join(self.dataset_dir, part_name)
+        batch_df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, final_path)
+
+        self.part_index += 1
+        self.rows_written += len(batch_df)
+        self.buffer = []
+        print(f"Flushed {len(batch_df)} rows to {final_path}")
+
+    def close(self):
+        """Flush any remaining records."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_results(dataset_name, output_dir=OUTPUT_DIR):
+    """Load a categorized tattoo dataset: the legacy CSV rows plus every Parquet part.
+
+    Runs before the Parquet sink appended to ``<dataset_name>.csv``, so those
+    rows are still part of the dataset once part files exist. Raises
+    FileNotFoundError when neither is present.
+    """
+    frames = []
+    csv_path = os.path.join(output_dir, f"{dataset_name}.csv")
+    if os.path.exists(csv_path):
+        legacy_df = pd.read_csv(csv_path, dtype=str)
+        # Legacy files may miss columns depending on what the model returned
+        frames.append(legacy_df.reindex(columns=RESULT_COLUMNS))
+
+    dataset_dir = os.path.join(output_dir, dataset_name)
+    if os.path.isdir(dataset_dir) and any(f.endswith('.parquet') for f in os.listdir(dataset_dir)):
+        parts_df = pd.read_parquet(dataset_dir)
+        frames.append(parts_df.reindex(columns=RESULT_COLUMNS))
+
+    if not frames:
+        raise FileNotFoundError(f"No results found for {dataset_name} in {output_dir}")
+
+    df = pd.concat(frames, ignore_index=True).astype('string')
+    # A batch re-run over rows already in the CSV yields the same records again
+    df = df.drop_duplicates(ignore_index=True).astype(object)
+    df = df.where(df.notna(), None)
+    # Keep numeric PFSI ids comparable with the other CSV sources
+    numeric_ids = pd.to_numeric(df['id_persona'], errors='coerce')
+    if numeric_ids.notna().sum() == df['id_persona'].notna().sum():
+        df['id_persona'] = numeric_ids
+    return df
@@ -1,9 +1,14 @@
 # deepseek_shared.py
 
 import os
-import json
 import re
+import sys
+import time
 from openai import OpenAI
+from telemetry import TELEMETRY
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cross_tattoos'))
+from llm_server import DEFAULT_SERVER, generate_with_local_model
 
 # Shared system prompt
 SHARED_SYSTEM_PROMPT = {
@@ -11,10 +16,39 @@ SHARED_SYSTEM_PROMPT = {
     "content": "Eres un médico forense experto en tatuajes. Tu tarea es analizar descripciones de tatuajes y categorizarlos de manera consistente. Responde solo con un arreglo en formato Python, sin explicaciones adicionales."
 }
 
+def build_categorization_prompt(id_persona, tattoo_description):
+    """Build the categorization prompt shared by the PFSI and REPD scripts."""
+    return f"""
+    Eres un médico forense experto en tatuajes. Tu tarea es categorizar los siguientes tatuajes en un arreglo de Python. Para cada tatuaje, crea un registro y proporciona una descripción clara y concisa que incluya su ubicación, texto extraído, categorías y palabras clave.
+
+    Instrucciones:
+    1. Asegúrate de que cada tatuaje se describa solo una vez. No repitas tatuajes.
+    2. Devuelve un arreglo JSON válido y completo.
+    3. Si hay múltiples tatuajes, crea un registro separado para cada uno.
+
+    Tatuajes:
+    {tattoo_description}
+
+    Formato de salida:
+    [
+        {{
+            "id_persona": "{id_persona}",
+            "descripcion_original": "{tattoo_description}",
+            "descripcion_tattoo": "Descripción del tatuaje individual",
+            "ubicacion": "Ubicación del tatuaje",
+            "texto_extraido": "Texto extraído del tatuaje individual",
+            "categorias": "Categorías del tatuaje individual",
+            "palabras_clave": "Palabras clave del tatuaje individual, separadas por coma",
+            "diseño": "Diseño específico del tatuaje individual"
+        }}
+    ]
+    """
+
 def generate_with_deepseek_api(prompt, api_key):
     """Send a prompt to the DeepSeek API and return the generated response."""
     client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
     
+    start = time.perf_counter()
     try:
         response = client.chat.completions.create(
             model="deepseek-chat",
@@ -26,11 +60,31 @@ def generate_with_deepseek_api(prompt, api_key):
             temperature=0.7,
             stream=False
         )
+        usage = response.usage
+        TELEMETRY.record_call(
+            "deepseek", "deepseek-chat", time.perf_counter() - start,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            cache_hit_tokens=getattr(usage, "prompt_cache_hit_tokens", None)
+        )
         return response.choices[0].message.content
     except Exception as e:
+        TELEMETRY.record_call("deepseek", "deepseek-chat", time.perf_counter() - start, error=e)
         print(f"Error calling DeepSeek API: {e}")
         return None
 
+def generate_response(prompt, api_key=None, backend="deepseek", server=DEFAULT_SERVER):
+    """Send a prompt to DeepSeek or to the warm local model served by llm_server.py."""
+    if backend == "local":
+        # The local server has no chat roles, so the system prompt is prepended
+        full_prompt = f"{SHARED_SYSTEM_PROMPT['content']}\n\n{prompt}"
+        start = time.perf_counter()
+        response = generate_with_local_model(full_prompt, server=server, max_new_tokens=1000, temperature=0.7)
+        TELEMETRY.record_call("local", server, time.perf_counter() - start,
+                              error=None if response else "no response from local server")
+        return response
+    return generate_with_deepseek_api(prompt, api_key)
+
 def clean_response(response):
     """Clean the response to extract only the JSON array."""
     # Remove markdown code blocks (```json or ```python)
@@ -38,14 +92,7 @@ def clean_response(response):
     
     # Ensure the response is a valid JSON array
     if not response.startswith("[") or not response.endswith("]"):
+        TELEMETRY.record_parse(False, error="not a JSON array")
         raise ValueError("Response is not a valid JSON array")
     
     return response
-
-def save_results(result_df, output_filename):
-    """Save the results to a CSV file."""
-    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'csv', 'equi')
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, output_filename)
-    result_df.to_csv(output_path, mode='a', header=not os.path.exists(output_path), index=False)
-    print(f"Results saved to {output_path}")
\ No newline at end of file
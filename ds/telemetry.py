@@ -0,0 +1,179 @@
+# telemetry.py
+
+import json
+import os
+import threading
+import time
+import pandas as pd
+
+from results_store import OUTPUT_DIR
+
+TELEMETRY_DIR = os.path.join(OUTPUT_DIR, 'telemetry')
+
+# USD per million tokens (deepseek-chat list price); override with the
+# DEEPSEEK_PRICE_INPUT / DEEPSEEK_PRICE_CACHE_HIT / DEEPSEEK_PRICE_OUTPUT env vars
+DEFAULT_PRICES = {
+    "input": 0.27,
+    "cache_hit": 0.07,
+    "output": 1.10,
+}
+
+CALL_COLUMNS = [
+    "call",
+    "backend",
+    "model",
+    "description_id",
+    "latency_s",
+    "prompt_tokens",
+    "cache_hit_tokens",
+    "completion_tokens",
+    "cost_usd",
+    "status",
+    "records",
+    "error",
+]
+
+
+def load_prices():
+    """Token prices per million, with environment overrides."""
+    return {
+        key: float(os.getenv(f"DEEPSEEK_PRICE_{key.upper()}", value))
+        for key, value in DEFAULT_PRICES.items()
+    }
+
+
+def percentile(series, q):
+    series = series.dropna()
+    return round(float(series.quantile(q)), 4) if not series.empty else None
+
+
+class LLMTelemetry:
+    """Per-call record of latency, token usage, cost and parse outcome for one run.
+
+    ``record_call`` is invoked by the API wrappers in shared.py and
+    ``record_parse`` by whoever parses the response; the parse outcome is
+    attached to the most recent call, so each call is counted exactly once.
+    """
+
+    def __init__(self, run_name="llm"):
+        self.lock = threading.Lock()
+        self.prices = load_prices()
+        self.start_run(run_name)
+
+    def start_run(self, run_name):
+        """Reset the recorder for a new run."""
+        with self.lock:
+            self.run_name = run_name
+            self.run_id = f"{run_name}_{time.strftime('%Y%m%d%H%M%S')}"
+            self.started = time.time()
+            self.calls = []
+            self.description_id = None
+
+    def set_description(self, description_id):
+        """Tag the following calls with the id of the description being categorized."""
+        self.description_id = description_id
+
+    def cost(self, prompt_tokens, cache_hit_tokens, completion_tokens):
+        if prompt_tokens is None or completion_tokens is None:
+            return None
+        cache_hit_tokens = cache_hit_tokens or 0
+        return (
+            (prompt_tokens - cache_hit_tokens) * self.prices["input"]
+            + cache_hit_tokens * self.prices["cache_hit"]
+            + completion_tokens * self.prices["output"]
+        ) / 1_000_000
+
+    def record_call(self, backend, model, latency, prompt_tokens=None, completion_tokens=None,
+                    cache_hit_tokens=None, error=None):
+        with self.lock:
+            self.calls.append({
+                "call": len(self.calls) + 1,
+                "backend": backend,
+                "model": model,
+                "description_id": self.description_id,
+                "latency_s": round(latency, 4),
+                "prompt_tokens": prompt_tokens,
+                "cache_hit_tokens": cache_hit_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": self.cost(prompt_tokens, cache_hit_tokens, completion_tokens),
+                "status": "api_error" if error else "pending",
+                "records": 0,
+                "error": str(error) if error else None,
+            })
+
+    def record_parse(self, ok, records=0, error=None):
+        """Attach the parse outcome to the latest call."""
+        with self.lock:
+            if not self.calls:
+                return
+            call = self.calls[-1]
+            call["status"] = "ok" if ok else "parse_error"
+            call["records"] = records
+            if error:
+                call["error"] = str(error)
+
+    def summary(self):
+        df = pd.DataFrame(self.calls, columns=CALL_COLUMNS)
+        elapsed = time.time() - self.started
+        answered = df[df["status"] != "api_error"]
+        parsed = int((df["status"] == "ok").sum())
+        records = int(df["records"].sum())
+        total_cost = float(df["cost_usd"].dropna().sum())
+
+        summary = {
+            "run_id": self.run_id,
+            "calls": len(df),
+            "ok": parsed,
+            "api_errors": int((df["status"] == "api_error").sum()),
+            "parse_errors": int((df["status"] == "parse_error").sum()),
+            "parse_failure_rate": round(1 - parsed / len(answered), 4) if len(answered) else None,
+            "records": records,
+            "elapsed_s": round(elapsed, 2),
+            "calls_per_second": round(len(df) / elapsed, 4) if elapsed else None,
+            "latency_s": {
+                "mean": round(float(df["latency_s"].mean()), 4) if len(df) else None,
+                "p50": percentile(df["latency_s"], 0.50),
+                "p95": percentile(df["latency_s"], 0.95),
+                "p99": percentile(df["latency_s"], 0.99),
+                "max": round(float(df["latency_s"].max()), 4) if len(df) else None,
+            },
+            # One call per description, so per-call tokens are tokens per description
+            "tokens_per_description": {},
+            "total_prompt_tokens": int(df["prompt_tokens"].dropna().sum()),
+            "total_completion_tokens": int(df["completion_tokens"].dropna().sum()),
+            "total_cost_usd": round(total_cost, 6),
+            "cost_per_description_usd": round(total_cost / len(df), 6) if len(df) else None,
+            "cost_per_tattoo_usd": round(total_cost / records, 6) if records else None,
+            "prices_per_million": self.prices,
+        }
+        for column, name in [("prompt_tokens", "input"), ("completion_tokens", "output")]:
+            tokens = pd.to_numeric(df[column], errors="coerce")
+            summary["tokens_per_description"][name] = {
+                "mean": round(float(tokens.mean()), 1) if tokens.notna().any() else None,
+                "p50": percentile(tokens, 0.50),
+                "p95": percentile(tokens, 0.95),
+                "p99": percentile(tokens, 0.99),
+            }
+        return summary
+
+    def write(self, output_dir=TELEMETRY_DIR):
+        """Write the per-call CSV and the JSON summary of the run; return the summary."""
+        os.makedirs(output_dir, exist_ok=True)
+        calls_path = os.path.join(output_dir, f"{self.run_id}_calls.csv")
+        summary_path = os.path.join(output_dir, f"{self.run_id}_summary.json")
+
+        pd.DataFrame(self.calls, columns=CALL_COLUMNS).to_csv(calls_path, index=False)
+        summary = self.summary()
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+        latency = summary["latency_s"]
+        print(f"LLM telemetry: {summary['calls']} calls, {summary['parse_errors']} parse errors, "
+              f"{summary['api_errors']} API errors, latency p50/p95/p99 = "
+              f"{latency['p50']}/{latency['p95']}/{latency['p99']}s, cost ${summary['total_cost_usd']}")
+        print(f"Telemetry saved to {calls_path} and {summary_path}")
+        return summary
+
+
+# Shared recorder used by the API wrappers in shared.py
+TELEMETRY = LLMTelemetry()
@@ -0,0 +1,304 @@
+"""
+cluster_tattoos.py - Incremental clustering of PFSI and REPD tattoo descriptions.
+
+Tattoos are read in chunks from the per-tattoo CSVs written by
+cross_tattoos/ingest_tattoos.py, tokenized, hashed into a fixed-width sparse
+matrix and fed to MiniBatchKMeans.partial_fit. Memory depends on the chunk
+size and the number of hash buckets, not on the number of tattoos, and a
+later run only fits the people that were not seen before.
+
+    python cluster_tattoos.py fit --clusters 40
+    python cluster_tattoos.py label
+
+``label`` writes the cluster of every tattoo plus a summary with the top
+terms and the descriptions closest to each centroid, to be reviewed as
+candidate categories.
+"""
+
+import argparse
+import heapq
+import os
+import sys
+import time
+from collections import Counter
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from stoplist_tokenizer import TOKEN_PATTERN, spanish_stopwords
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cross_tattoos'))
+from location_extractor import BODY_PARTS, LATERALITY
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from text_normalization import strip_accents
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+TATTOO_CSV_DIR = os.path.join(script_dir, '..', 'cross_tattoos', 'csv', 'equi')
+MODEL_PATH = os.path.join(script_dir, 'models', 'tattoo_clusters.joblib')
+LABELS_PATH = os.path.join(script_dir, 'csv', 'equi', 'tattoo_clusters.csv')
+SUMMARY_PATH = os.path.join(script_dir, 'txt', 'tattoo_clusters.txt')
+
+SOURCES = {
+    'PFSI': 'tatuajes_procesados_PFSI.csv',
+    'REPD': 'tatuajes_procesados_REPD.csv',
+}
+
+# Words present in almost every description; they would pull all clusters together
+DOMAIN_STOPWORDS = [
+    'tatuaje', 'tatuajes', 'region', 'forma', 'figura', 'tercio', 'proximal', 'distal',
+    'medio', 'cara', 'anterior', 'posterior', 'lateral', 'interna', 'externa', 'superior',
+    'inferior', 'tinta', 'color', 'colores', 'leyenda', 'dice', 'siguiente', 'con',
+]
+
+N_FEATURES = 2 ** 18
+
+
+def _identity(tokens):
+    return tokens
+
+
+class TattooClusterer:
+    """MiniBatchKMeans over hashed unigrams and bigrams, updated with partial_fit.
+
+    Hash buckets cannot be reversed, so the first term seen in each bucket
+    is remembered to report top terms; the table never exceeds N_FEATURES.
+    """
+
+    def __init__(self, n_clusters=40, state=None):
+        state = state or {}
+        self.n_clusters = state.get('n_clusters', n_clusters)
+        self.model = state.get('model') or MiniBatchKMeans(
+            n_clusters=self.n_clusters, batch_size=4096, n_init=3, random_state=42)
+        self.terms = state.get('terms', {})
+        self.seen_ids = state.get('seen_ids', set())
+        self.fitted_rows = state.get('fitted_rows', 0)
+        stop_words = set(spanish_stopwords()) | set(DOMAIN_STOPWORDS)
+        stop_words |= {word.lower() for word in BODY_PARTS + LATERALITY}
+        self.stop_words = frozenset(strip_accents(word) for word in stop_words)
+        self.vectorizer = HashingVectorizer(analyzer=_identity, n_features=N_FEATURES,
+                                            alternate_sign=False, norm='l2')
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        return cls(state=joblib.load(path))
+
+    def save(self, path=MODEL_PATH):
+        # Plain state dict, so the file loads whether this module runs as a script or is imported
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump({
+            'n_clusters': self.n_clusters,
+            'model': self.model,
+            'terms': self.terms,
+            'seen_ids': self.seen_ids,
+            'fitted_rows': self.fitted_rows,
+        }, path)
+
+    @property
+    def is_fitted(self):
+        return hasattr(self.model, 'cluster_centers_')
+
+    def tokenize(self, text):
+        """Accent-free word tokens without stopwords, followed by their bigrams."""
+        words = [word for word in TOKEN_PATTERN.findall(strip_accents(text.lower()))
+                 if word not in self.stop_words and not word.isdigit() and len(word) > 2]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def transform(self, texts):
+        """Hashed feature matrix of a list of descriptions."""
+        return self.vectorizer.transform([self.tokenize(text) for text in texts])
+
+    def _remember_terms(self, texts):
+        new_terms = list({term for text in texts for term in self.tokenize(text)})
+        if not new_terms:
+            return
+        buckets = self.vectorizer.transform([[term] for term in new_terms]).indices
+        for bucket, term in zip(buckets, new_terms):
+            self.terms.setdefault(int(bucket), term)
+
+    def partial_fit(self, texts, weights):
+        """Update the centroids with distinct descriptions weighted by their frequency."""
+        self._remember_terms(texts)
+        X = self.transform(texts)
+        nonempty = X.getnnz(axis=1) > 0
+        self.model.partial_fit(X[nonempty], sample_weight=np.asarray(weights)[nonempty])
+        self.fitted_rows += int(np.asarray(weights)[nonempty].sum())
+
+    def predict(self, texts):
+        """Cluster and distance to its centroid for each description; -1 when nothing is left to cluster."""
+        X = self.transform(texts)
+        distances = self.model.transform(X)
+        clusters = distances.argmin(axis=1)
+        nearest = distances[np.arange(len(clusters)), clusters]
+        empty = X.getnnz(axis=1) == 0
+        clusters[empty] = -1
+        nearest[empty] = np.nan
+        return clusters, nearest
+
+    def top_terms(self, n_terms=10):
+        """Highest-weighted terms of each centroid."""
+        result = []
+        for center in self.model.cluster_centers_:
+            buckets = np.argsort(center)[::-1][:n_terms * 2]
+            terms = [self.terms[b] for b in buckets if center[b] > 0 and b in self.terms]
+            result.append(terms[:n_terms])
+        return result
+
+
+def read_tattoos(sources, chunksize):
+    """Yield (source, chunk) pairs with id_persona and a non-empty descripcion_tattoo."""
+    for source in sources:
+        path = os.path.join(TATTOO_CSV_DIR, SOURCES[source])
+        if not os.path.exists(path):
+            print(f"Skipping {source}: {path} not found (run cross_tattoos/ingest_tattoos.py first)")
+            continue
+        for chunk in pd.read_csv(path, usecols=['id_persona', 'descripcion_tattoo'], chunksize=chunksize):
+            chunk = chunk[chunk['descripcion_tattoo'].notna()]
+            chunk = chunk.assign(person_key=source + ':' + chunk['id_persona'].astype(str))
+            yield source, chunk
+
+
+def distinct_counts(clusterer, pending):
+    """Frequency of each distinct description with at least one term."""
+    counts = pd.concat(pending).value_counts()
+    return counts[clusterer.transform(counts.index.tolist()).getnnz(axis=1) > 0]
+
+
+def fit_pending(clusterer, pending):
+    """partial_fit the pending descriptions; False while too few are distinct for the first fit."""
+    counts = distinct_counts(clusterer, pending)
+    # The first partial_fit needs at least one distinct sample per cluster
+    if not clusterer.is_fitted and len(counts) < clusterer.n_clusters:
+        return False
+    if len(counts):
+        clusterer.partial_fit(counts.index.tolist(), counts.to_numpy())
+    return True
+
+
+def fit(args):
+    if os.path.exists(MODEL_PATH) and not args.reset:
+        clusterer = TattooClusterer.load()
+        print(f"Loaded model with {clusterer.n_clusters} clusters "
+              f"({len(clusterer.seen_ids)} people, {clusterer.fitted_rows} tattoos)")
+    else:
+        clusterer = TattooClusterer(n_clusters=args.clusters)
+
+    start = time.time()
+    new_ids = set()
+    pending = []
+    rows = 0
+    for _, chunk in read_tattoos(args.source, args.chunksize):
+        chunk = chunk[~chunk['person_key'].isin(clusterer.seen_ids)]
+        if chunk.empty:
+            continue
+        new_ids.update(chunk['person_key'])
+        rows += len(chunk)
+        pending.append(chunk['descripcion_tattoo'])
+        if fit_pending(clusterer, pending):
+            pending = []
+    if pending:
+        # Still pending: the first fit never had enough distinct descriptions
+        counts = distinct_counts(clusterer, pending)
+        print(f"Only {len(counts)} distinct descriptions; need at least {clusterer.n_clusters} to fit")
+        return
+
+    if not rows:
+        print("No new tattoos to fit")
+        return
+    clusterer.seen_ids.update(new_ids)
+    clusterer.save()
+    elapsed = time.time() - start
+    print(f"Fitted {rows} new tattoos from {len(new_ids)} people in {elapsed:.1f}s "
+          f"({rows / max(elapsed, 1e-9):.0f} rows/s)")
+    print(f"Model saved to {MODEL_PATH}")
+
+
+def label(args):
+    clusterer = TattooClusterer.load()
+    start = time.time()
+    tmp_path = f"{LABELS_PATH}.tmp"
+    os.makedirs(os.path.dirname(LABELS_PATH), exist_ok=True)
+
+    sizes = Counter()
+    # Per cluster, a bounded max-heap (negated distance) of the closest distinct descriptions
+    examples = {cluster: [] for cluster in range(clusterer.n_clusters)}
+    header = True
+    rows = 0
+    for source, chunk in read_tattoos(args.source, args.chunksize):
+        codes, uniques = pd.factorize(chunk['descripcion_tattoo'])
+        clusters, distances = clusterer.predict(uniques.tolist())
+
+        for text, cluster, distance in zip(uniques, clusters, distances):
+            if cluster < 0:
+                continue
+            heap = examples[cluster]
+            item = (-distance, text)
+            if any(existing == text for _, existing in heap):
+                continue
+            if len(heap) < args.examples:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+        result = pd.DataFrame({
+            'fuente': source,
+            'id_persona': chunk['id_persona'].to_numpy(),
+            'descripcion_tattoo': chunk['descripcion_tattoo'].to_numpy(),
+            'cluster': clusters[codes],
+            'distancia': np.round(distances[codes], 4),
+        })
+        sizes.update(result['cluster'].tolist())
+        result.to_csv(tmp_path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+        rows += len(result)
+
+    if header:
+        print("No tattoos to label")
+        return
+    os.replace(tmp_path, LABELS_PATH)
+    elapsed = time.time() - start
+    print(f"Labelled {rows} tattoos in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+    print(f"Cluster labels saved to {LABELS_PATH}")
+
+    top_terms = clusterer.top_terms(args.terms)
+    os.makedirs(os.path.dirname(SUMMARY_PATH), exist_ok=True)
+    with open(SUMMARY_PATH, 'w', encoding='utf-8') as f:
+        f.write("Tattoo Clusters:\n")
+        for cluster in sorted(range(clusterer.n_clusters), key=lambda c: -sizes[c]):
+            f.write(f"\nCluster {cluster}: {', '.join(top_terms[cluster][:3])} ({sizes[cluster]} tattoos)\n")
+            f.write(f"Top terms: {', '.join(top_terms[cluster])}\n")
+            for _, text in sorted(examples[cluster], reverse=True):
+                f.write(f"- {text}\n")
+        if sizes[-1]:
+            f.write(f"\nUnclustered (no terms left after stopwords): {sizes[-1]} tattoos\n")
+    print(f"Cluster summary saved to {SUMMARY_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental clustering of tattoo descriptions.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fit_parser = subparsers.add_parser('fit', help='Update the clusters with tattoos not seen before')
+    fit_parser.add_argument('--clusters', type=int, default=40, help='Number of clusters for a new model')
+    fit_parser.add_argument('--reset', action='store_true', help='Discard the saved model and start over')
+
+    label_parser = subparsers.add_parser('label', help='Assign every tattoo to a cluster and write the summary')
+    label_parser.add_argument('--terms', type=int, default=10, help='Top terms per cluster')
+    label_parser.add_argument('--examples', type=int, default=5, help='Representative descriptions per cluster')
+
+    for sub in (fit_parser, label_parser):
+        sub.add_argument('--source', nargs='+', choices=list(SOURCES), default=list(SOURCES))
+        sub.add_argument('--chunksize', type=int, default=20000, help='Tattoo rows read per chunk')
+
+    args = parser.parse_args()
+    if args.command == 'fit':
+        fit(args)
+    else:
+        label(args)
+
+
+if __name__ == "__main__":
+    main()
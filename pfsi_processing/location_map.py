@@ -3,10 +3,14 @@ from bs4 import BeautifulSoup
 import json
 import html
 import re
-from geopy.geocoders import GoogleV3
 import folium
 from folium.plugins import MarkerCluster
 from datetime import datetime
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from geocoding import build_geocoder
 
 
 # Function to load API key from the configuration file
@@ -81,26 +85,10 @@ def parse_html_to_json(html_content):
     return {"datos": data}
 
 
-# In-memory cache for geocoded locations
-geocode_cache = {}
-
-
-def get_location(geolocator, address):
-    if address in geocode_cache:
-        print(f"DEBUG: Cache hit for address: {address}")
-        return geocode_cache[address]
-    else:
-        print(f"DEBUG: Cache miss for address: {address}")
-        location = geolocator.geocode(address)
-        if location:
-            geocode_cache[address] = (location.latitude, location.longitude)
-            return (location.latitude, location.longitude)
-        return None
-
-
 def generate_map(data, api_key, start_date, end_date):
-    geolocator = GoogleV3(api_key=api_key)
-    map_center = get_location(geolocator, "Guadalajara, Jalisco, Mexico")
+    # Shared persistent cache: delegaciones repeat in every run
+    geocoder = build_geocoder(google_api_key=api_key)
+    map_center = geocoder.geocode("Guadalajara, Jalisco, Mexico")
     location_map = folium.Map(location=map_center, zoom_start=12)
 
     # Add marker clustering
@@ -109,7 +97,7 @@ def generate_map(data, api_key, start_date, end_date):
     for entry in data["datos"]:
         delegacion = entry.get("Delegación IJCF", "")
         if delegacion:
-            location = get_location(geolocator, delegacion + ", Jalisco, Mexico")
+            location = geocoder.geocode(delegacion + ", Jalisco, Mexico")
             if location:
                 folium.Marker(
                     location=location,
@@ -5,9 +5,13 @@ import html
 import re
 from bs4 import BeautifulSoup
 from datetime import datetime
-from geopy.geocoders import GoogleV3
 from folium.plugins import MarkerCluster
 import mysql.connector
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from geocoding import build_geocoder
 
 
 def load_api_key(file_path='db_credentials.json'):
@@ -76,31 +80,16 @@ def clean_html(raw_html):
     return clean_text
 
 
-geocode_cache = {}
-
-
-def get_location(geolocator, address):
-    if address in geocode_cache:
-        print(f"DEBUG: Cache hit for address: {address}")
-        return geocode_cache[address]
-    else:
-        print(f"DEBUG: Cache miss for address: {address}")
-        location = geolocator.geocode(address)
-        if location:
-            geocode_cache[address] = (location.latitude, location.longitude)
-            return (location.latitude, location.longitude)
-        return None
-
-
 def generate_map(data, api_key, start_date, end_date):
-    geolocator = GoogleV3(api_key=api_key)
-    map_center = get_location(geolocator, "Guadalajara, Jalisco, Mexico")
+    # Shared persistent cache: delegaciones repeat in every run
+    geocoder = build_geocoder(google_api_key=api_key)
+    map_center = geocoder.geocode("Guadalajara, Jalisco, Mexico")
     location_map = folium.Map(location=map_center, zoom_start=12)
     marker_cluster = MarkerCluster().add_to(location_map)
     for entry in data["datos"]:
         delegacion = entry.get("Delegacion_IJCF", "")
         if delegacion:
-            location = get_location(geolocator, delegacion + ", Jalisco, Mexico")
+            location = geocoder.geocode(delegacion + ", Jalisco, Mexico")
             if location:
                 folium.Marker(
                     location=location,
@@ -1,21 +1,8 @@
 import pandas as pd
 import os
-from collections import Counter
-import re
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+import argparse
 
-# Download required NLTK data
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
-
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+from stoplist_tokenizer import WordCountStore, categorize_descriptions, spanish_stopwords
 
 
 def load_csv_file():
@@ -42,21 +29,10 @@ def load_csv_file():
         return None
 
 
-# Load and verify
-df = load_csv_file()
 script_dir = os.path.dirname(os.path.abspath(__file__))
-if df is not None:
-    print(f"PFSI DataFrame shape: {df.shape}")
-    print("\nFirst 10 rows of PFSI data:")
-    print(df.head(10))
-
-# Filter the DataFrame to exclude rows where 'Senas_Particulares' is 'No presenta' and remove rows with missing 'ID'
-df = df[['ID', 'Senas_Particulares']][(df['Senas_Particulares'] != 'No presenta') & df['ID'].notna()]
-print("\nFirst 20 rows of filtered PFSI data:")
-print(df.head(20))
 
 # Define keywords for categories
-keywords = {
+KEYWORDS = {
     "Cicatrices": ["cicatriz", "cicatrices", "quemadura", "herida"],
     "Lunares y Manchas": ["lunar", "mancha", "verruga"],
     "Implantes/Material Osteosíntesis/Tratamiento Dental": ["implante", "osteosíntesis", "tratamiento dental", "prótesis"],
@@ -66,24 +42,13 @@ keywords = {
 }
 
 # Create a bag of words
-def create_bag_of_words(df):
-    # Combine all descriptions into a single string
-    text = ' '.join(df['Senas_Particulares'].astype(str).tolist())
-    
-    # Replace "." with space
-    text = text.replace('.', ' ')
-    
-    # Remove any non-alphanumeric characters and split the string into words
-    words = re.findall(r'\w+', text.lower())
-    
-    # Remove stop words
-    stop_words = set(stopwords.words('spanish'))
-    words = [w for w in words if not w in stop_words]
-    
-    # Count the frequency of each word
-    word_counts = Counter(words)
-    
-    return word_counts
+def create_bag_of_words(df, workers=None):
+    # Counts are persisted with the IDs they cover, so only new PFSI rows are tokenized
+    store = WordCountStore(os.path.join(script_dir, 'txt', 'word_counts_senas.json'))
+    added = store.update(df, 'ID', 'Senas_Particulares', spanish_stopwords(), workers)
+    store.save()
+    print(f"Counted {added} new descriptions ({len(store.seen_ids)} in total)")
+    return store.counts
 
 # Categorize words based on keywords
 def categorize_words(word_counts, keywords):
@@ -114,78 +79,80 @@ def update_keywords(word_counts, keywords, threshold=5):
                     keywords["Otros"] = [word]
     return keywords
 
-def categorize_senas(df):
+def categorize_senas(df, keywords):
     # Use the 'Senas_Particulares' column for categorization
     senas_descriptions = df['Senas_Particulares'].astype(str).tolist()
+    return categorize_descriptions(senas_descriptions, keywords, spanish_stopwords())
 
-    # Define categories
-    categories = list(keywords.keys())
-    
-    # Create a dictionary to store the categorized descriptions
-    categorized_senas = {category: [] for category in categories}
+def main():
+    parser = argparse.ArgumentParser(description='Build word counts and keyword categories from PFSI descriptions.')
+    parser.add_argument('--workers', type=int, default=None, help='Processes used to count words (default: all cores)')
+    args = parser.parse_args()
 
-    # Iterate through each description
-    for description in senas_descriptions:
-        # Tokenize the description
-        words = word_tokenize(description.lower(), language='spanish')
-        
-        # Remove stop words
-        stop_words = set(stopwords.words('spanish'))
-        words = [w for w in words if not w in stop_words]
-        
-        # Categorize the description based on keywords
-        for category, category_keywords in keywords.items():
-            if any(word in category_keywords for word in words):
-                categorized_senas[category].append(description)
-                break  # Assign to only one category
+    # Load and verify
+    df = load_csv_file()
+    if df is None:
+        return
+    print(f"PFSI DataFrame shape: {df.shape}")
+    print("\nFirst 10 rows of PFSI data:")
+    print(df.head(10))
 
-    return categorized_senas
+    # Filter the DataFrame to exclude rows where 'Senas_Particulares' is 'No presenta' and remove rows with missing 'ID'
+    df = df[['ID', 'Senas_Particulares']][(df['Senas_Particulares'] != 'No presenta') & df['ID'].notna()]
+    print("\nFirst 20 rows of filtered PFSI data:")
+    print(df.head(20))
 
-# Create and print the bag of words
-word_counts = create_bag_of_words(df)
+    # Create and print the bag of words
+    word_counts = create_bag_of_words(df, args.workers)
 
-# Update keywords
-keywords = update_keywords(word_counts, keywords)
+    # Update a copy of the keywords so KEYWORDS keeps the curated lists
+    keywords = {category: list(words) for category, words in KEYWORDS.items()}
+    keywords = update_keywords(word_counts, keywords)
 
-# Categorize the words
-word_categories = categorize_words(word_counts, keywords)
+    # Categorize the words
+    word_categories = categorize_words(word_counts, keywords)
 
-# Save word counts to a text file
-word_counts_file = os.path.join(script_dir, 'txt', 'word_counts_senas.txt')
-os.makedirs(os.path.dirname(word_counts_file), exist_ok=True)
+    # Save word counts to a text file
+    word_counts_file = os.path.join(script_dir, 'txt', 'word_counts_senas.txt')
+    os.makedirs(os.path.dirname(word_counts_file), exist_ok=True)
 
-with open(word_counts_file, 'w', encoding='utf-8') as f:
-    f.write("Word Counts:\n")
-    for word, count in word_counts.items():
-        f.write(f"- {word}: {count}\n")
+    with open(word_counts_file, 'w', encoding='utf-8') as f:
+        f.write("Word Counts:\n")
+        for word, count in word_counts.items():
+            f.write(f"- {word}: {count}\n")
 
-print(f"\nWord counts have been saved to {word_counts_file}")
+    print(f"\nWord counts have been saved to {word_counts_file}")
 
-# Save word categories to a text file
-word_categories_file = os.path.join(script_dir, 'txt', 'word_categories_senas.txt')
-os.makedirs(os.path.dirname(word_categories_file), exist_ok=True)
+    # Save word categories to a text file
+    word_categories_file = os.path.join(script_dir, 'txt', 'word_categories_senas.txt')
+    os.makedirs(os.path.dirname(word_categories_file), exist_ok=True)
 
-with open(word_categories_file, 'w', encoding='utf-8') as f:
-    f.write("Word Categories:\n")
-    for category, words in word_categories.items():
-        f.write(f"\nCategory: {category}\n")
-        for word, count in words.items():
-            f.write(f"- {word}: {count}\n")
+    with open(word_categories_file, 'w', encoding='utf-8') as f:
+        f.write("Word Categories:\n")
+        for category, words in word_categories.items():
+            f.write(f"\nCategory: {category}\n")
+            for word, count in words.items():
+                f.write(f"- {word}: {count}\n")
+
+    print(f"\nWord categories have been saved to {word_categories_file}")
+
+    # Categorize the descriptions
+    categorized_senas = categorize_senas(df, keywords)
 
-print(f"\nWord categories have been saved to {word_categories_file}")
+    # Save categorized descriptions to a text file
+    output_file = os.path.join(script_dir, 'txt', 'cat_senas.txt')
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
-# Categorize the descriptions
-categorized_senas = categorize_senas(df)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("Categorized Descriptions:\n")
+        for category, descriptions in categorized_senas.items():
+            f.write(f"\nCategory: {category}\n")
+            for description in descriptions:
+                f.write(f"- {description}\n")
 
-# Save categorized descriptions to a text file
-output_file = os.path.join(script_dir, 'txt', 'cat_senas.txt')
-os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    print(f"\nCategorized descriptions have been saved to {output_file}")
 
-with open(output_file, 'w', encoding='utf-8') as f:
-    f.write("Categorized Descriptions:\n")
-    for category, descriptions in categorized_senas.items():
-        f.write(f"\nCategory: {category}\n")
-        for description in descriptions:
-            f.write(f"- {description}\n")
 
-print(f"\nCategorized descriptions have been saved to {output_file}")
+if __name__ == "__main__":
+    # The guard keeps worker processes from re-running the script
+    main()
@@ -1,23 +1,10 @@
 import pandas as pd
 import os
-from collections import Counter
-import re
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+import argparse
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.cluster import KMeans
 
-# Download required NLTK data
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
-
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+from stoplist_tokenizer import WordCountStore, categorize_descriptions, spanish_stopwords
 
 
 def load_csv_file():
@@ -44,21 +31,10 @@ def load_csv_file():
         return None
 
 
-# Load and verify
-df = load_csv_file()
 script_dir = os.path.dirname(os.path.abspath(__file__))
-if df is not None:
-    print(f"PFSI DataFrame shape: {df.shape}")
-    print("\nFirst 10 rows of PFSI data:")
-    print(df.head(10))
-
-# Filter the DataFrame to exclude rows where 'Tatuajes' is 'No presenta' and remove rows with missing 'ID'
-df = df[['ID', 'Tatuajes']][(df['Tatuajes'] != 'No presenta') & df['ID'].notna()]
-print("\nFirst 20 rows of filtered PFSI data:")
-print(df.head(20))
 
 # Define keywords for categories
-keywords = {
+KEYWORDS = {
     "Figura Humana": ["rostro", "figura", "hombre", "mujer", "persona", "cuerpo"],
     "Letras-Números": ["letra", "números", "leyenda", "palabras", "texto"],
     "Simbolos": ["símbolo", "cruz", "rojo", "negro", "símbolos", "machete", "corazón", "estrella", "cruz", "infinito"],
@@ -68,24 +44,13 @@ keywords = {
 }
 
 # Create a bag of words
-def create_bag_of_words(df):
-    # Combine all tattoo descriptions into a single string
-    text = ' '.join(df['Tatuajes'].astype(str).tolist())
-    
-    # Replace "." with space
-    text = text.replace('.', ' ')
-    
-    # Remove any non-alphanumeric characters and split the string into words
-    words = re.findall(r'\w+', text.lower())
-    
-    # Remove stop words
-    stop_words = set(stopwords.words('spanish'))
-    words = [w for w in words if not w in stop_words]
-    
-    # Count the frequency of each word
-    word_counts = Counter(words)
-    
-    return word_counts
+def create_bag_of_words(df, workers=None):
+    # Counts are persisted with the IDs they cover, so only new PFSI rows are tokenized
+    store = WordCountStore(os.path.join(script_dir, 'txt', 'word_counts.json'))
+    added = store.update(df, 'ID', 'Tatuajes', spanish_stopwords(), workers)
+    store.save()
+    print(f"Counted {added} new descriptions ({len(store.seen_ids)} in total)")
+    return store.counts
 
 # Categorize words based on keywords
 def categorize_words(word_counts, keywords):
@@ -116,78 +81,80 @@ def update_keywords(word_counts, keywords, threshold=5):
                     keywords["Otros"] = [word]
     return keywords
 
-def categorize_tattoos(df):
+def categorize_tattoos(df, keywords):
     # Use the 'Tatuajes' column for categorization
     tattoo_descriptions = df['Tatuajes'].astype(str).tolist()
+    return categorize_descriptions(tattoo_descriptions, keywords, spanish_stopwords())
 
-    # Define categories
-    categories = list(keywords.keys())
-    
-    # Create a dictionary to store the categorized tattoos
-    categorized_tattoos = {category: [] for category in categories}
+def main():
+    parser = argparse.ArgumentParser(description='Build word counts and keyword categories from PFSI descriptions.')
+    parser.add_argument('--workers', type=int, default=None, help='Processes used to count words (default: all cores)')
+    args = parser.parse_args()
 
-    # Iterate through each tattoo description
-    for description in tattoo_descriptions:
-        # Tokenize the description
-        words = word_tokenize(description.lower(), language='spanish')
-        
-        # Remove stop words
-        stop_words = set(stopwords.words('spanish'))
-        words = [w for w in words if not w in stop_words]
-        
-        # Categorize the tattoo based on keywords
-        for category, category_keywords in keywords.items():
-            if any(word in category_keywords for word in words):
-                categorized_tattoos[category].append(description)
-                break  # Assign to only one category
+    # Load and verify
+    df = load_csv_file()
+    if df is None:
+        return
+    print(f"PFSI DataFrame shape: {df.shape}")
+    print("\nFirst 10 rows of PFSI data:")
+    print(df.head(10))
 
-    return categorized_tattoos
+    # Filter the DataFrame to exclude rows where 'Tatuajes' is 'No presenta' and remove rows with missing 'ID'
+    df = df[['ID', 'Tatuajes']][(df['Tatuajes'] != 'No presenta') & df['ID'].notna()]
+    print("\nFirst 20 rows of filtered PFSI data:")
+    print(df.head(20))
 
-# Create and print the bag of words
-word_counts = create_bag_of_words(df)
+    # Create and print the bag of words
+    word_counts = create_bag_of_words(df, args.workers)
 
-# Update keywords
-keywords = update_keywords(word_counts, keywords)
+    # Update a copy of the keywords so KEYWORDS keeps the curated lists
+    keywords = {category: list(words) for category, words in KEYWORDS.items()}
+    keywords = update_keywords(word_counts, keywords)
 
-# Categorize the words
-word_categories = categorize_words(word_counts, keywords)
+    # Categorize the words
+    word_categories = categorize_words(word_counts, keywords)
 
-# Save word counts to a text file
-word_counts_file = os.path.join(script_dir, 'txt', 'word_counts.txt')
-os.makedirs(os.path.dirname(word_counts_file), exist_ok=True)
+    # Save word counts to a text file
+    word_counts_file = os.path.join(script_dir, 'txt', 'word_counts.txt')
+    os.makedirs(os.path.dirname(word_counts_file), exist_ok=True)
 
-with open(word_counts_file, 'w', encoding='utf-8') as f:
-    f.write("Word Counts:\n")
-    for word, count in word_counts.items():
-        f.write(f"- {word}: {count}\n")
+    with open(word_counts_file, 'w', encoding='utf-8') as f:
+        f.write("Word Counts:\n")
+        for word, count in word_counts.items():
+            f.write(f"- {word}: {count}\n")
 
-print(f"\nWord counts have been saved to {word_counts_file}")
+    print(f"\nWord counts have been saved to {word_counts_file}")
 
-# Save word categories to a text file
-word_categories_file = os.path.join(script_dir, 'txt', 'word_categories.txt')
-os.makedirs(os.path.dirname(word_categories_file), exist_ok=True)
+    # Save word categories to a text file
+    word_categories_file = os.path.join(script_dir, 'txt', 'word_categories.txt')
+    os.makedirs(os.path.dirname(word_categories_file), exist_ok=True)
 
-with open(word_categories_file, 'w', encoding='utf-8') as f:
-    f.write("Word Categories:\n")
-    for category, words in word_categories.items():
-        f.write(f"\nCategory: {category}\n")
-        for word, count in words.items():
-            f.write(f"- {word}: {count}\n")
+    with open(word_categories_file, 'w', encoding='utf-8') as f:
+        f.write("Word Categories:\n")
+        for category, words in word_categories.items():
+            f.write(f"\nCategory: {category}\n")
+            for word, count in words.items():
+                f.write(f"- {word}: {count}\n")
+
+    print(f"\nWord categories have been saved to {word_categories_file}")
+
+    # Categorize the tattoos
+    categorized_tattoos = categorize_tattoos(df, keywords)
 
-print(f"\nWord categories have been saved to {word_categories_file}")
+    # Save categorized tattoos to a text file
+    output_file = os.path.join(script_dir, 'txt', 'cat_tattoos.txt')
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
-# Categorize the tattoos
-categorized_tattoos = categorize_tattoos(df)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("Categorized Tattoos:\n")
+        for category, tattoos in categorized_tattoos.items():
+            f.write(f"\nCategory: {category}\n")
+            for tattoo in tattoos:
+                f.write(f"- {tattoo}\n")
 
-# Save categorized tattoos to a text file
-output_file = os.path.join(script_dir, 'txt', 'cat_tattoos.txt')
-os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    print(f"\nCategorized tattoos have been saved to {output_file}")
 
-with open(output_file, 'w', encoding='utf-8') as f:
-    f.write("Categorized Tattoos:\n")
-    for category, tattoos in categorized_tattoos.items():
-        f.write(f"\nCategory: {category}\n")
-        for tattoo in tattoos:
-            f.write(f"- {tattoo}\n")
 
-print(f"\nCategorized tattoos have been saved to {output_file}")
\ No newline at end of file
+if __name__ == "__main__":
+    # The guard keeps worker processes from re-running the script
+    main()
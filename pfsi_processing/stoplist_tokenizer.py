@@ -0,0 +1,102 @@
+"""
+stoplist_tokenizer.py - Streaming tokenizer and persisted word counts for the PFSI stoplist scripts.
+
+Descriptions are tokenized with one precompiled regex and a frozen Spanish
+stopword set, counted per chunk in worker processes and merged. Counts are
+stored together with the IDs they include, so a later run only tokenizes the
+PFSI rows that were not counted before.
+"""
+
+import json
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from multiprocessing import Pool
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=None)
+def spanish_stopwords():
+    """Spanish NLTK stopwords, loaded once as a frozenset."""
+    import nltk
+    from nltk.corpus import stopwords
+
+    try:
+        nltk.data.find('corpora/stopwords')
+    except LookupError:
+        nltk.download('stopwords')
+    return frozenset(stopwords.words('spanish'))
+
+
+def tokenize(text, stop_words):
+    """Lowercase word tokens of a description, without stopwords."""
+    return [word for word in TOKEN_PATTERN.findall(text.lower()) if word not in stop_words]
+
+
+def _count_chunk(args):
+    texts, stop_words = args
+    counts = Counter()
+    for text in texts:
+        counts.update(tokenize(text, stop_words))
+    return counts
+
+
+def count_words(texts, stop_words, workers=None, chunksize=2000):
+    """Word counts of an iterable of descriptions, counted per chunk across processes."""
+    texts = [text for text in texts if isinstance(text, str)]
+    chunks = [(texts[i:i + chunksize], stop_words) for i in range(0, len(texts), chunksize)]
+    total = Counter()
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            total.update(_count_chunk(chunk))
+        return total
+    with Pool(processes=workers) as pool:
+        for counts in pool.imap_unordered(_count_chunk, chunks):
+            total.update(counts)
+    return total
+
+
+def categorize_descriptions(descriptions, keywords, stop_words):
+    """Assign each description to the first category with a keyword among its tokens."""
+    categorized = {category: [] for category in keywords}
+    keyword_sets = [(category, frozenset(words)) for category, words in keywords.items()]
+    for description in descriptions:
+        words = set(tokenize(description, stop_words))
+        for category, category_keywords in keyword_sets:
+            if words & category_keywords:
+                categorized[category].append(description)
+                break  # Assign to only one category
+    return categorized
+
+
+class WordCountStore:
+    """Word counts persisted as JSON together with the row IDs already counted."""
+
+    def __init__(self, path):
+        self.path = path
+        self.counts = Counter()
+        self.seen_ids = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.counts = Counter(data.get('counts', {}))
+            self.seen_ids = set(data.get('seen_ids', []))
+
+    def update(self, df, id_column, text_column, stop_words, workers=None):
+        """Count the rows whose ID has not been counted yet; return how many were added."""
+        ids = df[id_column].astype(str)
+        new_rows = df[~ids.isin(self.seen_ids)]
+        if new_rows.empty:
+            return 0
+        self.counts.update(count_words(new_rows[text_column].tolist(), stop_words, workers))
+        self.seen_ids.update(new_rows[id_column].astype(str))
+        return len(new_rows)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'counts': dict(self.counts), 'seen_ids': sorted(self.seen_ids)}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
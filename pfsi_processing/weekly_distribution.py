@@ -1,5 +1,6 @@
-import requests
-import pandas as pd
+import json
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.cluster import DBSCAN
@@ -7,42 +8,26 @@ import base64
 import io
 import random
 
-# URL and parameters for API request
-url = 'https://datades.abundis.com.mx/api/specificDate.php'
-headers = {
-    'API_KEY': 'gNXGJ0hCDavnMHvqbVRhL4yZalLUceQ4ccEHQmB40bQ',
-    'Content-Type': 'application/json'
-}
-params = {
-    'start_date': '2023-01-01',
-    'end_date': '2023-12-31'
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'repd_processing'))
+from inferences import fetch_inferences
+
+# Records are read from MySQL (repd_vp_cedulas_principal joined to repd_vp_inferencias) instead of the
+# specificDate API, so db_credentials.json is required in the working directory
+with open('db_credentials.json', 'r') as file:
+    config = json.load(file)
+DB_CONFIG = {
+    'host': config['host'],
+    'user': config['user'],
+    'password': config['password'],
+    'database': config['database'],
 }
+start_date = '2023-01-01'
+end_date = '2023-12-31'
 
-# Retrieve data
-response = requests.get(url, headers=headers, params=params)
-data = response.json()
-
-# Extract and transform filtered data
-records = data.get('records', [])
-fetched_records = []
-for record in records:
-    # Filter records based on 'condicion_localizacion'
-    if record.get('condicion_localizacion') == "NO APLICA":
-        lat, lon = map(float, record['lat_long'].split(',')) if record.get('lat_long') else (None, None)
-        fetched_record = {
-            'lat': lat,
-            'lon': lon,
-            'fecha_desaparicion': record.get('fecha_desaparicion'),
-            'sexo': record.get('sexo'),
-            'edad_momento_desaparicion': record.get('edad_momento_desaparicion'),
-            'condicion_localizacion': record.get('condicion_localizacion')
-        }
-        fetched_records.append(fetched_record)
-
-
-# Convert to DataFrame
-df = pd.DataFrame(fetched_records)
-df['fecha_desaparicion'] = pd.to_datetime(df['fecha_desaparicion'], errors='coerce')
+# Retrieve the cedulas of the period still missing ('NO APLICA'); date and condition are filtered
+# in SQL and lat/lon arrive as numbers, NULL for cedulas without a located inference or placed
+# only at a municipio/estado centroid
+df = fetch_inferences(DB_CONFIG, start=start_date, end=end_date, condicion="NO APLICA", located=False)
 df['week'] = df['fecha_desaparicion'].dt.isocalendar().week
 
 # Calculate DBSCAN clusters for all data
@@ -1,33 +1,12 @@
-import spacy
-from spacy.pipeline import EntityRuler
 import pandas as pd
-import mysql.connector
 import json
 import os
 from jinja2 import Template
 import logging
 
-# Load spaCy model
-NLP_MODEL_PATH = r'venv/lib/python3.12/site-packages/es_core_news_sm/es_core_news_sm-3.8.0'
-nlp = spacy.load(NLP_MODEL_PATH)
-
-# Add EntityRuler to the pipeline with refined patterns
-ruler = nlp.add_pipe('entity_ruler', before='ner')
-DATE_PATTERNS = [{"LOWER": "día"}, {"IS_DIGIT": True}, {"LOWER": "de"},
-                 {"LOWER": {"IN": ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
-                                   "septiembre", "octubre", "noviembre", "diciembre"]}},
-                 {"LOWER": "del"}, {"IS_DIGIT": True}]
-TIME_PATTERNS = [{"LOWER": {"REGEX": "\\d{1,2}(:\\d{2})?(am|pm)?"}}]
-ADDRESS_PATTERNS = [{"LOWER": "calle"}, {"IS_ALPHA": True, "OP": "+"}, {"IS_PUNCT": True}, {"IS_DIGIT": True}]
-COLONIA_PATTERNS = [{"LOWER": "colonia"}, {"IS_ALPHA": True, "OP": "+"}, {"IS_ALPHA": True, "OP": "*"}]
-patterns = [
-    {"label": "DATE", "pattern": DATE_PATTERNS},
-    {"label": "TIME", "pattern": TIME_PATTERNS},
-    {"label": "ADDRESS", "pattern": ADDRESS_PATTERNS},
-    {"label": "COLONIA", "pattern": COLONIA_PATTERNS},
-    {"label": "COLONIA", "pattern": [{"LOWER": "san"}, {"LOWER": "pedro"}, {"LOWER": "tlaquepaque"}]}
-]
-ruler.add_patterns(patterns)
+from cedulas import fetch_cedulas
+from batch_ner import entity_lookup, extract_entities
+from nlp_pipeline import get_nlp
 
 
 # Function to load database configuration
@@ -36,47 +15,8 @@ def load_db_config(file_path='db_credentials.json'):
         return json.load(file)
 
 
-# Database configuration
-config = load_db_config()
-DB_CONFIG = {
-    'host': config['host'],
-    'user': config['user'],
-    'password': config['password'],
-    'database': config['database'],
-}
-
-
-# Function to fetch data from the database
-def fetch_data_from_db(limit=30):
-    """Fetch a limited number of records from the database."""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-        query = f"""
-        SELECT id_cedula_busqueda, autorizacion_informacion_publica, condicion_localizacion,
-               nombre_completo, edad_momento_desaparicion, sexo, genero, complexion, estatura,
-               tez, cabello, ojos_color, municipio, estado, fecha_desaparicion,
-               estatus_persona_desaparecida, descripcion_desaparicion, ruta_foto
-        FROM repd_vp_cedulas_principal
-        LIMIT {limit}
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return pd.DataFrame(results)
-    except mysql.connector.Error as e:
-        logging.error(f"Error fetching data from database: {e}")
-        return None
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
-
-
-def clean_location_text(location):
-    """Remove 'calle' and 'colonia' from the location text."""
-    words_to_remove = ['calle', 'colonia']
-    location_words = location.lower().split()
-    return ' '.join(word for word in location_words if word not in words_to_remove)
+# Worker processes for the NER stage (more than 1 only pays off for large tables)
+NER_PROCESSES = 1
 
 
 def get_status_color(condicion_localizacion):
@@ -93,24 +33,16 @@ def process_descriptions(df, weight=1):
     """Process descriptions using spaCy NER pipeline and extract relevant information."""
     inferences = []
 
+    entities = extract_entities(get_nlp(), df, n_process=NER_PROCESSES)
+    # The last ADDRESS and COLONIA of each description, as the per-row loop kept them
+    calles = entity_lookup(entities, ["ADDRESS"], keep='last')
+    colonias = entity_lookup(entities, ["COLONIA"], keep='last')
+
     for idx, row in df.iterrows():
-        if row['descripcion_desaparicion'] is None:
-            row['descripcion_desaparicion'] = "   "
         try:
-            description = row['descripcion_desaparicion'].lower()
             municipio = row['municipio']
-            estado = row['estado']
-            condicion_localizacion = row['condicion_localizacion']
-
-            doc = nlp(description)
-            calle = None
-            colonia = None
-
-            for ent in doc.ents:
-                if ent.label_ == "ADDRESS":
-                    calle = ent.text
-                elif ent.label_ == "COLONIA":
-                    colonia = ent.text
+            calle = calles.get(row['id_cedula_busqueda'])
+            colonia = colonias.get(row['id_cedula_busqueda'])
 
             if calle or colonia:
                 inferences.append({
@@ -127,8 +59,17 @@ def process_descriptions(df, weight=1):
     return pd.DataFrame(inferences)
 
 
-df = fetch_data_from_db(limit=83)
-if df is not None and not df.empty:
-    logging.info(f"Fetched {len(df)} records")
-    repd_vp_inferences = process_descriptions(df, weight=0.2)  # Adjust the weight as needed
-    print(repd_vp_inferences)
\ No newline at end of file
+def main():
+    # Database configuration
+    config = load_db_config()
+    db_config = {key: config[key] for key in ('host', 'user', 'password', 'database')}
+
+    df = fetch_cedulas(db_config, limit=83)
+    if df is not None and not df.empty:
+        logging.info(f"Fetched {len(df)} records")
+        repd_vp_inferences = process_descriptions(df, weight=0.2)  # Adjust the weight as needed
+        print(repd_vp_inferences)
+
+
+if __name__ == "__main__":
+    main()
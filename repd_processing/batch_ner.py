@@ -0,0 +1,119 @@
+"""
+batch_ner.py - Batched spaCy entity extraction for REPD descriptions.
+
+Descriptions are streamed through nlp.pipe with the components the entity
+ruler and NER do not need switched off, optionally across several processes.
+The result is a compact entity table with one row per entity:
+
+    id_cedula_busqueda | label | text | start_char | end_char
+
+Consumers look entities up in that table instead of calling nlp() per row.
+Rendering with displacy is opt-in and goes to a single HTML file.
+"""
+
+import html
+import logging
+
+import pandas as pd
+
+ENTITY_COLUMNS = ['id_cedula_busqueda', 'label', 'text', 'start_char', 'end_char']
+ENTITIES_TABLE = 'repd_vp_entidades'
+
+# The entity ruler matches on token text only, and the NER has its own
+# tok2vec listener, so tagging, parsing and lemmatization are wasted work
+DISABLED_COMPONENTS = ['parser', 'lemmatizer', 'morphologizer', 'attribute_ruler']
+
+
+def _texts(df, id_column, text_column):
+    # Patterns are written in lowercase, as every REPD script lowercased before nlp()
+    for record_id, text in zip(df[id_column], df[text_column]):
+        yield (text.lower() if isinstance(text, str) else ''), record_id
+
+
+def iter_entities(nlp, df, id_column='id_cedula_busqueda', text_column='descripcion_desaparicion',
+                  batch_size=256, n_process=1, render_file=None):
+    """Yield (record_id, entity rows) per description as nlp.pipe produces them.
+
+    Lets callers start work on a record, such as geocoding, while later
+    batches are still being parsed.
+    """
+    disable = [name for name in DISABLED_COMPONENTS if name in nlp.pipe_names]
+    if render_file:
+        from spacy import displacy
+    docs = nlp.pipe(_texts(df, id_column, text_column), as_tuples=True,
+                    batch_size=batch_size, n_process=n_process, disable=disable)
+    for doc, record_id in docs:
+        if render_file:
+            render_file.write(f'<h3>{html.escape(str(record_id))}</h3>\n')
+            render_file.write(displacy.render(doc, style="ent", jupyter=False))
+            render_file.write('\n')
+        yield record_id, [(record_id, ent.label_, ent.text, ent.start_char, ent.end_char) for ent in doc.ents]
+
+
+def extract_entities(nlp, df, id_column='id_cedula_busqueda', text_column='descripcion_desaparicion',
+                     batch_size=256, n_process=1, render_path=None):
+    """Run the pipeline over every description once and return the entity table."""
+    rows = []
+    render_file = open(render_path, 'w', encoding='utf-8') if render_path else None
+    try:
+        if render_file:
+            render_file.write('<html><head><meta charset="utf-8"></head><body>\n')
+        for _, doc_rows in iter_entities(nlp, df, id_column, text_column, batch_size, n_process, render_file):
+            rows.extend(doc_rows)
+        if render_file:
+            render_file.write('</body></html>\n')
+    finally:
+        if render_file:
+            render_file.close()
+
+    entities = pd.DataFrame(rows, columns=ENTITY_COLUMNS)
+    logging.info(f"Extracted {len(entities)} entities from {len(df)} descriptions")
+    if render_path:
+        logging.info(f"Entity visualization saved to {render_path}")
+    return entities
+
+
+def entity_lookup(entities, labels, keep='first'):
+    """Map each id to the text of its first (or last) entity with one of the labels."""
+    selected = entities[entities['label'].isin(labels)]
+    grouped = selected.groupby('id_cedula_busqueda', sort=False)['text']
+    return (grouped.first() if keep == 'first' else grouped.last()).to_dict()
+
+
+def entities_by_id(entities):
+    """Map each id to its list of (text, label) pairs in document order."""
+    return {
+        record_id: list(zip(group['text'], group['label']))
+        for record_id, group in entities.groupby('id_cedula_busqueda', sort=False)
+    }
+
+
+def save_entities_to_sql(entities, conn, table_name=ENTITIES_TABLE, ids=None):
+    """Replace the stored entities of the processed ids with the new table."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            id_cedula_busqueda VARCHAR(255) NOT NULL,
+            label VARCHAR(32) NOT NULL,
+            text TEXT,
+            start_char INT NOT NULL,
+            end_char INT NOT NULL,
+            PRIMARY KEY (id_cedula_busqueda, start_char, label),
+            INDEX idx_label (label)
+        )
+        """)
+        # Ids without entities are included so stale rows from older runs are removed
+        ids = list(ids) if ids is not None else entities['id_cedula_busqueda'].unique().tolist()
+        for i in range(0, len(ids), 1000):
+            batch = ids[i:i + 1000]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f"DELETE FROM {table_name} WHERE id_cedula_busqueda IN ({placeholders})", batch)
+        cursor.executemany(
+            f"INSERT INTO {table_name} ({', '.join(ENTITY_COLUMNS)}) VALUES (%s, %s, %s, %s, %s)",
+            [tuple(row) for row in entities[ENTITY_COLUMNS].itertuples(index=False)],
+        )
+        conn.commit()
+        logging.info(f"Saved {len(entities)} entities for {len(ids)} descriptions to {table_name}")
+    finally:
+        cursor.close()
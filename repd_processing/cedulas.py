@@ -0,0 +1,63 @@
+"""
+cedulas.py - Streaming reader for repd_vp_cedulas_principal.
+
+Records are read by keyset pagination on id_cedula_busqueda over one pooled
+connection (utils/db.py), so jobs run over the whole table in chunks of
+constant size instead of loading it with fetchall() behind a fixed LIMIT.
+
+    from cedulas import iter_cedulas
+    for df in iter_cedulas(DB_CONFIG):
+        ...
+"""
+
+import logging
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from db import apply_dtypes, get_connection, read_chunks
+
+CEDULAS_TABLE = 'repd_vp_cedulas_principal'
+CEDULA_COLUMNS = [
+    'id_cedula_busqueda', 'autorizacion_informacion_publica', 'condicion_localizacion', 'nombre_completo',
+    'edad_momento_desaparicion', 'sexo', 'genero', 'complexion', 'estatura', 'tez', 'cabello', 'ojos_color',
+    'municipio', 'estado', 'fecha_desaparicion', 'estatus_persona_desaparecida', 'descripcion_desaparicion',
+    'ruta_foto',
+]
+# Typed columns of the chunks; the text columns stay as the strings (or None) the driver returns
+CEDULA_DTYPES = {
+    'edad_momento_desaparicion': 'Int64',
+    'fecha_desaparicion': 'datetime64[ns]',
+}
+CHUNK_SIZE = 2000
+
+
+def iter_cedulas(db_config, columns=CEDULA_COLUMNS, chunk_size=CHUNK_SIZE, limit=None, after=None, where=None,
+                 params=(), dtypes=CEDULA_DTYPES):
+    """Yield DataFrame chunks of the cedulas in id_cedula_busqueda order, starting after `after`.
+
+    `where` is an extra SQL condition on repd_vp_cedulas_principal with `params` as its values.
+    Selected columns listed in `dtypes` are typed: fecha_desaparicion as datetime64 (NaT when it
+    does not parse) and edad_momento_desaparicion as a nullable integer.
+    """
+    import mysql.connector
+
+    conn = get_connection(db_config)
+    try:
+        yield from read_chunks(conn, CEDULAS_TABLE, columns, key='id_cedula_busqueda',
+                               chunk_size=chunk_size, after=after, limit=limit, where=where, params=params,
+                               dtypes=dtypes)
+    except mysql.connector.Error as e:
+        logging.error(f"Error fetching data from database: {e}")
+    finally:
+        conn.close()
+
+
+def fetch_cedulas(db_config, columns=CEDULA_COLUMNS, limit=None):
+    """All cedulas (or the first `limit`) as one DataFrame, for jobs that need every row at once."""
+    chunks = list(iter_cedulas(db_config, columns, limit=limit))
+    if chunks:
+        return pd.concat(chunks, ignore_index=True)
+    return apply_dtypes(pd.DataFrame(columns=columns), CEDULA_DTYPES)
@@ -0,0 +1,244 @@
+"""
+cooccurrence.py - Sparse term co-occurrence counts of REPD descriptions.
+
+Replaces the defaultdict(Counter) of "before <word>" / "after <word>" strings
+and its hand-parsed terms_frequency.txt. Words get integer ids in a
+vocabulary and the counts live in one scipy CSR matrix:
+
+    left[i, j] = times word j appears up to `window` tokens before word i
+
+The right context is the transpose (word j after word i is word i before
+word j), so it is not stored twice. Texts are added in chunks, each chunk is
+summed into the matrix at once, and memory grows with the number of
+distinct pairs rather than with Python objects. Descriptions can be keyed
+by record id with a version (the description hash): a record read again
+with the same version is skipped, and an edited one has the counts of its
+previous text subtracted before the new text is added, so incremental runs
+stay equal to a full rebuild. The term ids of each keyed text are kept for
+that purpose, one entry per record.
+
+    python cooccurrence.py top colonia --side left -k 10
+"""
+
+import argparse
+import logging
+import os
+import re
+
+import numpy as np
+from scipy import sparse
+
+COOCCURRENCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terms_cooccurrence.npz')
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+WINDOW = 1
+
+
+class CooccurrenceMatrix:
+    """Vocabulary, term counts and left-context co-occurrence matrix."""
+
+    def __init__(self, window=WINDOW, stop_words=()):
+        self.window = window
+        self.stop_words = frozenset(stop_words)
+        self.vocab = {}
+        self.words = []
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.left = sparse.csr_matrix((0, 0), dtype=np.int64)
+        # key -> (version, term ids) of the text last counted under that key
+        self.docs = {}
+        self._right = None
+
+    def __len__(self):
+        return len(self.words)
+
+    def _id(self, word):
+        word_id = self.vocab.get(word)
+        if word_id is None:
+            word_id = self.vocab[word] = len(self.words)
+            self.words.append(word)
+        return word_id
+
+    def _pairs(self, ids):
+        """(rows, cols) of the left-context pairs of a sequence of term ids."""
+        for distance in range(1, self.window + 1):
+            if len(ids) > distance:
+                yield ids[distance:], ids[:-distance]
+
+    def _add_pairs(self, rows, cols, signs, term_ids, term_signs):
+        n = len(self.words)
+        self.counts = np.concatenate([self.counts, np.zeros(n - len(self.counts), dtype=np.int64)])
+        if term_ids:
+            weights = np.concatenate([np.full(len(ids), sign, dtype=np.int64)
+                                      for ids, sign in zip(term_ids, term_signs)])
+            self.counts += np.bincount(np.concatenate(term_ids), weights=weights, minlength=n).astype(np.int64)
+        self.left.resize((n, n))
+        if rows:
+            rows = np.concatenate(rows)
+            cols = np.concatenate(cols)
+            data = np.concatenate(signs)
+            chunk = sparse.coo_matrix((data, (rows, cols)), shape=(n, n)).tocsr()
+            self.left = self.left + chunk
+            if (data < 0).any():
+                self.left.eliminate_zeros()
+        self._right = None
+
+    def add_texts(self, texts, keys=None, versions=None):
+        """Count a chunk of texts; returns how many were counted.
+
+        A text whose key was already counted with the same version is
+        skipped; one counted with another version replaces the previous text.
+        """
+        rows, cols, signs, term_ids, term_signs = [], [], [], [], []
+        added = 0
+
+        def collect(ids, sign):
+            term_ids.append(ids)
+            term_signs.append(sign)
+            for pair_rows, pair_cols in self._pairs(ids):
+                rows.append(pair_rows)
+                cols.append(pair_cols)
+                signs.append(np.full(len(pair_rows), sign, dtype=np.int64))
+
+        for index, text in enumerate(texts):
+            key = keys[index] if keys is not None else None
+            version = versions[index] if versions is not None else ''
+            if key is not None:
+                previous = self.docs.get(key)
+                if previous is not None:
+                    if previous[0] == version:
+                        continue
+                    collect(previous[1], -1)
+                    del self.docs[key]
+            if not isinstance(text, str):
+                continue
+            ids = np.fromiter((self._id(word) for word in TOKEN_PATTERN.findall(text.lower())
+                               if word not in self.stop_words), dtype=np.int64)
+            collect(ids, 1)
+            if key is not None:
+                self.docs[key] = (version, ids)
+            added += 1
+        self._add_pairs(rows, cols, signs, term_ids, term_signs)
+        return added
+
+    def merge(self, other):
+        """Add the counts of another matrix built with the same window."""
+        if other.window != self.window:
+            raise ValueError(f"Cannot merge window {other.window} into window {self.window}")
+        mapping = np.fromiter((self._id(word) for word in other.words), dtype=np.int64, count=len(other.words))
+        coo = other.left.tocoo()
+        n = len(self.words)
+        self.counts = np.concatenate([self.counts, np.zeros(n - len(self.counts), dtype=np.int64)])
+        np.add.at(self.counts, mapping, other.counts)
+        self.left.resize((n, n))
+        self.left = self.left + sparse.coo_matrix((coo.data, (mapping[coo.row], mapping[coo.col])),
+                                                  shape=(n, n)).tocsr()
+        for key, (version, ids) in other.docs.items():
+            self.docs[key] = (version, mapping[ids])
+        self._right = None
+
+    @property
+    def right(self):
+        """right[i, j] = times word j appears up to `window` tokens after word i."""
+        if self._right is None:
+            self._right = self.left.transpose().tocsr()
+        return self._right
+
+    def count(self, word):
+        word_id = self.vocab.get(word)
+        return int(self.counts[word_id]) if word_id is not None else 0
+
+    def top_collocates(self, word, k=10, side='both'):
+        """The k most frequent (collocate, count) pairs of a word on the left, right or both sides."""
+        word_id = self.vocab.get(word)
+        if word_id is None:
+            return []
+        if side == 'left':
+            row = self.left[word_id]
+        elif side == 'right':
+            row = self.right[word_id]
+        else:
+            row = self.left[word_id] + self.right[word_id]
+        if row.nnz == 0:
+            return []
+        top = np.argpartition(-row.data, k)[:k] if row.nnz > k else np.arange(row.nnz)
+        top = top[np.argsort(-row.data[top], kind='stable')]
+        return [(self.words[row.indices[i]], int(row.data[i])) for i in top]
+
+    def save(self, path=COOCCURRENCE_PATH):
+        left = self.left.tocsr()
+        left.sum_duplicates()
+        keys = list(self.docs)
+        doc_ids = [self.docs[key][1] for key in keys]
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez_compressed(
+                file, window=np.array(self.window), words=np.array(self.words, dtype=str),
+                counts=self.counts, data=left.data, indices=left.indices, indptr=left.indptr,
+                doc_keys=np.array([str(key) for key in keys], dtype=str),
+                doc_versions=np.array([str(self.docs[key][0]) for key in keys], dtype=str),
+                doc_indptr=np.cumsum([0] + [len(ids) for ids in doc_ids]),
+                doc_ids=np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int64),
+            )
+        os.replace(tmp_path, path)
+        logging.info(f"Saved {len(self.words)} terms, {left.nnz} co-occurring pairs and "
+                     f"{len(keys)} descriptions to {path}")
+
+    @classmethod
+    def load(cls, path=COOCCURRENCE_PATH, stop_words=()):
+        with np.load(path, allow_pickle=False) as data:
+            matrix = cls(int(data['window']), stop_words)
+            matrix.words = data['words'].tolist()
+            matrix.vocab = {word: i for i, word in enumerate(matrix.words)}
+            matrix.counts = data['counts'].astype(np.int64)
+            n = len(matrix.words)
+            matrix.left = sparse.csr_matrix((data['data'], data['indices'], data['indptr']), shape=(n, n))
+            if 'doc_keys' in data:
+                indptr = data['doc_indptr']
+                doc_ids = data['doc_ids'].astype(np.int64)
+                for i, (key, version) in enumerate(zip(data['doc_keys'].tolist(), data['doc_versions'].tolist())):
+                    matrix.docs[key] = (version, doc_ids[indptr[i]:indptr[i + 1]])
+            else:
+                # Older files only kept "id:hash" keys: unchanged records are still skipped, but the
+                # texts were not stored, so edits are only fully corrected by a --full rebuild
+                for key in data['seen'].tolist():
+                    record_id, _, version = key.rpartition(':')
+                    matrix.docs[record_id] = (version, np.zeros(0, dtype=np.int64))
+                logging.warning(f"{path} predates per-record term ids; run a full rebuild to subtract "
+                                f"the old text of edited descriptions")
+        return matrix
+
+    @classmethod
+    def load_or_new(cls, path=COOCCURRENCE_PATH, window=WINDOW, stop_words=()):
+        """The saved matrix when it exists with the same window, else an empty one."""
+        if os.path.exists(path):
+            matrix = cls.load(path, stop_words)
+            if matrix.window == window:
+                return matrix
+            logging.info(f"{path} was built with window {matrix.window}; starting over with window {window}")
+        return cls(window, stop_words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the term co-occurrence matrix.')
+    parser.add_argument('--path', default=COOCCURRENCE_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    top_parser = subparsers.add_parser('top', help='Most frequent collocates of a word')
+    top_parser.add_argument('word')
+    top_parser.add_argument('-k', type=int, default=10)
+    top_parser.add_argument('--side', choices=['left', 'right', 'both'], default='both')
+    subparsers.add_parser('stats', help='Vocabulary size, stored pairs and most frequent terms')
+    args = parser.parse_args()
+
+    matrix = CooccurrenceMatrix.load(args.path)
+    if args.command == 'top':
+        print(f"{args.word}: {matrix.count(args.word)} occurrences")
+        for collocate, count in matrix.top_collocates(args.word, args.k, args.side):
+            print(f"  {collocate}\t{count}")
+    else:
+        print(f"window {matrix.window}, {len(matrix)} terms, {matrix.left.nnz} pairs, "
+              f"{len(matrix.docs)} descriptions")
+        for word_id in np.argsort(-matrix.counts, kind='stable')[:20]:
+            print(f"  {matrix.words[word_id]}\t{matrix.counts[word_id]}")
+
+
+if __name__ == "__main__":
+    main()
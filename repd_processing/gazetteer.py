@@ -0,0 +1,254 @@
+"""
+gazetteer.py - Gazetteer matcher for Jalisco municipios, localidades and colonias.
+
+Place names are loaded from local copies of the official catalogs and
+compiled into a token trie (flashtext style): a description is scanned once,
+left to right, keeping the longest name at each position, so throughput does
+not depend on how many names the gazetteer holds. Every match carries a
+canonical place id:
+
+    mun:14039        municipio (CVE_ENT + CVE_MUN)
+    loc:140390001    localidad (INEGI CVEGEO)
+    col:14039:0042   asentamiento from SEPOMEX (municipio + id_asenta_cpcons)
+
+Catalogs (not included in the repository, download them from the official sites):
+
+- INEGI AGEEML, "Catálogo Único de Claves de Áreas Geoestadísticas Estatales,
+  Municipales y Localidades" (CSV): CVE_ENT, NOM_ENT, CVE_MUN, NOM_MUN,
+  CVE_LOC, NOM_LOC, LAT_DECIMAL, LON_DECIMAL.
+- SEPOMEX "Códigos Postales de México" (CPdescarga.txt, optional). It has no
+  coordinates, so colonias only resolve to a canonical name and municipio.
+
+    python gazetteer.py --ageeml AGEEML_14.csv --sepomex CPdescarga.txt "colonia miravalle, tlaquepaque"
+"""
+
+import argparse
+import logging
+import os
+import re
+import sys
+from collections import namedtuple
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from centroids import MUNICIPIO_ALIASES
+from text_normalization import ACCENT_TABLE
+
+GAZETTEER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer')
+AGEEML_PATH = os.path.join(GAZETTEER_DIR, 'AGEEML.csv')
+SEPOMEX_PATH = os.path.join(GAZETTEER_DIR, 'CPdescarga.txt')
+JALISCO = '14'
+
+Place = namedtuple('Place', ['place_id', 'name', 'kind', 'cve_mun', 'municipio', 'lat', 'lon'])
+Match = namedtuple('Match', ['place', 'start', 'end'])
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Words that must directly precede a colonia name; without them names such as
+# "centro" or "las flores" are too common to be places
+COLONIA_TRIGGERS = frozenset(['colonia', 'col', 'fraccionamiento', 'fracc', 'barrio', 'coto', 'residencial'])
+# A localidad outside the municipio of the record needs one of these before it
+LOCALIDAD_TRIGGERS = frozenset(['localidad', 'poblado', 'comunidad', 'rancho', 'ejido', 'delegacion'])
+# Preferred kind when a name is shared, e.g. a colonia named like a municipio
+KIND_PRIORITY = {'colonia': 0, 'localidad': 1, 'municipio': 2}
+
+_TERMINAL = '__places__'
+
+
+def fold(text):
+    """Lowercase and strip accents without changing the text length."""
+    return text.lower().translate(ACCENT_TABLE)
+
+
+def tokenize(text):
+    """(token, start, end) triples of the folded text."""
+    return [(m.group(), m.start(), m.end()) for m in TOKEN_PATTERN.finditer(fold(text))]
+
+
+def _read_csv(path, **kwargs):
+    # INEGI and SEPOMEX publish files in UTF-8 with BOM or in Latin-1 depending on the release
+    try:
+        return pd.read_csv(path, encoding='utf-8-sig', **kwargs)
+    except UnicodeDecodeError:
+        return pd.read_csv(path, encoding='latin-1', **kwargs)
+
+
+def load_ageeml(path, cve_ent=JALISCO):
+    """Municipios and localidades of one state from an INEGI AGEEML catalog."""
+    df = _read_csv(path, dtype=str, usecols=['CVE_ENT', 'NOM_ENT', 'CVE_MUN', 'NOM_MUN', 'CVE_LOC', 'NOM_LOC',
+                                             'LAT_DECIMAL', 'LON_DECIMAL'])
+    df['CVE_ENT'] = df['CVE_ENT'].str.zfill(2)
+    df = df[df['CVE_ENT'] == cve_ent].copy()
+    df['CVE_MUN'] = df['CVE_MUN'].str.zfill(3)
+    df['CVE_LOC'] = df['CVE_LOC'].str.zfill(4)
+    df['LAT_DECIMAL'] = pd.to_numeric(df['LAT_DECIMAL'], errors='coerce')
+    df['LON_DECIMAL'] = pd.to_numeric(df['LON_DECIMAL'], errors='coerce')
+
+    places = []
+    for row in df.itertuples(index=False):
+        cve_mun = row.CVE_ENT + row.CVE_MUN
+        places.append(Place(f"loc:{cve_mun}{row.CVE_LOC}", row.NOM_LOC, 'localidad', cve_mun, row.NOM_MUN,
+                            row.LAT_DECIMAL, row.LON_DECIMAL))
+    # A municipio has no point of its own in AGEEML; its places carry the coordinates
+    for (cve_ent, cve_mun_code, nom_mun), _ in df.groupby(['CVE_ENT', 'CVE_MUN', 'NOM_MUN']):
+        cve_mun = cve_ent + cve_mun_code
+        places.append(Place(f"mun:{cve_mun}", nom_mun, 'municipio', cve_mun, nom_mun, None, None))
+    logging.info(f"Loaded {len(places)} AGEEML places for CVE_ENT {cve_ent}")
+    return places
+
+
+def load_sepomex(path, cve_ent=JALISCO):
+    """Asentamientos (colonias, fraccionamientos, barrios...) of one state from CPdescarga.txt."""
+    # The first line of CPdescarga.txt is a copyright notice
+    df = _read_csv(path, sep='|', skiprows=1, dtype=str,
+                   usecols=['d_codigo', 'd_asenta', 'd_tipo_asenta', 'D_mnpio', 'c_estado', 'c_mnpio',
+                            'id_asenta_cpcons'])
+    df = df[df['c_estado'].str.zfill(2) == cve_ent]
+    df = df.drop_duplicates(['c_mnpio', 'id_asenta_cpcons'])
+
+    places = [
+        Place(f"col:{cve_ent}{row.c_mnpio.zfill(3)}:{row.id_asenta_cpcons.zfill(4)}", row.d_asenta, 'colonia',
+              cve_ent + row.c_mnpio.zfill(3), row.D_mnpio, None, None)
+        for row in df.itertuples(index=False)
+    ]
+    logging.info(f"Loaded {len(places)} SEPOMEX asentamientos for c_estado {cve_ent}")
+    return places
+
+
+class Gazetteer:
+    """Token trie over place names with canonical ids."""
+
+    def __init__(self, places=()):
+        self.trie = {}
+        self.places = {}
+        self.municipios = {}
+        for place in places:
+            self.add(place)
+
+    @classmethod
+    def from_files(cls, ageeml_path=AGEEML_PATH, sepomex_path=SEPOMEX_PATH, cve_ent=JALISCO):
+        """Gazetteer from the AGEEML catalog plus SEPOMEX asentamientos when the file exists."""
+        places = load_ageeml(ageeml_path, cve_ent)
+        if sepomex_path and os.path.exists(sepomex_path):
+            places += load_sepomex(sepomex_path, cve_ent)
+        return cls(places)
+
+    def add(self, place):
+        tokens = [token for token, _, _ in tokenize(place.name)]
+        if not tokens:
+            return
+        self.places[place.place_id] = place
+        names = [tokens]
+        if place.kind == 'municipio':
+            names += [alias.split() for alias in MUNICIPIO_ALIASES.get(' '.join(tokens), [])]
+        for name in names:
+            if place.kind == 'municipio':
+                self.municipios[' '.join(name)] = place.cve_mun
+            node = self.trie
+            for token in name:
+                node = node.setdefault(token, {})
+            node.setdefault(_TERMINAL, []).append(place.place_id)
+
+    def __len__(self):
+        return len(self.places)
+
+    def municipio_code(self, municipio):
+        """CVE_ENT + CVE_MUN of a municipio name as written in the registries, or None."""
+        if not isinstance(municipio, str):
+            return None
+        return self.municipios.get(' '.join(token for token, _, _ in tokenize(municipio)))
+
+    def _accept(self, place, previous, cve_mun):
+        if cve_mun and place.kind != 'municipio' and place.cve_mun != cve_mun:
+            return False
+        if place.kind == 'colonia':
+            return previous in COLONIA_TRIGGERS
+        if place.kind == 'localidad':
+            return previous in LOCALIDAD_TRIGGERS or (cve_mun is not None and place.cve_mun == cve_mun)
+        return True
+
+    def match(self, text, municipio=None):
+        """Non-overlapping leftmost-longest place mentions of a text.
+
+        When the municipio of the record is known, colonias and localidades of
+        other municipios are ignored. Names shared by several places of the
+        same kind that cannot be told apart are skipped.
+        """
+        if not isinstance(text, str) or not text:
+            return []
+        cve_mun = self.municipio_code(municipio)
+        tokens = tokenize(text)
+        matches = []
+        i = 0
+        while i < len(tokens):
+            node = self.trie
+            best = None
+            j = i
+            while j < len(tokens) and tokens[j][0] in node:
+                node = node[tokens[j][0]]
+                j += 1
+                if _TERMINAL in node:
+                    best = (j, node[_TERMINAL])
+            if best is None:
+                i += 1
+                continue
+
+            end, place_ids = best
+            previous = tokens[i - 1][0] if i > 0 else None
+            candidates = [self.places[pid] for pid in place_ids]
+            candidates = [p for p in candidates if self._accept(p, previous, cve_mun)]
+            # The seat of a municipio with the same name is the municipio itself
+            seats = {p.cve_mun for p in candidates if p.kind == 'municipio'}
+            candidates = [p for p in candidates
+                          if not (p.kind == 'localidad' and p.cve_mun in seats and p.place_id.endswith('0001'))]
+            if candidates:
+                top = min(KIND_PRIORITY[p.kind] for p in candidates)
+                candidates = [p for p in candidates if KIND_PRIORITY[p.kind] == top]
+                if len(candidates) == 1:
+                    matches.append(Match(candidates[0], tokens[i][1], tokens[end - 1][2]))
+                    i = end
+                    continue
+            i += 1
+        return matches
+
+    def best_match(self, text, municipio=None):
+        """The most specific place mentioned in a text: colonia, then localidad, then municipio."""
+        matches = self.match(text, municipio)
+        if not matches:
+            return None
+        return min(matches, key=lambda m: KIND_PRIORITY[m.place.kind])
+
+    def coordinates(self, place_id):
+        """(lat, lon) of a place, or None when the catalog has no point for it."""
+        place = self.places.get(place_id)
+        if place is None or place.lat is None or pd.isna(place.lat) or pd.isna(place.lon):
+            return None
+        return place.lat, place.lon
+
+
+def load_gazetteer(ageeml_path=AGEEML_PATH, sepomex_path=SEPOMEX_PATH):
+    """Gazetteer from the default catalog paths, or None when AGEEML has not been downloaded."""
+    if not os.path.exists(ageeml_path):
+        logging.info(f"Gazetteer catalog not found at {ageeml_path}; place matching is disabled")
+        return None
+    return Gazetteer.from_files(ageeml_path, sepomex_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Match Jalisco place names in a text.')
+    parser.add_argument('text')
+    parser.add_argument('--municipio', default=None, help='Municipio of the record, used to disambiguate')
+    parser.add_argument('--ageeml', default=AGEEML_PATH)
+    parser.add_argument('--sepomex', default=SEPOMEX_PATH)
+    args = parser.parse_args()
+
+    gazetteer = Gazetteer.from_files(args.ageeml, args.sepomex)
+    print(f"{len(gazetteer)} places loaded")
+    for match in gazetteer.match(args.text, args.municipio):
+        print(f"{match.place.place_id}\t{match.place.kind}\t{match.place.name}\t"
+              f"{match.place.municipio}\t{gazetteer.coordinates(match.place.place_id)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+inferences.py - Schema, typed columns and spatio-temporal reads of repd_vp_inferencias.
+
+The inference writer used to store coordinates only as a "lat,lon" string
+and the date only as the free text found in the description, so every
+consumer split strings and no filter could run in SQL. Each inference now
+also carries typed columns, all indexed:
+
+    lat, lon             DOUBLE, parsed from lat_long
+    geohash              geohash (utils/geohash.py) of lat/lon; a prefix is a spatial cell
+    fecha_inferida       DATE of the "día 15 de marzo del 2023" text in fecha
+    fecha_desaparicion   DATE of the cedula, copied so date windows need no join
+
+lat_long and fecha are kept as they were for existing readers. Tables
+created before these columns are migrated in place and their rows
+backfilled in batches:
+
+    python inferences.py migrate
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from datetime import date
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from db import column_exists, get_connection, read_chunks, update_from_staging
+from geohash import encode as geohash_encode
+
+from cedulas import CEDULAS_TABLE
+from nlp_pipeline import MONTHS
+
+INFERENCES_TABLE = 'repd_vp_inferencias'
+INFERENCE_COLUMNS = ['id_cedula_busqueda', 'tipo_loc', 'loc', 'lat_long', 'lat', 'lon', 'geohash', 'place_id',
+                     'precision_geo', 'fecha', 'fecha_inferida', 'fecha_desaparicion', 'desc_hash',
+                     'pipeline_version']
+TYPED_COLUMNS = ['lat', 'lon', 'geohash', 'fecha_inferida', 'fecha_desaparicion']
+
+# Columns added to tables created by earlier versions of the writer, in order
+MIGRATED_COLUMNS = [
+    ('place_id', 'VARCHAR(32) AFTER lat_long'),
+    ('precision_geo', 'VARCHAR(16) AFTER place_id'),
+    ('desc_hash', 'CHAR(64)'),
+    ('pipeline_version', 'VARCHAR(32)'),
+    ('lat', 'DOUBLE AFTER lat_long'),
+    ('lon', 'DOUBLE AFTER lat'),
+    ('geohash', 'VARCHAR(12) AFTER lon'),
+    ('fecha_inferida', 'DATE AFTER fecha'),
+    ('fecha_desaparicion', 'DATE AFTER fecha_inferida'),
+]
+INDEXES = {
+    'idx_inferencias_fecha_desaparicion': 'fecha_desaparicion',
+    'idx_inferencias_fecha_inferida': 'fecha_inferida',
+    'idx_inferencias_geohash': 'geohash',
+    'idx_inferencias_lat_lon': 'lat, lon',
+}
+BACKFILL_CHUNK_SIZE = 5000
+# precision_geo of records placed at a municipio or estado centroid (utils/centroids.py) for lack of a location
+CENTROID_PRECISIONS = ('municipio', 'estado')
+
+MONTH_NUMBERS = {month: number for number, month in enumerate(MONTHS, start=1)}
+DATE_PATTERN = re.compile(rf"(\d{{1,2}})\s+de\s+({'|'.join(MONTHS)})\s+(?:del?\s+)?(\d{{4}})")
+
+
+def parse_date_text(text):
+    """date of a "15 de marzo del 2023" text, or None when it does not hold a valid date."""
+    if not isinstance(text, str):
+        return None
+    match = DATE_PATTERN.search(text.lower())
+    if not match:
+        return None
+    day, month, year = match.groups()
+    try:
+        return date(int(year), MONTH_NUMBERS[month], int(day))
+    except ValueError:
+        return None
+
+
+def to_date(values):
+    """Dates of a column of ISO dates or datetimes (strings or date objects), with None where they do not parse."""
+    dates = pd.to_datetime(pd.Series(values).astype('string').str[:10], format='%Y-%m-%d', errors='coerce')
+    return dates.dt.date.astype(object).where(dates.notna(), None)
+
+
+def add_typed_columns(df):
+    """Fill lat, lon, geohash and fecha_inferida from lat_long and fecha, and type fecha_desaparicion."""
+    parts = df['lat_long'].astype('string').str.split(',', n=1, expand=True).reindex(columns=[0, 1])
+    df['lat'] = pd.to_numeric(parts[0], errors='coerce').astype(float)
+    df['lon'] = pd.to_numeric(parts[1], errors='coerce').astype(float)
+    df['geohash'] = [geohash_encode(lat, lon) for lat, lon in zip(df['lat'], df['lon'])]
+    df['fecha_inferida'] = df['fecha'].map(parse_date_text)
+    if 'fecha_desaparicion' in df.columns:
+        df['fecha_desaparicion'] = to_date(df['fecha_desaparicion']).to_numpy()
+    return df
+
+
+def _index_exists(cursor, table, index):
+    cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s", (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def ensure_inference_table(conn, table=INFERENCES_TABLE):
+    """Create the inferences table with its indexes, adding the columns of later versions to older tables.
+
+    Returns the names of the columns that were added.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id_cedula_busqueda VARCHAR(255) PRIMARY KEY,
+            tipo_loc VARCHAR(255),
+            loc TEXT,
+            lat_long VARCHAR(255),
+            lat DOUBLE,
+            lon DOUBLE,
+            geohash VARCHAR(12),
+            place_id VARCHAR(32),
+            precision_geo VARCHAR(16),
+            fecha VARCHAR(255),
+            fecha_inferida DATE,
+            fecha_desaparicion DATE,
+            desc_hash CHAR(64),
+            pipeline_version VARCHAR(32)
+        )
+        """)
+
+        added = []
+        for column, definition in MIGRATED_COLUMNS:
+            if not column_exists(cursor, table, column):
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                added.append(column)
+        for index, columns in INDEXES.items():
+            if not _index_exists(cursor, table, index):
+                cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+                logging.info(f"Created index {index} on {table} ({columns})")
+        conn.commit()
+    finally:
+        cursor.close()
+    if added:
+        logging.info(f"Added columns {', '.join(added)} to {table}")
+    return added
+
+
+def backfill_typed_columns(conn, table=INFERENCES_TABLE, chunk_size=BACKFILL_CHUNK_SIZE):
+    """Fill the typed columns of existing rows from lat_long, fecha and the cedulas, chunk by chunk."""
+    rows = 0
+    for chunk in read_chunks(conn, table, ['id_cedula_busqueda', 'lat_long', 'fecha'], key='id_cedula_busqueda',
+                             chunk_size=chunk_size, where='lat_long IS NOT NULL OR fecha IS NOT NULL'):
+        add_typed_columns(chunk)
+        update_from_staging(conn, table, chunk, key_columns=['id_cedula_busqueda'],
+                            update_columns=['lat', 'lon', 'geohash', 'fecha_inferida'])
+        rows += len(chunk)
+
+    # Cedulas without an inference row are ignored by the join-UPDATE
+    dated = 0
+    for chunk in read_chunks(conn, CEDULAS_TABLE, ['id_cedula_busqueda', 'fecha_desaparicion'],
+                             key='id_cedula_busqueda', chunk_size=chunk_size):
+        chunk['fecha_desaparicion'] = to_date(chunk['fecha_desaparicion']).to_numpy()
+        report = update_from_staging(conn, table, chunk, key_columns=['id_cedula_busqueda'],
+                                     update_columns=['fecha_desaparicion'])
+        dated += report['affected']
+    logging.info(f"Backfilled coordinates and dates of {rows} inferences and {dated} disappearance dates")
+    return rows
+
+
+def migrate(conn, table=INFERENCES_TABLE, backfill=False):
+    """Bring the table to the current schema; rows are backfilled when typed columns were just added."""
+    added = ensure_inference_table(conn, table)
+    if backfill or set(added) & set(TYPED_COLUMNS):
+        backfill_typed_columns(conn, table)
+
+
+def fetch_inferences(db_config, start=None, end=None, bbox=None, geohash=None, condicion=None, located=True,
+                     centroids=False, table=INFERENCES_TABLE):
+    """Cedulas with the typed columns of their inference, filtered in SQL.
+
+    Rows start from repd_vp_cedulas_principal with a LEFT JOIN, so with
+    located=False cedulas without an inference (or without coordinates) are
+    returned too, with NULL lat/lon. start/end bound the fecha_desaparicion
+    of the cedula (inclusive, 'YYYY-MM-DD'); bbox is (min_lat, min_lon,
+    max_lat, max_lon) and geohash a cell prefix, both on the indexed
+    inference columns.
+
+    Coordinates of records placed at a municipio or estado centroid would
+    pile up at each seat, so they count as unlocated unless centroids=True.
+    """
+    conditions = ['i.lat IS NOT NULL'] if located else ['1 = 1']
+    params = []
+    if not centroids and (located or bbox or geohash):
+        conditions.append(f"(i.precision_geo IS NULL OR i.precision_geo NOT IN "
+                          f"({', '.join(['%s'] * len(CENTROID_PRECISIONS))}))")
+        params += CENTROID_PRECISIONS
+    if start:
+        conditions.append('p.fecha_desaparicion >= %s')
+        params.append(start)
+    if end:
+        # Half-open bound, so DATETIME and 'YYYY-MM-DD hh:mm' values on the last day are kept
+        conditions.append('p.fecha_desaparicion < DATE_ADD(%s, INTERVAL 1 DAY)')
+        params.append(end)
+    if bbox:
+        conditions.append('i.lat BETWEEN %s AND %s AND i.lon BETWEEN %s AND %s')
+        params += [bbox[0], bbox[2], bbox[1], bbox[3]]
+    if geohash:
+        conditions.append('i.geohash LIKE %s')
+        params.append(f"{geohash}%")
+    if condicion:
+        conditions.append('p.condicion_localizacion = %s')
+        params.append(condicion)
+    columns = ['id_cedula_busqueda', 'lat', 'lon', 'geohash', 'precision_geo', 'fecha_desaparicion', 'sexo',
+               'edad_momento_desaparicion', 'condicion_localizacion']
+    query = f"""
+        SELECT p.id_cedula_busqueda, i.lat, i.lon, i.geohash, i.precision_geo, p.fecha_desaparicion,
+               p.sexo, p.edad_momento_desaparicion, p.condicion_localizacion
+        FROM {CEDULAS_TABLE} p
+        LEFT JOIN {table} i ON i.id_cedula_busqueda = p.id_cedula_busqueda
+        WHERE {' AND '.join(conditions)}
+        ORDER BY p.fecha_desaparicion
+    """
+    conn = get_connection(db_config)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, tuple(params))
+        df = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+    finally:
+        cursor.close()
+        conn.close()
+    df['fecha_desaparicion'] = pd.to_datetime(to_date(df['fecha_desaparicion']))
+    if not centroids:
+        df.loc[df['precision_geo'].isin(CENTROID_PRECISIONS), ['lat', 'lon', 'geohash']] = None
+    df[['lat', 'lon']] = df[['lat', 'lon']].astype(float)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Schema and typed columns of repd_vp_inferencias.')
+    parser.add_argument('--credentials', default='db_credentials.json')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('migrate', help='Add the typed columns and indexes, then backfill existing rows')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with open(args.credentials, 'r') as file:
+        config = json.load(file)
+    db_config = {key: config[key] for key in ('host', 'user', 'password', 'database')}
+    conn = get_connection(db_config)
+    try:
+        migrate(conn, backfill=True)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
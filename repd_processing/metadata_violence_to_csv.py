@@ -1,18 +1,96 @@
 # Import necessary libraries for data processing, machine learning, and text analysis
 import pandas as pd  # Data manipulation
 import numpy as np  # Numerical operations
+import argparse  # Command line options
+import os  # Model and output paths
 import re  # Regular expressions
+import time  # Throughput reports
+from datetime import datetime  # Training timestamp of the model
+from multiprocessing import Pool  # Keyword matching across processes
 import nltk  # Natural Language Toolkit for text processing
-from nltk.tokenize import word_tokenize  # Breaking text into words
 from nltk.corpus import stopwords  # Common words to remove
-from sklearn.model_selection import train_test_split  # Splitting data for training
-from sklearn.feature_extraction.text import TfidfVectorizer  # Converting text to numerical features
-from sklearn.ensemble import RandomForestClassifier  # Machine learning classifier
+import joblib  # Model persistence
+from sklearn.feature_extraction.text import HashingVectorizer  # Converting text to numerical features
+from sklearn.linear_model import SGDClassifier  # Online linear classifier
 from sklearn.metrics import classification_report  # Performance evaluation
 
 # Download necessary NLTK resources for text processing
 nltk.download("stopwords")
-nltk.download("punkt")
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(script_dir, 'models', 'violence_classifier.joblib')
+OUTPUT_PATH = "filtered_cases_with_violence_terms.csv"
+
+# Bump when the features or the saved state change; older models are refused instead of misread
+MODEL_VERSION = 1
+N_FEATURES = 2 ** 20
+NGRAM_RANGE = (1, 3)  # Consider 1-3 word combinations
+CLASSES = np.array([0, 1])
+THRESHOLD = 0.5
+
+# Columns to export
+EXPORT_COLUMNS = [
+    'id_cedula_busqueda',
+    'condicion_localizacion',
+    'edad_momento_desaparicion',
+    'sexo',
+    'genero',
+    'descripcion_desaparicion',
+    'violence_terms',
+    'has_violent_term',  # Binary flag for at least one violent term
+    'violence_score',
+    'sum_score',
+    'is_violent',
+    'predicted_violent',
+    'violence_probability'
+]
+
+# Rows per worker task when matching keywords across processes
+CHUNK_SIZE = 5000
+
+# Score added per 'condicion_localizacion'
+CONDITION_SCORES = {
+    "CON VIDA": 0.5,
+    "NO APLICA": 1,
+    "SIN VIDA": 2
+}
+
+
+def build_keyword_pattern(keywords):
+    """
+    One compiled regex for all keywords: each match is a whole word containing
+    a keyword (term) plus the first keyword found in it (base).
+    Longer keywords go first so a shared prefix picks the longest.
+    Keywords with spaces ("buscar trabajo") are left out: they were compared
+    against single tokens and never matched, so including them would change
+    the scores.
+    """
+    keywords = [kw for kw in keywords if not any(char.isspace() for char in kw)]
+    alternation = '|'.join(re.escape(kw) for kw in sorted(keywords, key=lambda kw: (-len(kw), kw)))
+    # \b skips match attempts in the middle of words
+    return re.compile(rf"\b(\w*?({alternation})\w*)")
+
+
+def _match_chunk(args):
+    texts, pattern = args
+    matches = texts.str.findall(pattern).explode().dropna()
+    return pd.DataFrame({'term': matches.str[0], 'base': matches.str[1]}, index=matches.index)
+
+
+def match_keywords(texts, pattern, workers=1, chunksize=CHUNK_SIZE):
+    """
+    Every keyword match of a text column as a long DataFrame indexed by row: term, base.
+    With workers > 1 the column is split in chunks matched in a process pool.
+    """
+    texts = texts.fillna('').astype(str).str.lower()
+    chunks = [(texts.iloc[i:i + chunksize], pattern) for i in range(0, len(texts), chunksize)]
+    if workers == 1 or len(chunks) <= 1:
+        parts = [_match_chunk(chunk) for chunk in chunks]
+    else:
+        with Pool(processes=workers) as pool:
+            parts = pool.map(_match_chunk, chunks)
+    parts = [part for part in parts if not part.empty]
+    return pd.concat(parts) if parts else pd.DataFrame(columns=['term', 'base'], dtype=object)
 
 
 class ViolentKidnappingDetector:
@@ -52,181 +130,207 @@ class ViolentKidnappingDetector:
             "domicilio", "persona", "jpg", "día"
         })
 
-    def calculate_sum_score(self, row):
-        """
-        Calculates sum_score based on:
-        - Adds 2 if 'condicion_localizacion' is "NO APLICA" or "SIN VIDA".
-        - Counts violent terms using specific rules.
-        """
-        sum_score = 0
-
-        # Count violent terms
-        term_counts = {}
-        for term in row['violence_terms']:
-            base_term = next((kw for kw in self.violent_keywords if kw in term), term)
-            term_counts[base_term] = term_counts.get(base_term, 0) + 1
-
-        for count in term_counts.values():
-            if count == 1:
-                sum_score += 1
-            else:
-                sum_score += 0.5
-
-        # Define score mapping for 'condicion_localizacion'
-        condition_scores = {
-            "CON VIDA": 0.5,
-            "NO APLICA": 1,
-            "SIN VIDA": 2
-        }
-
-        # Add the corresponding score if the condition exists in the dictionary
-        sum_score += condition_scores.get(row['condicion_localizacion'], 0)
-
-        return sum_score
-
-    def preprocess_text(self, text):
-        """
-        Clean and tokenize text:
-        1. Convert to lowercase
-        2. Split into individual words
-        3. Remove stopwords
-        """
-        # Convert to lowercase and tokenize
-        tokens = word_tokenize(str(text).lower())
-
-        # Remove stopwords
-        return [word for word in tokens if word not in self.custom_stopwords]
+        # Single regex over every keyword, matched against whole columns
+        self.keyword_pattern = build_keyword_pattern(self.violent_keywords)
 
-    def detect_violent_keywords(self, tokens):
+    def detect_violent_keywords(self, texts, workers=1):
         """
-        Find words that match violent keyword prefixes
+        Find words that contain a violent keyword, for a whole column at once
         Example:
         - "llevaron" matches "llev"
         - "golpeado" matches "golp"
+        Words that are stopwords are dropped.
         """
-        return [word for word in tokens if
-                any(keyword in word for keyword in self.violent_keywords)]
-
-    def extract_features(self, df):
-        """
-        Prepare data for machine learning:
-        1. Tokenize descriptions
-        2. Detect violent terms
-        3. Create violence label
-        4. Convert text to numerical features (TF-IDF)
-        """
-        # Tokenize descriptions
-        df['tokens'] = df['descripcion_desaparicion'].apply(self.preprocess_text)
-
-        # Find violent terms using prefix matching
-        df['violence_terms'] = df['tokens'].apply(self.detect_violent_keywords)
-
-        # Label as violent if any violent terms found
-        df['is_violent'] = df['violence_terms'].apply(lambda x: 1 if len(x) > 0 else 0)
-
-        # Add violence score based on the number of violence terms
-        df['violence_score'] = df['violence_terms'].apply(len)
-
-        # Add a binary flag for whether there is at least one violent term
-        df['has_violent_term'] = df['violence_terms'].apply(lambda x: 1 if len(x) > 0 else 0)
+        matches = match_keywords(texts, self.keyword_pattern, workers)
+        return matches[~matches['term'].isin(self.custom_stopwords)]
 
-        # Convert text to numerical features using TF-IDF
-        tfidf = TfidfVectorizer(
-            stop_words=list(self.custom_stopwords),
-            ngram_range=(1, 3),  # Consider 1-3 word combinations
-            max_df=0.95,  # Ignore very common terms
-            min_df=2  # Ignore very rare terms
-        )
-        tfidf_matrix = tfidf.fit_transform(df['descripcion_desaparicion'])
-
-        return tfidf_matrix, tfidf
-
-    def train_classifier(self, df, tfidf_matrix):
+    def calculate_scores(self, df, matches):
         """
-        Train a machine learning model to classify violent cases:
-        1. Split data into training and testing sets
-        2. Train Random Forest classifier
-        3. Evaluate model performance
+        Adds the violence columns from the keyword matches:
+        - violence_terms: matched words, comma separated
+        - violence_score: number of matched words
+        - sum_score: 1 per keyword found once, 0.5 per keyword repeated, plus
+          the score of 'condicion_localizacion' (CONDITION_SCORES)
         """
-        # Split data into training and testing sets
-        X_train, X_test, y_train, y_test = train_test_split(
-            tfidf_matrix, df['is_violent'], test_size=0.2, random_state=42
-        )
-
-        # Create and train Random Forest classifier
-        clf = RandomForestClassifier(n_estimators=10, random_state=42)
-        clf.fit(X_train, y_train)
-
-        # Make predictions and print performance metrics
-        y_pred = clf.predict(X_test)
-        print("\n🔍 Classification Report:")
-        print(classification_report(y_test, y_pred))
-
-        return clf
-
-    def process_data(self, df):
+        rows = matches.index
+        # Matches of a row are contiguous, so each row's terms are joined with one reduceat
+        labels = rows.to_numpy()
+        starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]]) if len(labels) else np.array([], dtype=int)
+        joined = np.add.reduceat((', ' + matches['term']).to_numpy(dtype=object), starts) if len(labels) else []
+        terms = pd.Series(joined, index=labels[starts], dtype=object).str[2:]
+        df['violence_terms'] = terms.reindex(df.index, fill_value='')
+        df['violence_score'] = matches.groupby(rows).size().reindex(df.index, fill_value=0)
+
+        # Occurrences of each base keyword per row
+        base_counts = matches.groupby([rows, matches['base']]).size()
+        keyword_scores = pd.Series(np.where(base_counts.to_numpy() == 1, 1.0, 0.5), index=base_counts.index)
+        keyword_scores = keyword_scores.groupby(level=0).sum().reindex(df.index, fill_value=0.0)
+        df['sum_score'] = keyword_scores + df['condicion_localizacion'].map(CONDITION_SCORES).fillna(0)
+        return df
+
+    def extract_features(self, df, workers=1):
         """
-        Main data processing pipeline:
-        1. Extract features
-        2. Train classifier
-        3. Predict violent cases
-        4. Save results with specific columns
+        Keyword columns used as the label of the classifier:
+        1. Detect violent terms over the whole column
+        2. Compute violence scores and label
         """
-        # Extract text features
-        tfidf_matrix, tfidf = self.extract_features(df)
-
-        # Train machine learning classifier
-        classifier = self.train_classifier(df, tfidf_matrix)
-
-        # Predict violent cases
-        df['predicted_violent'] = classifier.predict(tfidf_matrix)
-
-        # Convert violence terms to a readable string
-        df['violence_terms'] = df['violence_terms'].apply(lambda x: ', '.join(x))
-
-        # Dentro de ViolentKidnappingDetector.process_data
-        # Agregar columna sum_score
-        df['sum_score'] = df.apply(lambda row: self.calculate_sum_score(row), axis=1)
+        # Find violent terms with the compiled keyword regex
+        matches = self.detect_violent_keywords(df['descripcion_desaparicion'], workers)
+        self.calculate_scores(df, matches)
 
-        # Columns to export (only the specified columns)
-        columns_to_export = [
-            'id_cedula_busqueda',
-            'condicion_localizacion',
-            'edad_momento_desaparicion',
-            'sexo',
-            'genero',
-            'descripcion_desaparicion',
-            'violence_terms',
-            'has_violent_term',  # Binary flag for at least one violent term
-            'violence_score',
-            'sum_score',
-            'is_violent'
-        ]
-
-        # Check if all columns exist in the dataframe
-        existing_columns = [col for col in columns_to_export if col in df.columns]
-
-        # Export all cases (violent and non-violent)
-        df_all = df[existing_columns]
-        df_all.to_csv("filtered_cases_with_violence_terms.csv", index=False)
+        # Label as violent if any violent terms found
+        df['is_violent'] = (df['violence_score'] > 0).astype(int)
 
-        return df_all
+        # Add a binary flag for whether there is at least one violent term
+        df['has_violent_term'] = df['is_violent']
+        return df
+
+
+class ViolenceClassifier:
+    """
+    Hashed 1-3-gram features and a logistic SGDClassifier updated with partial_fit.
+
+    The hashing vectorizer has no vocabulary to fit, so the saved state is the
+    linear model plus the settings needed to hash new text the same way.
+    """
+
+    def __init__(self, stop_words=(), state=None):
+        state = state or {}
+        self.stop_words = state.get('stop_words', sorted(stop_words))
+        self.model = state.get('model') or SGDClassifier(loss='log_loss', alpha=1e-5, random_state=42)
+        self.revision = state.get('revision', 0)
+        self.trained_at = state.get('trained_at')
+        self.trained_rows = state.get('trained_rows', 0)
+        self.seen_ids = state.get('seen_ids', set())
+        self.vectorizer = HashingVectorizer(ngram_range=NGRAM_RANGE, n_features=N_FEATURES,
+                                            stop_words=self.stop_words, alternate_sign=False, norm='l2')
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        state = joblib.load(path)
+        if state.get('version') != MODEL_VERSION:
+            raise ValueError(f"{path} has model version {state.get('version')}, expected {MODEL_VERSION}; "
+                             f"run 'train --reset'")
+        return cls(state=state)
+
+    def save(self, path=MODEL_PATH):
+        # Plain state dict, so the file loads whether this module runs as a script or is imported
+        self.revision += 1
+        self.trained_at = datetime.now().isoformat(timespec='seconds')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        joblib.dump({
+            'version': MODEL_VERSION,
+            'revision': self.revision,
+            'trained_at': self.trained_at,
+            'trained_rows': self.trained_rows,
+            'seen_ids': self.seen_ids,
+            'stop_words': self.stop_words,
+            'model': self.model,
+        }, tmp_path)
+        os.replace(tmp_path, path)
+
+    @property
+    def is_fitted(self):
+        return hasattr(self.model, 'coef_')
+
+    def transform(self, texts):
+        return self.vectorizer.transform(texts.fillna('').astype(str))
+
+    def partial_fit(self, texts, labels):
+        self.model.partial_fit(self.transform(texts), labels, classes=CLASSES)
+        self.trained_rows += len(labels)
+
+    def predict_proba(self, texts):
+        """Probability that each description is violent."""
+        return self.model.predict_proba(self.transform(texts))[:, 1]
+
+
+def train(args):
+    detector = ViolentKidnappingDetector()
+    if os.path.exists(args.model) and not args.reset:
+        classifier = ViolenceClassifier.load(args.model)
+        print(f"Loaded model revision {classifier.revision} ({classifier.trained_rows} rows, "
+              f"trained {classifier.trained_at})")
+    else:
+        classifier = ViolenceClassifier(detector.custom_stopwords)
+
+    start = time.time()
+    rows = 0
+    new_ids = set()
+    # Progressive validation: every chunk is scored before the model learns from it
+    y_true, y_pred = [], []
+    for chunk in pd.read_csv(args.input, chunksize=args.chunksize):
+        chunk = chunk[~chunk['id_cedula_busqueda'].isin(classifier.seen_ids)]
+        if chunk.empty:
+            continue
+        detector.extract_features(chunk, args.workers)
+        if classifier.is_fitted:
+            y_true.append(chunk['is_violent'].to_numpy())
+            y_pred.append((classifier.predict_proba(chunk['descripcion_desaparicion']) >= THRESHOLD).astype(int))
+        classifier.partial_fit(chunk['descripcion_desaparicion'], chunk['is_violent'].to_numpy())
+        new_ids.update(chunk['id_cedula_busqueda'])
+        rows += len(chunk)
+
+    if not rows:
+        print("No new descriptions to train on")
+        return
+    classifier.seen_ids.update(new_ids)
+    classifier.save(args.model)
+    elapsed = time.time() - start
+    print(f"Trained on {rows} new descriptions in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+    if y_true:
+        print("\n🔍 Classification Report (progressive validation):")
+        print(classification_report(np.concatenate(y_true), np.concatenate(y_pred), zero_division=0))
+    print(f"Model revision {classifier.revision} saved to {args.model}")
+
+
+def predict(args):
+    """Score descriptions chunk by chunk with the saved model and export them with their keyword columns."""
+    detector = ViolentKidnappingDetector()
+    classifier = ViolenceClassifier.load(args.model)
+    print(f"Loaded model revision {classifier.revision} (trained {classifier.trained_at})")
+
+    start = time.time()
+    rows = 0
+    tmp_path = args.output + '.tmp'
+    for i, chunk in enumerate(pd.read_csv(args.input, chunksize=args.chunksize)):
+        detector.extract_features(chunk, args.workers)
+        chunk['violence_probability'] = classifier.predict_proba(chunk['descripcion_desaparicion']).round(4)
+        chunk['predicted_violent'] = (chunk['violence_probability'] >= THRESHOLD).astype(int)
+        # Only the export columns present in the input
+        chunk[[col for col in EXPORT_COLUMNS if col in chunk.columns]].to_csv(
+            tmp_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        rows += len(chunk)
+    if not rows:
+        print(f"No rows in {args.input}")
+        return
+    os.replace(tmp_path, args.output)
+    elapsed = time.time() - start
+    print(f"Scored {rows} descriptions in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+    print(f"Results saved to {args.output}")
 
 
 # Main execution
 def main():
-    # Load missing persons dataset
-    df = pd.read_csv("./csv/sisovid.csv")
-
-    # Create detector and process data
-    detector = ViolentKidnappingDetector()
-    filtered_cases = detector.process_data(df)
-
-    # Display full details of detected cases
-    pd.set_option('display.max_colwidth', None)
-    print("\n🚨 Filtered Cases with Violence Terms:")
-    print(filtered_cases)
+    parser = argparse.ArgumentParser(description='Detect violent keywords in disappearance descriptions.')
+    parser.add_argument('--input', default="./csv/sisovid.csv")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--chunksize', type=int, default=10000, help='Rows read from the CSV at a time')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes for keyword matching; worth it for large SISOVID exports')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train', help='Update the classifier with descriptions not seen before')
+    train_parser.add_argument('--reset', action='store_true', help='Start from an empty model')
+    predict_parser = subparsers.add_parser('predict', help='Score descriptions with the saved classifier')
+    predict_parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        train(args)
+    else:
+        predict(args)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
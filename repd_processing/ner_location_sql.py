@@ -1,10 +1,9 @@
-import spacy
 # from geopy.geocoders import Nominatim  # Commented out geolocation import
-import mysql.connector
 import json
 
-# Load spaCy model
-nlp = spacy.load(r'venv/lib/python3.12/site-packages/es_core_news_sm/es_core_news_sm-3.8.0')
+from batch_ner import entities_by_id, extract_entities
+from cedulas import iter_cedulas
+from nlp_pipeline import get_nlp
 
 # Nominatim geolocator
 # geolocator = Nominatim(user_agent="geoapiExercises")  # Commented out geolocator initialization
@@ -16,36 +15,13 @@ def load_db_config():
 
 # Database configuration
 DB_CONFIG = load_db_config()
-
-# Function to fetch records from the database
-def fetch_records_from_db(limit=10, offset=0):
-    """Fetch records from the database."""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-        query = """
-            SELECT id_cedula_busqueda, nombre_completo, descripcion_desaparicion
-            FROM repd_vp_cedulas_principal
-            LIMIT %s OFFSET %s
-        """
-        cursor.execute(query, (limit, offset))
-        records = cursor.fetchall()
-        return records
-    except mysql.connector.Error as e:
-        print(f"Error fetching data: {e}")
-        return []
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+RECORD_COLUMNS = ['id_cedula_busqueda', 'nombre_completo', 'descripcion_desaparicion']
 
 # Function to process NER for locations
 def process_ner_and_geolocation(records):
     """Process each record, detect locations with spaCy."""
-    for record in records:
-        description = record["descripcion_desaparicion"].lower()
-        doc = nlp(description)
-
+    entities = entities_by_id(extract_entities(get_nlp(ruler=False), records))
+    for record in records.to_dict('records'):
         # Create a list to store detected locations
         locations = []
 
@@ -54,14 +30,13 @@ def process_ner_and_geolocation(records):
         print(f"Descripción: {record['descripcion_desaparicion']}")
 
         # Iterate over the entities detected by spaCy
-        for ent in doc.ents:
-            print(f"Entity: {ent.text}")
-            print(f"  - Label: {ent.label_}")
-            #print(f"  - Start: {ent.start_char}, End: {ent.end_char}")
+        for text, label in entities.get(record['id_cedula_busqueda'], []):
+            print(f"Entity: {text}")
+            print(f"  - Label: {label}")
 
             # If the entity is a location, add it to the locations list
-            if ent.label_ == "LOC":  # "LOC" is the label for locations in spaCy
-                location = ent.text
+            if label == "LOC":  # "LOC" is the label for locations in spaCy
+                location = text
                 print(f"Detected location: {location}")
                 locations.append({
                     "location": location,
@@ -72,15 +47,10 @@ def process_ner_and_geolocation(records):
 
 # Example usage: process records in batches
 def main():
-    offset = 0
-    limit = 10  # You can adjust this limit as needed
-    while True:
-        records = fetch_records_from_db(limit=limit, offset=offset)
-        if not records:
-            break  # Exit if no more records to process
-
+    batch_size = 10  # You can adjust this batch size as needed
+    # Keyset pagination over one pooled connection: each page starts after the last id read
+    for records in iter_cedulas(DB_CONFIG, columns=RECORD_COLUMNS, chunk_size=batch_size):
         process_ner_and_geolocation(records)
-        offset += limit  # Move to the next batch of records
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,91 @@
+"""
+nlp_pipeline.py - Shared spaCy pipeline for the REPD scripts.
+
+The Spanish model and the DATE/TIME/ADDRESS/COLONIA EntityRuler patterns are
+defined here once. get_nlp() builds the pipeline on first use, keeps it as a
+process-wide singleton and serializes it with nlp.to_disk, so later runs load
+the configured pipeline, ruler included, straight from the cache.
+
+    from nlp_pipeline import get_nlp
+    doc = get_nlp()("salió de su domicilio en la colonia miravalle")
+"""
+
+import hashlib
+import json
+import logging
+import os
+from functools import lru_cache
+
+NLP_MODEL_PATH = os.environ.get(
+    'REPD_SPACY_MODEL', r'venv/lib/python3.12/site-packages/es_core_news_sm/es_core_news_sm-3.8.0')
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'nlp_pipeline')
+
+MONTHS = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+          "septiembre", "octubre", "noviembre", "diciembre"]
+DATE_PATTERNS = [{"LOWER": "día"}, {"IS_DIGIT": True}, {"LOWER": "de"},
+                 {"LOWER": {"IN": MONTHS}},
+                 {"LOWER": "del"}, {"IS_DIGIT": True}]
+TIME_PATTERNS = [{"LOWER": {"REGEX": "\\d{1,2}(:\\d{2})?(am|pm)?"}}]
+ADDRESS_PATTERNS = [{"LOWER": "calle"}, {"IS_ALPHA": True, "OP": "+"}, {"IS_PUNCT": True}, {"IS_DIGIT": True}]
+COLONIA_PATTERNS = [{"LOWER": "colonia"}, {"IS_ALPHA": True, "OP": "+"}, {"IS_ALPHA": True, "OP": "*"}]
+ENTITY_PATTERNS = [
+    {"label": "DATE", "pattern": DATE_PATTERNS},
+    {"label": "TIME", "pattern": TIME_PATTERNS},
+    {"label": "ADDRESS", "pattern": ADDRESS_PATTERNS},
+    {"label": "COLONIA", "pattern": COLONIA_PATTERNS},
+    {"label": "COLONIA", "pattern": [{"LOWER": "san"}, {"LOWER": "pedro"}, {"LOWER": "tlaquepaque"}]}
+]
+
+
+def _fingerprint(spacy_version, ruler):
+    """Identifies what the cached pipeline was built from; any change rebuilds it."""
+    payload = json.dumps({
+        'model': NLP_MODEL_PATH,
+        'spacy': spacy_version,
+        'patterns': ENTITY_PATTERNS if ruler else None,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_nlp(ruler=True):
+    """Load the model from NLP_MODEL_PATH and add the EntityRuler before the NER."""
+    import spacy
+
+    nlp = spacy.load(NLP_MODEL_PATH)
+    if ruler:
+        entity_ruler = nlp.add_pipe('entity_ruler', before='ner')
+        entity_ruler.add_patterns(ENTITY_PATTERNS)
+    return nlp
+
+
+def pipeline_version(ruler=True):
+    """Short fingerprint of the pipeline get_nlp() builds, for tagging stored results."""
+    import spacy
+
+    return _fingerprint(spacy.__version__, ruler)[:16]
+
+
+@lru_cache(maxsize=None)
+def get_nlp(ruler=True):
+    """Process-wide pipeline, loaded from the on-disk cache when it is up to date."""
+    import spacy
+
+    cache_dir = os.path.join(CACHE_DIR, 'ruler' if ruler else 'base')
+    fingerprint_path = os.path.join(cache_dir, 'fingerprint.txt')
+    fingerprint = _fingerprint(spacy.__version__, ruler)
+
+    if os.path.exists(fingerprint_path):
+        with open(fingerprint_path, 'r') as file:
+            if file.read().strip() == fingerprint:
+                logging.info(f"Loading cached spaCy pipeline from {cache_dir}")
+                return spacy.load(cache_dir)
+
+    logging.info(f"Building spaCy pipeline from {NLP_MODEL_PATH}")
+    nlp = build_nlp(ruler)
+    try:
+        nlp.to_disk(cache_dir)
+        with open(fingerprint_path, 'w') as file:
+            file.write(fingerprint)
+    except OSError as e:
+        logging.error(f"Could not cache the spaCy pipeline in {cache_dir}: {e}")
+    return nlp
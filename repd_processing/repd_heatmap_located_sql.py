@@ -1,38 +1,18 @@
-import spacy
-from spacy.pipeline import EntityRuler
-import pandas as pd
-import mysql.connector
 import json
-from geopy.geocoders import GoogleV3
-from geopy.exc import GeocoderTimedOut
 import folium
 from folium.plugins import HeatMap
-from spacy import displacy
 import os
 from jinja2 import Template
 import logging
+import sys
 
-# Load spaCy model
-NLP_MODEL_PATH = r'venv/lib/python3.12/site-packages/es_core_news_sm/es_core_news_sm-3.8.0'
-nlp = spacy.load(NLP_MODEL_PATH)
-
-# Add EntityRuler to the pipeline with refined patterns
-ruler = nlp.add_pipe('entity_ruler', before='ner')
-DATE_PATTERNS = [{"LOWER": "día"}, {"IS_DIGIT": True}, {"LOWER": "de"},
-                 {"LOWER": {"IN": ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
-                                   "septiembre", "octubre", "noviembre", "diciembre"]}},
-                 {"LOWER": "del"}, {"IS_DIGIT": True}]
-TIME_PATTERNS = [{"LOWER": {"REGEX": "\\d{1,2}(:\\d{2})?(am|pm)?"}}]
-ADDRESS_PATTERNS = [{"LOWER": "calle"}, {"IS_ALPHA": True, "OP": "+"}, {"IS_PUNCT": True}, {"IS_DIGIT": True}]
-COLONIA_PATTERNS = [{"LOWER": "colonia"}, {"IS_ALPHA": True, "OP": "+"}, {"IS_ALPHA": True, "OP": "*"}]
-patterns = [
-    {"label": "DATE", "pattern": DATE_PATTERNS},
-    {"label": "TIME", "pattern": TIME_PATTERNS},
-    {"label": "ADDRESS", "pattern": ADDRESS_PATTERNS},
-    {"label": "COLONIA", "pattern": COLONIA_PATTERNS},
-    {"label": "COLONIA", "pattern": [{"LOWER": "san"}, {"LOWER": "pedro"}, {"LOWER": "tlaquepaque"}]}
-]
-ruler.add_patterns(patterns)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from text_normalization import clean_location_text
+from geocoding import build_geocoder
+
+from cedulas import fetch_cedulas
+from batch_ner import entity_lookup, extract_entities
+from nlp_pipeline import get_nlp
 
 
 # Function to load database configuration
@@ -41,60 +21,17 @@ def load_db_config(file_path='db_credentials.json'):
         return json.load(file)
 
 
-# Database and API key configuration
-config = load_db_config()
-DB_CONFIG = {
-    'host': config['host'],
-    'user': config['user'],
-    'password': config['password'],
-    'database': config['database'],
-}
-GOOGLE_MAPS_API_KEY = config['google_api']
-
-
-# Function to fetch data from the database
-def fetch_data_from_db(limit=30):
-    """Fetch a limited number of records from the database."""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-        query = f"""
-        SELECT id_cedula_busqueda, autorizacion_informacion_publica, condicion_localizacion,
-               nombre_completo, edad_momento_desaparicion, sexo, genero, complexion, estatura,
-               tez, cabello, ojos_color, municipio, estado, fecha_desaparicion,
-               estatus_persona_desaparecida, descripcion_desaparicion, ruta_foto
-        FROM repd_vp_cedulas_principal
-        LIMIT {limit}
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return pd.DataFrame(results)
-    except mysql.connector.Error as e:
-        logging.error(f"Error fetching data from database: {e}")
-        return None
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
-
-
-def clean_location_text(location):
-    """Remove 'calle' and 'colonia' from the location text."""
-    words_to_remove = ['calle', 'colonia']
-    location_words = location.lower().split()
-    return ' '.join(word for word in location_words if word not in words_to_remove)
-
-
-def get_lat_long(location, municipio, estado, geolocator):
+# Worker processes for the NER stage (more than 1 only pays off for large tables); set RENDER_PATH
+# to write the displacy view of every description
+NER_PROCESSES = 1
+RENDER_PATH = None  # e.g. 'entities_heat_map.html'
+
+
+def get_lat_long(location, municipio, estado, geocoder):
     """Geocode a location to get latitude and longitude, limiting to Jalisco, Mexico."""
     cleaned_location = clean_location_text(location)
     full_location = f"{cleaned_location}, {municipio}, {estado}, México"
-    try:
-        loc = geolocator.geocode(full_location, timeout=10)
-        return (loc.latitude, loc.longitude) if loc else (None, None)
-    except GeocoderTimedOut:
-        logging.error(f"Geocoding timed out for location: {full_location}")
-        return None, None
+    return geocoder.geocode(full_location) or (None, None)
 
 
 def get_status_color(condicion_localizacion):
@@ -107,8 +44,8 @@ def get_status_color(condicion_localizacion):
     return status_colors.get(condicion_localizacion.upper(), 'gray')
 
 
-def process_descriptions(df, geolocator, weight=1):
-    """Process descriptions using spaCy NER pipeline and plot entities on a map."""
+def process_descriptions(df, geocoder, entities, weight=1):
+    """Geocode the location entities of each description and plot them on a heat map."""
     map_center = [20.676667, -103.3475]  # Center map on Guadalajara, Jalisco
     folium_map = folium.Map(location=map_center, zoom_start=12)
 
@@ -120,11 +57,10 @@ def process_descriptions(df, geolocator, weight=1):
     heat_data_cv = []
     heat_data_sv = []
 
+    location_entities = entity_lookup(entities, ["ADDRESS", "COLONIA"])
+
     for idx, row in df.iterrows():
-        if row['descripcion_desaparicion'] is None:
-            row['descripcion_desaparicion'] = "   "
         try:
-            description = row['descripcion_desaparicion'].lower()
             municipio = row['municipio']
             estado = row['estado']
             condicion_localizacion = row['condicion_localizacion']
@@ -134,12 +70,10 @@ def process_descriptions(df, geolocator, weight=1):
                             f"Municipio: {municipio}\n"
                             f"Estado: {estado}\n")
 
-            doc = nlp(description)
-            location_entity = next(((ent.text, ent.label_) for ent in doc.ents if ent.label_ in ["ADDRESS", "COLONIA"]),
-                                   None)
+            location_entity = location_entities.get(row['id_cedula_busqueda'])
             if location_entity:
-                text, label = location_entity
-                lat, long = get_lat_long(text, municipio, estado, geolocator)
+                text = location_entity
+                lat, long = get_lat_long(text, municipio, estado, geocoder)
                 if lat and long:
                     if condicion_localizacion.upper() == 'NO APLICA':
                         heat_data_na.append([lat, long, weight])
@@ -174,7 +108,6 @@ def process_descriptions(df, geolocator, weight=1):
                             fill_opacity=0.7,
                             popup=tooltip_text
                         ).add_to(fg_sv)
-            displacy.render(doc, style="ent", jupyter=False)
         except Exception as e:
             logging.error(f"Error processing text for ID {row['id_cedula_busqueda']}: {e}")
 
@@ -196,9 +129,19 @@ def process_descriptions(df, geolocator, weight=1):
     logging.info("Heat map has been saved to heat_map.html")
 
 
-df = fetch_data_from_db(limit=8033)
-if df is not None and not df.empty:
-    logging.info(f"Fetched {len(df)} records")
-    print(df.to_string())
-    geolocator = GoogleV3(api_key=GOOGLE_MAPS_API_KEY)
-    process_descriptions(df, geolocator, weight=0.2)  # Adjust the weight as needed
+def main():
+    # Database and API key configuration
+    config = load_db_config()
+    db_config = {key: config[key] for key in ('host', 'user', 'password', 'database')}
+
+    df = fetch_cedulas(db_config)
+    if df is not None and not df.empty:
+        logging.info(f"Fetched {len(df)} records")
+        print(df.to_string())
+        geocoder = build_geocoder(google_api_key=config['google_api'])
+        entities = extract_entities(get_nlp(), df, n_process=NER_PROCESSES, render_path=RENDER_PATH)
+        process_descriptions(df, geocoder, entities, weight=0.2)  # Adjust the weight as needed
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
-import spacy
-from spacy.pipeline import EntityRuler
 import pandas as pd
 from spacy import displacy
 
+from nlp_pipeline import get_nlp
+
 # Sample dataset
 data = [
     {
@@ -20,28 +20,8 @@ data = [
 # Convert the dataset into a pandas DataFrame
 df = pd.DataFrame(data)
 
-# Load the specified pre-trained Spanish model from SpaCy
-nlp = spacy.load(r'venv/lib/python3.12/site-packages/es_core_news_sm/es_core_news_sm-3.8.0')
-
-# Add EntityRuler to the pipeline
-ruler = nlp.add_pipe('entity_ruler', before='ner')
-
-# Define patterns for dates and addresses
-patterns = [
-    {"label": "DATE", "pattern": [
-        {"LOWER": "día"}, {"IS_DIGIT": True},
-        {"LOWER": "de"}, {"LOWER": {
-            "IN": ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre", "octubre",
-                   "noviembre", "diciembre"]}},
-        {"LOWER": "del"}, {"IS_DIGIT": True}]},
-    {"label": "TIME", "pattern": [{"LOWER": {"REGEX": "\\d{1,2}(:\\d{2})?(am|pm)?"}}]},
-    {"label": "ADDRESS", "pattern": [
-        {"LOWER": "calle"}, {"LOWER": {"REGEX": "\\w+"}}, {"LOWER": {"REGEX": "#\\d+"}}]},
-    {"label": "COLONIA", "pattern": [
-        {"LOWER": "colonia"}, {"LOWER": {"REGEX": "\\w+"}}]}
-]
-
-ruler.add_patterns(patterns)
+# Shared pipeline with the REPD EntityRuler patterns
+nlp = get_nlp()
 
 # Process each disappearance description
 for idx, row in df.iterrows():
@@ -1,44 +1,25 @@
-import spacy
-from spacy.pipeline import EntityRuler
 import pandas as pd
 import mysql.connector
+import argparse
+import hashlib
 import json
-from geopy.geocoders import GoogleV3
-from geopy.exc import GeocoderTimedOut
-import folium
-from spacy import displacy
 import os
 from jinja2 import Template
 import logging
-from collections import Counter, defaultdict
-import re
-import time  # Import time module
-
-# Load spaCy model
-NLP_MODEL_PATH = r'venv/lib/python3.12/site-packages/es_core_news_sm/es_core_news_sm-3.8.0'
-nlp = spacy.load(NLP_MODEL_PATH)
-
-# Add EntityRuler to the pipeline with refined patterns
-ruler = nlp.add_pipe('entity_ruler', before='ner')
-DATE_PATTERNS = [{"LOWER": "día"}, {"IS_DIGIT": True}, {"LOWER": "de"},
-                 {"LOWER": {"IN": ["enero", "febrero", "marzo", "abril", "mayo", "junio",
-                                   "julio", "agosto", "septiembre", "octubre", "noviembre",
-                                   "diciembre"]}},
-                 {"LOWER": "del"}, {"IS_DIGIT": True}]
-TIME_PATTERNS = [{"LOWER": {"REGEX": "\\d{1,2}(:\\d{2})?(am|pm)?"}}]
-ADDRESS_PATTERNS = [{"LOWER": "calle"}, {"IS_ALPHA": True, "OP": "+"},
-                    {"IS_PUNCT": True}, {"IS_DIGIT": True}]
-COLONIA_PATTERNS = [{"LOWER": "colonia"}, {"IS_ALPHA": True, "OP": "+"},
-                    {"IS_ALPHA": True, "OP": "*"}]
-patterns = [
-    {"label": "DATE", "pattern": DATE_PATTERNS},
-    {"label": "TIME", "pattern": TIME_PATTERNS},
-    {"label": "ADDRESS", "pattern": ADDRESS_PATTERNS},
-    {"label": "COLONIA", "pattern": COLONIA_PATTERNS},
-    {"label": "COLONIA", "pattern": [{"LOWER": "san"}, {"LOWER": "pedro"},
-                                     {"LOWER": "tlaquepaque"}]}
-]
-ruler.add_patterns(patterns)
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from text_normalization import clean_location_text
+from centroids import load_centroids
+from db import get_connection, upsert_df
+from geocoding import GeocodingPool, GoogleV3Provider, build_geocoder
+
+from cedulas import iter_cedulas
+from cooccurrence import COOCCURRENCE_PATH, CooccurrenceMatrix
+from batch_ner import ENTITY_COLUMNS, iter_entities, save_entities_to_sql
+from gazetteer import load_gazetteer
+from inferences import INFERENCE_COLUMNS, INFERENCES_TABLE, add_typed_columns, migrate
+from nlp_pipeline import get_nlp, pipeline_version
 
 
 # Function to load database configuration
@@ -47,89 +28,45 @@ def load_db_config(file_path='db_credentials.json'):
         return json.load(file)
 
 
-# Database and API key configuration
-config = load_db_config()
-DB_CONFIG = {
-    'host': config['host'],
-    'user': config['user'],
-    'password': config['password'],
-    'database': config['database'],
-}
-GOOGLE_MAPS_API_KEY = config['google_api']
-
-# Global cache for geocoding results
-CACHE_FILE = 'geocode_cache.json'
-TERMS_FILE = 'terms_frequency.txt'
-
-
-def load_cache():
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, 'r') as file:
-            return json.load(file)
-    return {}
+# Legacy JSON geocoding cache, imported once into the shared SQLite cache
+LEGACY_CACHE_FILE = 'geocode_cache.json'
 
+# Term co-occurrence counts (cooccurrence.py): tokens of left/right context counted around each term
+COOCCURRENCE_WINDOW = 1
 
-def save_cache(cache):
-    with open(CACHE_FILE, 'w') as file:
-        json.dump(cache, file)
+# Descriptions per nlp.pipe batch and worker processes for the NER stage. The NER runs while the
+# geocoding threads hold their locks, and nlp.pipe starts new workers for every chunk, so extra
+# processes are only worth it for large --full runs on fork-based platforms
+NER_BATCH_SIZE = 256
+NER_PROCESSES = 1
 
+# Rows per INSERT ... ON DUPLICATE KEY UPDATE batch
+WRITE_BATCH_SIZE = 1000
 
-geocode_cache = load_cache()
+# Bump when the inference logic of this script changes (gazetteer, geocoding, date handling);
+# changes to the spaCy model or patterns are picked up from the pipeline fingerprint
+INFERENCE_VERSION = 1
 
+# Concurrent geocoding requests and the request rate allowed by the Google quota
+GEOCODE_WORKERS = 8
+GEOCODE_RATE = 40
 
-def save_terms_frequency(counts):
-    with open(TERMS_FILE, 'w') as file:
-        for term, collocates in counts.items():
-            if any(count > 1 for count in collocates.values()):  # Only log terms with at least 2 occurrences
-                collocate_str = '; '.join([f"{k}: {v}" for k, v in collocates.items() if v > 1])
-                file.write(f"{term} --- {collocate_str}\n")
 
-
-def load_terms_frequency():
-    if os.path.exists(TERMS_FILE):
-        with open(TERMS_FILE, 'r') as file:
-            lines = file.readlines()
-        counts = {}
-        for line in lines:
-            term, collocates_str = line.strip().split(" --- ")
-            collocates = {k: int(v) for k, v in (colloc.split(": ") for colloc in collocates_str.split("; "))}
-            counts[term] = collocates
-        return counts
-    return {}
-
-
-# Function to fetch data from the database
-def fetch_data_from_db(limit=30):
-    """Fetch a limited number of records from the database."""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-        query = f"""
-        SELECT id_cedula_busqueda, autorizacion_informacion_publica, 
-               condicion_localizacion, nombre_completo, edad_momento_desaparicion, 
-               sexo, genero, complexion, estatura, tez, cabello, ojos_color, 
-               municipio, estado, fecha_desaparicion, estatus_persona_desaparecida, 
-               descripcion_desaparicion, ruta_foto
-        FROM repd_vp_cedulas_principal
-        LIMIT {limit}
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return pd.DataFrame(results)
-    except mysql.connector.Error as e:
-        logging.error(f"Error fetching data from database: {e}")
+def description_hash(description):
+    """SHA-256 hex digest of a description, equal to MySQL SHA2(CONVERT(... USING utf8mb4), 256)."""
+    if not isinstance(description, str):
         return None
-    finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
 
 
-def clean_location_text(location):
-    """Remove 'calle' and 'colonia' from the location text."""
-    words_to_remove = ['calle', 'colonia']
-    location_words = location.lower().split()
-    return ' '.join(word for word in location_words if word not in words_to_remove)
+def stale_condition(table_name=INFERENCES_TABLE):
+    """SQL condition for cedulas without an inference for their current description and pipeline version."""
+    return f"""NOT EXISTS (
+        SELECT 1 FROM {table_name} i
+        WHERE i.id_cedula_busqueda = repd_vp_cedulas_principal.id_cedula_busqueda
+          AND i.desc_hash <=> SHA2(CONVERT(repd_vp_cedulas_principal.descripcion_desaparicion USING utf8mb4), 256)
+          AND i.pipeline_version = %s
+    )"""
 
 
 def extract_tipo_loc(location):
@@ -141,29 +78,9 @@ def extract_tipo_loc(location):
     return None
 
 
-def get_location(geolocator, address):
-    if address in geocode_cache:
-        print(f"DEBUG: Cache hit for address: {address}")
-        return geocode_cache[address]
-    else:
-        print(f"DEBUG: Cache miss for address: {address}")
-        try:
-            location = geolocator.geocode(address)
-        except GeocoderTimedOut:
-            logging.error(f"Geocoding timed out for address: {address}")
-            return None
-        if location:
-            geocode_cache[address] = (location.latitude, location.longitude)
-            save_cache(geocode_cache)
-            return (location.latitude, location.longitude)
-        return None
-
-
-def get_lat_long(location, municipio, estado, geolocator):
-    """Geocode a location to get latitude and longitude, limiting to Jalisco, Mexico."""
-    cleaned_location = clean_location_text(location)
-    full_location = f"{cleaned_location}, {municipio}, {estado}, México"
-    return get_location(geolocator, full_location)
+def full_location(location, municipio, estado):
+    """Geocoding query for a location, limited to its municipio in Jalisco, Mexico."""
+    return f"{clean_location_text(location)}, {municipio}, {estado}, México"
 
 
 def clean_date_text(text):
@@ -171,137 +88,196 @@ def clean_date_text(text):
     return text.replace('día', '').strip()
 
 
-def process_word_frequencies(df):
-    """Process descriptions and record word frequencies while excluding stop words."""
-    stop_words = set(spacy.lang.es.stop_words.STOP_WORDS)
-    word_counter = Counter()
-    collocates = defaultdict(lambda: Counter())
+def process_descriptions(df, pool, version, gazetteer=None, centroids=None):
+    """Extract entities, queue the locations for geocoding and collect the date of each description.
 
-    for description in df['descripcion_desaparicion'].dropna():
-        words = re.findall(r'\b\w+\b', description.lower())
-        filtered_words = [word for word in words if word not in stop_words]
-        word_counter.update(filtered_words)
-
-        for i, word in enumerate(filtered_words):
-            if i > 0:  # Check previous word
-                collocates[word][f"before {filtered_words[i - 1]}"] += 1
-            if i < len(filtered_words) - 1:  # Check next word
-                collocates[word][f"after {filtered_words[i + 1]}"] += 1
-
-    combined_counts = {word: dict(collocate) for word, collocate in collocates.items()}
-    return combined_counts
-
-
-def process_descriptions(df, geolocator):
-    """Process descriptions using spaCy NER pipeline and plot entities on a map."""
-    map_center = [20.676667, -103.3475]  # Center map on Guadalajara, Jalisco
-    folium_map = folium.Map(location=map_center, zoom_start=12)
-    location_count = 0  # Initialize the location count
+    Entities are streamed from nlp.pipe and every location is submitted to the
+    geocoding pool as soon as its description is parsed, so the requests run
+    while the NER keeps going. gazetteer and centroids are the optional place
+    catalogs of gazetteer.py and utils/centroids.py. Returns the inferences
+    and the entity table.
+    """
+    offline_count = 0  # Locations resolved from the gazetteer without geocoding
     inferences = []  # List to hold inference results
+    entity_rows = []
+    rows = df.set_index('id_cedula_busqueda', drop=False)
 
-    for idx, row in df.iterrows():
+    docs = iter_entities(get_nlp(), df, batch_size=NER_BATCH_SIZE, n_process=NER_PROCESSES)
+    for record_id, doc_entities in docs:
+        entity_rows.extend(doc_entities)
         try:
-            description = row['descripcion_desaparicion'].lower()
+            row = rows.loc[record_id]
             municipio = row['municipio']
             estado = row['estado']
-            condicion_localizacion = row['condicion_localizacion']
-            doc = nlp(description)
-
-            # Extract location entity and tipo_loc
-            location_entity = next(((ent.text, ent.label_) for ent in doc.ents
-                                    if ent.label_ in ["ADDRESS", "COLONIA"]), None)
-            if location_entity:
-                loc_text, label = location_entity
-                tipo_loc = extract_tipo_loc(loc_text)
-                clean_loc_text = clean_location_text(loc_text)  # Remove 'calle' or 'colonia'
-                lat, long = get_lat_long(clean_loc_text, municipio, estado, geolocator)
-                if lat and long:
-                    lat_long = f"{lat},{long}"
-                    location_count += 1
+
+            tipo_loc = clean_loc_text = lat_long = place_id = query = None
+
+            # A gazetteer place gives a canonical name and, for localidades, offline coordinates
+            match = gazetteer.best_match(row['descripcion_desaparicion'], municipio) if gazetteer else None
+            if match:
+                place_id = match.place.place_id
+            location_entity = next((text for _, label, text, _, _ in doc_entities
+                                    if label in ("ADDRESS", "COLONIA")), None)
+            precision_geo = None
+            if match and match.place.kind in ('colonia', 'localidad'):
+                tipo_loc = match.place.kind
+                clean_loc_text = match.place.name
+                coordinates = gazetteer.coordinates(place_id)
+                if coordinates:
+                    lat_long = f"{coordinates[0]},{coordinates[1]}"
+                    precision_geo = 'localidad'
+                    offline_count += 1
+                else:
+                    query = pool.submit(full_location(clean_loc_text, match.place.municipio, estado))
+            # Otherwise fall back to the EntityRuler address patterns
+            elif location_entity:
+                tipo_loc = extract_tipo_loc(location_entity)
+                clean_loc_text = clean_location_text(location_entity)  # Remove 'calle' or 'colonia'
+                query = pool.submit(full_location(clean_loc_text, municipio, estado))
 
             # Extract date entity and clean it
-            date_entity = next((ent.text for ent in doc.ents if ent.label_ == "DATE"), None)
-            if date_entity:
-                clean_date = clean_date_text(date_entity)
+            date_entity = next((text for _, label, text, _, _ in doc_entities if label == "DATE"), None)
 
             inferences.append({
-                "id_cedula_busqueda": row['id_cedula_busqueda'],
-                "tipo_loc": tipo_loc if location_entity else None,
-                "loc": clean_loc_text if location_entity else None,
-                "lat_long": lat_long if location_entity else None,
-                "fecha": clean_date if date_entity else None
+                "id_cedula_busqueda": record_id,
+                "tipo_loc": tipo_loc,
+                "loc": clean_loc_text,
+                "lat_long": lat_long,
+                "place_id": place_id,
+                "precision_geo": precision_geo,
+                "fecha": clean_date_text(date_entity) if date_entity else None,
+                "fecha_desaparicion": row['fecha_desaparicion'],
+                "desc_hash": description_hash(row['descripcion_desaparicion']),
+                "pipeline_version": version,
+                "query": query,
+                "municipio": municipio,
+                "estado": estado,
             })
 
-            # Pause for 10 seconds after every 500 rows
-            if idx > 0 and idx % 250 == 0:
-                time.sleep(10)
-
         except Exception as e:
-            logging.error(f"Error processing text for ID {row['id_cedula_busqueda']}: {e}")
+            logging.error(f"Error processing text for ID {record_id}: {e}")
+
+    # Wait for the outstanding requests and fill in their coordinates
+    results = pool.join()
+    location_count = 0
+    centroid_count = 0
+    for inference in inferences:
+        query = inference.pop("query")
+        municipio = inference.pop("municipio")
+        estado = inference.pop("estado")
+        coordinates = results.get(query)
+        if coordinates:
+            inference["lat_long"] = f"{coordinates[0]},{coordinates[1]}"
+            # Queries naming only a localidad or municipio were answered by the centroid table
+            resolution = centroids.lookup(query) if centroids else None
+            inference["precision_geo"] = resolution.accuracy if resolution and resolution.exact else 'direccion'
+            location_count += 1
+        elif not inference["lat_long"] and centroids:
+            # Every record can at least be placed at the centroid of its municipio (or estado)
+            resolution = centroids.resolve(municipio, estado)
+            if resolution:
+                inference["lat_long"] = f"{resolution.lat},{resolution.lon}"
+                inference["precision_geo"] = resolution.accuracy
+                centroid_count += 1
 
     logging.info(f"Total locations found by geopy: {location_count}")
+    logging.info(f"Total locations resolved offline by the gazetteer: {offline_count}")
+    logging.info(f"Total records placed at a municipio or estado centroid: {centroid_count}")
 
-    df_inferences = pd.DataFrame(inferences)
+    # Typed lat/lon, geohash and dates next to the text columns
+    df_inferences = add_typed_columns(pd.DataFrame(inferences, columns=INFERENCE_COLUMNS))
     print(df_inferences.to_string())
 
-    return df_inferences
+    return df_inferences, pd.DataFrame(entity_rows, columns=ENTITY_COLUMNS)
 
 
-# Function to save DataFrame to SQL
-def save_df_to_sql(df, table_name):
+def ensure_inference_table(db_config, backfill=False):
+    """Create or migrate the inferences table (inferences.py), backfilling typed columns when needed."""
+    conn = get_connection(db_config)
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        cursor.execute(f"""
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            id_cedula_busqueda VARCHAR(255) PRIMARY KEY,
-            tipo_loc VARCHAR(255),
-            loc TEXT,
-            lat_long VARCHAR(255),
-            fecha VARCHAR(255)
-        )
-        """)
-
-        for _, row in df.iterrows():
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE id_cedula_busqueda = %s",
-                           (row['id_cedula_busqueda'],))
-            record_exists = cursor.fetchone()[0]
-
-            if record_exists:
-                print(f"Record with id_cedula_busqueda {row['id_cedula_busqueda']} already exists. Skipping...")
-                continue
-
-            cursor.execute(f"""
-            INSERT INTO {table_name} (id_cedula_busqueda, tipo_loc, loc, lat_long, fecha)
-            VALUES (%s, %s, %s, %s, %s)
-            """, (row['id_cedula_busqueda'], row['tipo_loc'], row['loc'], row['lat_long'], row['fecha']))
-
-        conn.commit()
-
+        migrate(conn, backfill=backfill)
     except mysql.connector.Error as e:
-        logging.error(f"Error saving DataFrame to SQL: {e}")
+        logging.error(f"Error preparing {INFERENCES_TABLE}: {e}")
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
-
-# Fetch data and process
-df = fetch_data_from_db(limit=9000)
-if df is not None and not df.empty:
-    logging.info(f"Fetched {len(df)} records")
+        conn.close()
 
-    # Initialize geolocator
-    geolocator = GoogleV3(api_key=GOOGLE_MAPS_API_KEY)
 
-    # Process descriptions for geocoding and entity extraction
-    processed_df = process_descriptions(df, geolocator)
-
-    # Save DataFrame to SQL
-    save_df_to_sql(processed_df, 'repd_vp_inferencias')
-
-    # Update the word frequencies and save to file
-    term_frequencies = process_word_frequencies(df)
-    save_terms_frequency(term_frequencies)
-
-    logging.info(f"Term frequencies saved to {TERMS_FILE}")
+def save_df_to_sql(df, db_config, table_name=INFERENCES_TABLE):
+    conn = get_connection(db_config)
+    try:
+        # Existing records are updated with the new inferences, one executemany per batch
+        upsert_df(conn, table_name, df, key_columns=['id_cedula_busqueda'], columns=INFERENCE_COLUMNS,
+                  batch_size=WRITE_BATCH_SIZE)
+    except mysql.connector.Error as e:
+        logging.error(f"Error saving DataFrame to SQL: {e}")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract and geocode REPD inferences.')
+    parser.add_argument('--full', action='store_true',
+                        help='Reprocess every cedula instead of only new, changed or outdated ones')
+    parser.add_argument('--backfill', action='store_true',
+                        help='Recompute lat, lon, geohash and dates of existing inferences from their text columns')
+    args = parser.parse_args()
+
+    # Database and API key configuration
+    config = load_db_config()
+    db_config = {key: config[key] for key in ('host', 'user', 'password', 'database')}
+
+    # Jalisco place catalog; None when the INEGI files have not been downloaded
+    gazetteer = load_gazetteer()
+    # Estado/municipio centroids (utils/centroids.py); None when the table has not been built
+    centroids = load_centroids()
+
+    ensure_inference_table(db_config, args.backfill)
+    version = f"v{INFERENCE_VERSION}-{pipeline_version()}"
+    # Incremental runs only read cedulas whose description or pipeline version changed since their inference
+    where, params = (None, ()) if args.full else (stale_condition(), (version,))
+    logging.info(f"Pipeline version {version}, {'full' if args.full else 'incremental'} run")
+
+    # Shared geocoder with the persistent cache, rate limited across the pool workers
+    geocoder = build_geocoder(google_api_key=config['google_api'], rate=GEOCODE_RATE)
+    imported = geocoder.cache.import_json(LEGACY_CACHE_FILE, GoogleV3Provider.name)
+    if imported:
+        logging.info(f"Imported {imported} addresses from {LEGACY_CACHE_FILE}")
+
+    # Full runs rebuild the term co-occurrence counts; incremental runs add the new descriptions
+    from spacy.lang.es.stop_words import STOP_WORDS
+
+    if args.full:
+        cooccurrence = CooccurrenceMatrix(COOCCURRENCE_WINDOW, STOP_WORDS)
+    else:
+        cooccurrence = CooccurrenceMatrix.load_or_new(COOCCURRENCE_PATH, COOCCURRENCE_WINDOW, STOP_WORDS)
+
+    # Stream the whole table chunk by chunk; spaCy runs while the pool geocodes the locations found
+    total_records = 0
+    with GeocodingPool(geocoder, workers=GEOCODE_WORKERS) as pool:
+        for df in iter_cedulas(db_config, where=where, params=params):
+            processed_df, entities = process_descriptions(df, pool, version, gazetteer, centroids)
+
+            # Keyed by id and versioned by description hash: an edited description replaces its old counts.
+            # Saved before the inferences, so a crash leaves these cedulas stale and the next run re-adds
+            # them (a no-op for texts already counted); an interrupted --full run still needs a new --full
+            hashes = [description_hash(description) or '' for description in df['descripcion_desaparicion']]
+            cooccurrence.add_texts(df['descripcion_desaparicion'].tolist(),
+                                   df['id_cedula_busqueda'].astype(str).tolist(), hashes)
+            cooccurrence.save(COOCCURRENCE_PATH)
+
+            conn = get_connection(db_config)
+            try:
+                save_entities_to_sql(entities, conn, ids=df['id_cedula_busqueda'])
+            finally:
+                conn.close()
+
+            # Save DataFrame to SQL
+            save_df_to_sql(processed_df, db_config)
+            total_records += len(df)
+            logging.info(f"Processed {total_records} records")
+
+    logging.info(f"{total_records} cedulas processed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 import json
+import os
+import sys
 import pandas as pd
 import mysql.connector
 from mysql.connector import Error
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from db import column_exists, update_from_staging
+
 def load_db_config(file_path='db_credentials.json'):
     """Load database configuration from JSON file."""
     with open(file_path, 'r') as file:
@@ -18,6 +23,9 @@ DB_CONFIG = {
     'database': config['database'],
 }
 
+# Rows per staging batch; each batch is one join-UPDATE and one transaction
+BATCH_SIZE = 1000
+
 # Load CSV file
 csv_file_path = "filtered_cases_with_violence_terms.csv"  # Update with actual path
 df = pd.read_csv(csv_file_path)
@@ -29,13 +37,7 @@ try:
         cursor = connection.cursor()
 
         # Check if `id_cedula_busqueda` column exists
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM INFORMATION_SCHEMA.COLUMNS 
-            WHERE TABLE_NAME = 'repd_vp_inferencia3' 
-            AND COLUMN_NAME = 'id_cedula_busqueda'
-        """)
-        if cursor.fetchone()[0] == 0:
+        if not column_exists(cursor, 'repd_vp_inferencia3', 'id_cedula_busqueda'):
             print("Error: Column 'id_cedula_busqueda' does not exist. Exiting.")
             exit()
 
@@ -47,36 +49,19 @@ try:
         }
 
         for column, data_type in required_columns.items():
-            cursor.execute(f"""
-                SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_NAME = 'repd_vp_inferencia3' 
-                AND COLUMN_NAME = '{column}'
-            """)
-            if cursor.fetchone()[0] == 0:
+            if not column_exists(cursor, 'repd_vp_inferencia3', column):
                 cursor.execute(f"ALTER TABLE repd_vp_inferencia3 ADD COLUMN {column} {data_type}")
                 print(f"Column '{column}' added to the database.")
 
         connection.commit()  # Save schema changes
 
-        # Iterate through CSV data and update database
-        for _, row in df.iterrows():
-            id_cedula = row["id_cedula_busqueda"]
-            sum_score = row["sum_score"]
-            violence_score = row["violence_score"]
-            violence_terms = row["violence_terms"]  # New field
-
-            # Update query
-            update_query = """
-            UPDATE repd_vp_inferencia3
-            SET sum_score = %s, violence_score = %s, violence_terms = %s
-            WHERE id_cedula_busqueda = %s
-            """
-            cursor.execute(update_query, (sum_score, violence_score, violence_terms, id_cedula))
-            print( id_cedula + " record Updated")
-
-        # Commit changes
-        connection.commit()
-        print("Database updated successfully.")
+        # Load the scores into a staging table and update the matching records in bulk
+        report = update_from_staging(connection, 'repd_vp_inferencia3', df,
+                                     key_columns=['id_cedula_busqueda'],
+                                     update_columns=['sum_score', 'violence_score', 'violence_terms'],
+                                     batch_size=BATCH_SIZE)
+        print(f"Database updated successfully: {report['rows']} CSV rows, {report['affected']} records changed "
+              f"in {report['seconds']:.1f}s.")
 
 except Error as e:
     print(f"Error: {e}")
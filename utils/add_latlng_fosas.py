@@ -1,35 +1,44 @@
 import pandas as pd
-from opencage.geocoder import OpenCageGeocode
+
+from centroids import load_centroids
+from geocoding import build_geocoder
 
 
 def get_lat_lng(geocoder, place):
-    try:
-        result = geocoder.geocode(place)
-        if result and len(result) > 0:
-            return result[0]['geometry']['lat'], result[0]['geometry']['lng']
-    except Exception as e:
-        print(f"Error geocoding {place}: {e}")
-    return None, None
+    # Errors are logged by the geocoder and not cached, so the place is retried on the next run
+    return geocoder.geocode(place) or (None, None)
 
 
 def add_lat_lng_to_csv(input_file: str, output_file: str, api_key: str):
     # Read the CSV file
     df = pd.read_csv(input_file)
 
-    # Initialize OpenCage Geocoder
-    geocoder = OpenCageGeocode(api_key)
+    # Offline centroids first, then OpenCage behind the shared persistent cache
+    centroids = load_centroids()
+    geocoder = build_geocoder(opencage_api_key=api_key, centroids=centroids)
 
     # Columns to add
     df['latitude'] = None
     df['longitude'] = None
+    df['precision'] = None
 
     # Geocode each municipality
     for i, row in df.iterrows():
+        # The INEGI codes resolve straight from the centroid table
+        resolution = None
+        if centroids and 'id_ent' in df.columns:
+            resolution = centroids.resolve_code(row['id_ent'], row.get('id_mun'))
+        if resolution and resolution.exact:
+            df.at[i, 'latitude'] = resolution.lat
+            df.at[i, 'longitude'] = resolution.lon
+            df.at[i, 'precision'] = resolution.accuracy
+            continue
         place = f"{row['nom_mun']}, {row['nom_ent']}, Mexico"
         print(f"Geocoding {place}...")
         lat, lng = get_lat_lng(geocoder, place)
         df.at[i, 'latitude'] = lat
         df.at[i, 'longitude'] = lng
+        df.at[i, 'precision'] = 'municipio' if lat is not None else None
 
     # Save the updated DataFrame to a new CSV file
     df.to_csv(output_file, index=False)
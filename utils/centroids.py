@@ -0,0 +1,273 @@
+"""
+centroids.py - Offline geocoding to estado, municipio and localidad centroids.
+
+Most records only need to be placed at the level their data supports: REPD
+rows carry municipio and estado, PFSI rows a Delegacion_IJCF, and the
+hallazgos CSVs INEGI codes (id_ent, id_mun). Those resolve from a local
+centroid table in microseconds, without a remote provider; Google and
+OpenCage are left to refine street-level addresses.
+
+The table is built once from the INEGI AGEEML catalog (all states):
+
+    level      code        point
+    estado     14          mean of its municipio centroids
+    municipio  14039       the cabecera (localidad 0001), else the mean of its localidades
+    localidad  140390001   LAT_DECIMAL / LON_DECIMAL
+
+Lookups go through dictionaries keyed by code and by normalized name;
+reverse lookups (nearest municipio to a point) use a KD-tree. Every result
+carries its accuracy level.
+
+    python centroids.py build --ageeml AGEEML.csv
+    python centroids.py lookup "Tlaquepaque, Jalisco, México"
+    python centroids.py nearest 20.6405 -103.3117
+"""
+
+import argparse
+import logging
+import math
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from text_normalization import normalize_text, preprocess_text
+
+CENTROIDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'centroids')
+CENTROIDS_PATH = os.environ.get('GEO_CENTROIDS_PATH', os.path.join(CENTROIDS_DIR, 'centroids.csv'))
+CENTROID_COLUMNS = ['code', 'level', 'name', 'cve_ent', 'cve_mun', 'lat', 'lon']
+JALISCO = '14'
+
+# From coarsest to most precise
+LEVELS = ['estado', 'municipio', 'localidad']
+
+Centroid = namedtuple('Centroid', CENTROID_COLUMNS)
+Resolution = namedtuple('Resolution', ['lat', 'lon', 'accuracy', 'code', 'exact'])
+
+COUNTRY_NAMES = frozenset(['mexico'])
+# Short names used in the registries, keyed by the normalized INEGI name
+ESTADO_ALIASES = {
+    'ciudad de mexico': ['cdmx', 'distrito federal'],
+    'mexico': ['estado de mexico', 'edomex'],
+    'coahuila de zaragoza': ['coahuila'],
+    'michoacan de ocampo': ['michoacan'],
+    'veracruz de ignacio de la llave': ['veracruz'],
+}
+MUNICIPIO_ALIASES = {
+    'san pedro tlaquepaque': ['tlaquepaque'],
+    'tlajomulco de zuniga': ['tlajomulco'],
+    'zapotlan el grande': ['ciudad guzman'],
+}
+
+
+def name_key(name):
+    """Dictionary key of a place name: ASCII lowercase words without punctuation."""
+    return preprocess_text(normalize_text(name))
+
+
+def build_centroids(ageeml_path):
+    """Centroid table of every estado, municipio and localidad in an AGEEML catalog."""
+    try:
+        df = pd.read_csv(ageeml_path, dtype=str, encoding='utf-8-sig',
+                         usecols=['CVE_ENT', 'NOM_ENT', 'CVE_MUN', 'NOM_MUN', 'CVE_LOC', 'NOM_LOC',
+                                  'LAT_DECIMAL', 'LON_DECIMAL'])
+    except UnicodeDecodeError:
+        df = pd.read_csv(ageeml_path, dtype=str, encoding='latin-1',
+                         usecols=['CVE_ENT', 'NOM_ENT', 'CVE_MUN', 'NOM_MUN', 'CVE_LOC', 'NOM_LOC',
+                                  'LAT_DECIMAL', 'LON_DECIMAL'])
+    df['cve_ent'] = df['CVE_ENT'].str.zfill(2)
+    df['cve_mun'] = df['cve_ent'] + df['CVE_MUN'].str.zfill(3)
+    df['code'] = df['cve_mun'] + df['CVE_LOC'].str.zfill(4)
+    df['lat'] = pd.to_numeric(df['LAT_DECIMAL'], errors='coerce')
+    df['lon'] = pd.to_numeric(df['LON_DECIMAL'], errors='coerce')
+    df = df.dropna(subset=['lat', 'lon'])
+
+    localidades = df.assign(level='localidad', name=df['NOM_LOC']).sort_values('code')
+
+    # The cabecera stands for the municipio; municipios without one use the mean of their localidades
+    means = df.groupby('cve_mun').agg(name=('NOM_MUN', 'first'), cve_ent=('cve_ent', 'first'),
+                                      lat=('lat', 'mean'), lon=('lon', 'mean'))
+    seats = df[df['code'].str.endswith('0001')].set_index('cve_mun')[['lat', 'lon']]
+    means.update(seats)
+    municipios = means.reset_index().assign(level='municipio', code=lambda m: m['cve_mun'])
+
+    estados = municipios.groupby('cve_ent').agg(lat=('lat', 'mean'), lon=('lon', 'mean')).reset_index()
+    estados = estados.merge(df.groupby('cve_ent')['NOM_ENT'].first().rename('name').reset_index(), on='cve_ent')
+    estados = estados.assign(level='estado', code=estados['cve_ent'], cve_mun=None)
+
+    table = pd.concat([estados[CENTROID_COLUMNS], municipios[CENTROID_COLUMNS], localidades[CENTROID_COLUMNS]],
+                      ignore_index=True)
+    logging.info(f"Built {len(estados)} estados, {len(municipios)} municipios and "
+                 f"{len(localidades)} localidades from {ageeml_path}")
+    return table
+
+
+class CentroidTable:
+    """Code and name dictionaries over the centroid table, with a KD-tree for reverse lookups."""
+
+    def __init__(self, table):
+        self.by_code = {}
+        self.estados = {}
+        self.municipios = {}
+        self.municipio_names = {}
+        self.localidades = {}
+        for row in table[CENTROID_COLUMNS].itertuples(index=False, name='Centroid'):
+            self.add(Centroid(*row))
+        self._tree = None
+
+    def add(self, centroid):
+        self.by_code[centroid.code] = centroid
+        key = name_key(centroid.name)
+        if centroid.level == 'estado':
+            for name in [key] + ESTADO_ALIASES.get(key, []):
+                self.estados[name] = centroid.code
+        elif centroid.level == 'municipio':
+            for name in [key] + MUNICIPIO_ALIASES.get(key, []):
+                self.municipios[(centroid.cve_ent, name)] = centroid.code
+                self.municipio_names.setdefault(name, set()).add(centroid.code)
+        else:
+            # Localidades are sorted by code, so the cabecera wins a repeated name
+            self.localidades.setdefault((centroid.cve_mun, key), centroid.code)
+
+    def __len__(self):
+        return len(self.by_code)
+
+    def _resolution(self, code, exact=True):
+        centroid = self.by_code[code]
+        return Resolution(centroid.lat, centroid.lon, centroid.level, code, exact)
+
+    def resolve_code(self, cve_ent, cve_mun=None, cve_loc=None):
+        """Centroid of the most precise INEGI code given, e.g. the id_ent/id_mun of the hallazgos CSVs."""
+        if cve_ent is None or pd.isna(cve_ent):
+            return None
+        code = str(int(cve_ent)).zfill(2)
+        exact = True
+        for part, width in ((cve_mun, 3), (cve_loc, 4)):
+            if part is None or pd.isna(part):
+                break
+            candidate = code + str(int(part)).zfill(width)
+            if candidate not in self.by_code:
+                exact = False
+                break
+            code = candidate
+        return self._resolution(code, exact) if code in self.by_code else None
+
+    def municipio_code(self, municipio, cve_ent=None):
+        """Municipio code of a name within an estado, or anywhere when the name is unique."""
+        key = name_key(municipio)
+        if cve_ent:
+            return self.municipios.get((cve_ent, key))
+        codes = self.municipio_names.get(key, ())
+        return next(iter(codes)) if len(codes) == 1 else None
+
+    def resolve(self, municipio=None, estado=None, localidad=None, default_estado=JALISCO):
+        """Centroid of the most precise of localidad / municipio / estado names that resolves."""
+        cve_ent = self.estados.get(name_key(estado)) if estado else default_estado
+        cve_mun = self.municipio_code(municipio, cve_ent) if municipio else None
+        if cve_mun and localidad:
+            code = self.localidades.get((cve_mun, name_key(localidad)))
+            if code:
+                return self._resolution(code)
+        if cve_mun:
+            return self._resolution(cve_mun, exact=not localidad)
+        if cve_ent in self.by_code:
+            return self._resolution(cve_ent, exact=not (municipio or localidad))
+        return None
+
+    def lookup(self, address, default_estado=JALISCO):
+        """Resolve a comma-separated address from its last parts.
+
+        exact is True when every part of the address was an administrative
+        name, i.e. a remote provider could not place it any better.
+        """
+        parts = [name_key(part) for part in str(address).split(',')]
+        parts = [part for part in parts if part]
+        if len(parts) > 1 and parts[-1] in COUNTRY_NAMES and parts[-2] in self.estados:
+            parts.pop()
+        if not parts:
+            return None
+
+        cve_ent = self.estados.get(parts[-1])
+        if cve_ent:
+            parts.pop()
+        code = cve_ent
+        if parts:
+            cve_mun = self.municipio_code(parts[-1], cve_ent or default_estado)
+            if cve_mun is None and cve_ent is None:
+                cve_mun = self.municipio_code(parts[-1])
+            if cve_mun:
+                parts.pop()
+                code = cve_mun
+                if parts and (cve_mun, parts[-1]) in self.localidades:
+                    code = self.localidades[(cve_mun, parts.pop())]
+        if code is None:
+            return None
+        return self._resolution(code, exact=not parts)
+
+    def nearest(self, lat, lon, level='municipio'):
+        """(centroid, distance in km) of the closest centroid of a level to a point."""
+        from scipy.spatial import cKDTree
+
+        if self._tree is None or self._tree[0] != level:
+            centroids = [c for c in self.by_code.values() if c.level == level]
+            self._tree = (level, cKDTree(self._project([c.lat for c in centroids], [c.lon for c in centroids])),
+                          centroids)
+        _, tree, centroids = self._tree
+        distance, index = tree.query(self._project([lat], [lon])[0])
+        return centroids[index], distance
+
+    @staticmethod
+    def _project(lats, lons):
+        # Equirectangular projection in km around the middle latitude of Mexico; good enough for nearest
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        return np.column_stack([lats * 111.32, lons * 111.32 * math.cos(math.radians(23.0))])
+
+
+@lru_cache(maxsize=None)
+def load_centroids(path=CENTROIDS_PATH):
+    """Process-wide centroid table, or None when it has not been built."""
+    if not os.path.exists(path):
+        logging.info(f"Centroid table not found at {path}; offline geocoding is disabled")
+        return None
+    table = pd.read_csv(path, dtype={'code': str, 'cve_ent': str, 'cve_mun': str})
+    return CentroidTable(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline estado/municipio/localidad centroids.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Build the centroid table from an AGEEML catalog')
+    build_parser.add_argument('--ageeml', required=True)
+    build_parser.add_argument('--output', default=CENTROIDS_PATH)
+    lookup_parser = subparsers.add_parser('lookup', help='Resolve an address')
+    lookup_parser.add_argument('address')
+    nearest_parser = subparsers.add_parser('nearest', help='Closest municipio to a point')
+    nearest_parser.add_argument('lat', type=float)
+    nearest_parser.add_argument('lon', type=float)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'build':
+        table = build_centroids(args.ageeml)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        tmp_path = args.output + '.tmp'
+        table.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, args.output)
+        print(f"{len(table)} centroids saved to {args.output}")
+        return
+
+    centroids = load_centroids()
+    if centroids is None:
+        return
+    if args.command == 'lookup':
+        print(centroids.lookup(args.address))
+    else:
+        centroid, distance = centroids.nearest(args.lat, args.lon)
+        print(f"{centroid.code}\t{centroid.name}\t{distance:.1f} km")
+
+
+if __name__ == "__main__":
+    main()
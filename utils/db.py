@@ -0,0 +1,237 @@
+"""
+db.py - Pooled connections, streaming reads and bulk writes for MySQL (or SQLite for local runs).
+
+read_chunks streams a table as DataFrame chunks by keyset pagination on an
+indexed key (WHERE key > last ORDER BY key LIMIT n) over one connection, so
+every page costs the same no matter how deep into the table it is, and
+memory stays bounded by the chunk size. get_connection hands out
+connections from a per-configuration MySQL pool.
+
+Writes go through two paths, both batched with one transaction per batch and
+a row-count report:
+
+- upsert_df: executemany of INSERT ... ON DUPLICATE KEY UPDATE (MySQL) or
+  INSERT ... ON CONFLICT DO UPDATE (SQLite). New keys are inserted, existing
+  keys updated.
+- update_from_staging: loads each batch into a temporary staging table and
+  updates the target with a single join-UPDATE. Keys missing from the target
+  are ignored, as with row-by-row UPDATE statements.
+
+Both replace the per-row SELECT + INSERT / UPDATE round trips of the REPD
+scripts. Any DB-API connection works; sqlite3 connections switch to the
+SQLite dialect, so the writers can be checked without a MySQL server.
+
+    from db import get_connection, read_chunks, upsert_df
+    conn = get_connection(DB_CONFIG)
+    for chunk in read_chunks(conn, 'repd_vp_cedulas_principal', ['id_cedula_busqueda', 'municipio'],
+                             key='id_cedula_busqueda'):
+        ...
+    upsert_df(conn, 'repd_vp_inferencias', df, key_columns=['id_cedula_busqueda'])
+"""
+
+import logging
+import sqlite3
+import time
+
+import pandas as pd
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 2000
+POOL_SIZE = 4
+
+_POOLS = {}
+
+
+def _dialect(conn):
+    return 'sqlite' if isinstance(conn, sqlite3.Connection) else 'mysql'
+
+
+def _placeholders(conn, count):
+    return ', '.join(['?' if _dialect(conn) == 'sqlite' else '%s'] * count)
+
+
+def get_connection(db_config, pool_size=POOL_SIZE):
+    """Connection from the pool of a database configuration; close() returns it to the pool."""
+    key = tuple(sorted(db_config.items()))
+    if key not in _POOLS:
+        from mysql.connector import pooling
+        _POOLS[key] = pooling.MySQLConnectionPool(pool_name=f"hopeishope_{len(_POOLS)}", pool_size=pool_size,
+                                                  **db_config)
+    return _POOLS[key].get_connection()
+
+
+def column_exists(cursor, table, column):
+    """Whether a column exists in a table of the current MySQL database (not a same-named table elsewhere)."""
+    cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s", (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def apply_dtypes(df, dtypes):
+    """Cast the columns of df named in dtypes; values that do not parse as a date or number become missing."""
+    for column, dtype in dtypes.items():
+        if column not in df.columns:
+            continue
+        kind = pd.api.types.pandas_dtype(dtype)
+        if kind.kind == 'M':
+            # Driver date objects as well as 'YYYY-MM-DD' or 'YYYY-MM-DD hh:mm' text columns
+            df[column] = pd.to_datetime(df[column], errors='coerce', format='ISO8601').astype(kind)
+        elif pd.api.types.is_numeric_dtype(kind):
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(kind)
+        else:
+            df[column] = df[column].astype(kind)
+    return df
+
+
+def read_chunks(conn, table, columns, key, chunk_size=CHUNK_SIZE, after=None, limit=None, where=None,
+                params=(), dtypes=None):
+    """Yield the rows of table as DataFrames of up to chunk_size rows, in key order.
+
+    Pages are read by keyset pagination on key, starting after the key value
+    `after`. `where` is an extra SQL condition with `params` as its values,
+    `limit` caps the total number of rows and `dtypes` maps columns to the
+    dtype they are cast to (apply_dtypes); columns not selected are skipped.
+    """
+    columns = list(columns)
+    selected = columns if key in columns else [key] + columns
+    select = ', '.join(selected)
+    placeholder = '?' if _dialect(conn) == 'sqlite' else '%s'
+    extra = f" AND ({where})" if where else ''
+    # Unbuffered: rows come off the server as they are fetched instead of being copied first
+    cursor = conn.cursor() if _dialect(conn) == 'sqlite' else conn.cursor(buffered=False)
+    read = 0
+    try:
+        while limit is None or read < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - read)
+            if after is None:
+                cursor.execute(f"SELECT {select} FROM {table} WHERE 1 = 1{extra} ORDER BY {key} LIMIT {int(size)}",
+                               tuple(params))
+            else:
+                cursor.execute(f"SELECT {select} FROM {table} WHERE {key} > {placeholder}{extra} "
+                               f"ORDER BY {key} LIMIT {int(size)}", (after,) + tuple(params))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            chunk = pd.DataFrame.from_records(rows, columns=selected)
+            after = chunk[key].iloc[-1]
+            read += len(chunk)
+            if key not in columns:
+                chunk = chunk.drop(columns=[key])
+            yield apply_dtypes(chunk, dtypes) if dtypes else chunk
+            if len(rows) < size:
+                break
+    finally:
+        cursor.close()
+
+
+def _drop_stage(conn, stage):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP {'' if _dialect(conn) == 'sqlite' else 'TEMPORARY '}TABLE IF EXISTS {stage}")
+    finally:
+        cursor.close()
+
+
+def _rows(df, columns):
+    """Rows as tuples of plain Python values, with NaN as NULL."""
+    values = df[columns].astype(object).where(df[columns].notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+def _write_batches(conn, rows, batch_size, write):
+    """Run write(cursor, batch) per batch, committing each; returns the report."""
+    report = {'rows': 0, 'batches': 0, 'affected': 0, 'seconds': 0.0}
+    start = time.time()
+    cursor = conn.cursor()
+    try:
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            try:
+                affected = write(cursor, batch)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            report['rows'] += len(batch)
+            report['batches'] += 1
+            report['affected'] += max(affected, 0)
+    finally:
+        cursor.close()
+    report['seconds'] = time.time() - start
+    return report
+
+
+def log_report(table, report):
+    rate = report['rows'] / report['seconds'] if report['seconds'] else float('inf')
+    logging.info(f"{table}: {report['rows']} rows in {report['batches']} batches, "
+                 f"{report['affected']} affected, {rate:.0f} rows/s")
+
+
+def upsert_query(conn, table, columns, key_columns):
+    """INSERT statement for executemany that updates the non-key columns of existing keys."""
+    update_columns = [column for column in columns if column not in key_columns]
+    column_list = ', '.join(columns)
+    if _dialect(conn) == 'sqlite':
+        assignments = ', '.join(f"{column} = excluded.{column}" for column in update_columns)
+        conflict = (f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {assignments}"
+                    if update_columns else f"ON CONFLICT ({', '.join(key_columns)}) DO NOTHING")
+    else:
+        # VALUES() instead of row aliases keeps MySQL 5.7 and MariaDB working
+        assignments = ', '.join(f"{column} = VALUES({column})" for column in (update_columns or key_columns[:1]))
+        conflict = f"ON DUPLICATE KEY UPDATE {assignments}"
+    return f"INSERT INTO {table} ({column_list}) VALUES ({_placeholders(conn, len(columns))}) {conflict}"
+
+
+def upsert_df(conn, table, df, key_columns, columns=None, batch_size=BATCH_SIZE):
+    """Insert the rows of df into table, updating the non-key columns of existing keys.
+
+    The table needs a PRIMARY KEY or UNIQUE index on key_columns. The
+    'affected' count is the driver's rowcount, where MySQL counts an updated
+    row twice.
+    """
+    columns = list(columns or df.columns)
+    query = upsert_query(conn, table, columns, key_columns)
+
+    def write(cursor, batch):
+        cursor.executemany(query, batch)
+        return cursor.rowcount
+
+    report = _write_batches(conn, _rows(df, columns), batch_size, write)
+    log_report(table, report)
+    return report
+
+
+def update_from_staging(conn, table, df, key_columns, update_columns, batch_size=BATCH_SIZE):
+    """Update existing rows of table from df through a temporary staging table and one join-UPDATE per batch."""
+    columns = list(key_columns) + [column for column in update_columns if column not in key_columns]
+    stage = f"{table}_stage"
+    column_list = ', '.join(columns)
+    _drop_stage(conn, stage)
+    cursor = conn.cursor()
+    try:
+        # Same column types as the target, no rows
+        cursor.execute(f"CREATE TEMPORARY TABLE {stage} AS SELECT {column_list} FROM {table} WHERE 1 = 0")
+    finally:
+        cursor.close()
+
+    join = ' AND '.join(f"{table}.{key} = {stage}.{key}" for key in key_columns)
+    if _dialect(conn) == 'sqlite':
+        assignments = ', '.join(f"{column} = {stage}.{column}" for column in update_columns)
+        update = f"UPDATE {table} SET {assignments} FROM {stage} WHERE {join}"
+    else:
+        assignments = ', '.join(f"{table}.{column} = {stage}.{column}" for column in update_columns)
+        update = f"UPDATE {table} JOIN {stage} ON {join} SET {assignments}"
+    insert = f"INSERT INTO {stage} ({column_list}) VALUES ({_placeholders(conn, len(columns))})"
+
+    def write(cursor, batch):
+        cursor.execute(f"DELETE FROM {stage}")
+        cursor.executemany(insert, batch)
+        cursor.execute(update)
+        return cursor.rowcount
+
+    try:
+        report = _write_batches(conn, _rows(df, columns), batch_size, write)
+    finally:
+        _drop_stage(conn, stage)
+    log_report(table, report)
+    return report
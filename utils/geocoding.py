@@ -0,0 +1,461 @@
+"""
+geocoding.py - Shared geocoding with a persistent cache for every geocoding script.
+
+Addresses are normalized into cache keys (lowercase, ASCII, single spaces,
+comma-separated parts) and looked up in a SQLite cache before any provider
+is called. Misses are cached too, so an address that a provider could not
+find is not requested again until NEGATIVE_TTL_DAYS have passed. Writes are
+buffered and flushed in batches, and once more at exit.
+
+Providers are tried in order and plug in behind the same interface:
+
+- GoogleV3Provider (geopy)
+- OpenCageProvider (opencage)
+- CentroidProvider (offline, centroids.py): answers addresses made only of
+  localidad / municipio / estado names, so remote providers are only asked
+  for street-level addresses
+- GazetteerProvider (offline, any object with best_match/coordinates such as
+  repd_processing/gazetteer.py)
+- MockProvider (no network, for local testing)
+
+GeocodingPool runs the network requests in a bounded thread pool under a
+token-bucket rate limit, retrying timeouts with exponential backoff, while
+the caller keeps producing addresses. Addresses are deduplicated by cache
+key before any request goes out.
+
+    from geocoding import build_geocoder
+    geocoder = build_geocoder(google_api_key=API_KEY)
+    geocoder.geocode("Colonia Miravalle, Tlaquepaque, Jalisco, México")
+
+    python geocoding.py --addresses 500 --unique 200   # pool against the mock provider
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from centroids import load_centroids
+from text_normalization import normalize_text, preprocess_text
+
+CACHE_PATH = os.environ.get(
+    'GEOCODE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geocode_cache.sqlite'))
+FLUSH_EVERY = 100
+NEGATIVE_TTL_DAYS = 30
+
+# geopy exceptions worth retrying, matched by name so geopy stays optional
+RETRYABLE_ERRORS = frozenset(['GeocoderTimedOut', 'GeocoderUnavailable', 'GeocoderRateLimited'])
+
+
+def normalize_address(address):
+    """Cache key of an address: ASCII lowercase words, parts separated by ', '."""
+    parts = (preprocess_text(normalize_text(part)) for part in str(address).split(','))
+    return ', '.join(part for part in parts if part)
+
+
+class GeocodeCache:
+    """SQLite cache of (provider, address key) -> coordinates, including misses."""
+
+    def __init__(self, path=CACHE_PATH, flush_every=FLUSH_EVERY, negative_ttl_days=NEGATIVE_TTL_DAYS):
+        self.path = path
+        self.flush_every = flush_every
+        self.negative_ttl = negative_ttl_days * 86400
+        self.pending = {}
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode (
+                provider TEXT NOT NULL,
+                address_key TEXT NOT NULL,
+                lat REAL,
+                lon REAL,
+                found INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (provider, address_key)
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, provider, key):
+        """(True, coordinates or None) on a hit, (False, None) when the address must be requested."""
+        row = self.pending.get((provider, key))
+        if row is None:
+            row = self.conn.execute(
+                "SELECT lat, lon, found, updated_at FROM geocode WHERE provider = ? AND address_key = ?",
+                (provider, key)).fetchone()
+        if row is None:
+            return False, None
+        lat, lon, found, updated_at = row
+        if found:
+            return True, (lat, lon)
+        if time.time() - updated_at > self.negative_ttl:
+            return False, None
+        return True, None
+
+    def put(self, provider, key, coordinates):
+        lat, lon = coordinates if coordinates else (None, None)
+        self.pending[(provider, key)] = (lat, lon, int(coordinates is not None), time.time())
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO geocode (provider, address_key, lat, lon, found, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(provider, key, *row) for (provider, key), row in self.pending.items()])
+        self.conn.commit()
+        self.pending.clear()
+
+    def import_json(self, path, provider):
+        """Load a legacy {address: [lat, lon]} JSON cache; existing keys are kept."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'r') as file:
+            legacy = json.load(file)
+        now = time.time()
+        rows = [(provider, normalize_address(address), value[0], value[1], 1, now)
+                for address, value in legacy.items() if value]
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO geocode (provider, address_key, lat, lon, found, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+        return len(rows)
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+class GoogleV3Provider:
+    name = 'google'
+    cached = True
+
+    def __init__(self, api_key, timeout=10):
+        from geopy.geocoders import GoogleV3
+        self.geolocator = GoogleV3(api_key=api_key, timeout=timeout)
+
+    def geocode(self, address):
+        location = self.geolocator.geocode(address)
+        return (location.latitude, location.longitude) if location else None
+
+
+class OpenCageProvider:
+    name = 'opencage'
+    cached = True
+
+    def __init__(self, api_key):
+        from opencage.geocoder import OpenCageGeocode
+        self.geocoder = OpenCageGeocode(api_key)
+
+    def geocode(self, address):
+        result = self.geocoder.geocode(address)
+        if result:
+            return result[0]['geometry']['lat'], result[0]['geometry']['lng']
+        return None
+
+
+class CentroidProvider:
+    """Offline centroid of an address that names nothing finer than a localidad."""
+    name = 'centroid'
+    cached = False
+
+    def __init__(self, centroids):
+        self.centroids = centroids
+
+    def geocode(self, address):
+        resolution = self.centroids.lookup(address)
+        # Addresses with a street or colonia part are left to the next providers
+        if resolution is None or not resolution.exact:
+            return None
+        return resolution.lat, resolution.lon
+
+
+class GazetteerProvider:
+    """Offline lookup of the most specific place named in the address."""
+    name = 'gazetteer'
+    cached = False
+
+    def __init__(self, gazetteer):
+        self.gazetteer = gazetteer
+
+    def geocode(self, address):
+        match = self.gazetteer.best_match(address)
+        return self.gazetteer.coordinates(match.place.place_id) if match else None
+
+
+class MockProvider:
+    """Network-free provider for local runs: fixed latency, deterministic points, injected failures."""
+    name = 'mock'
+    cached = True
+
+    def __init__(self, latency=0.05, miss_rate=0.1, timeout_rate=0.05, seed=0):
+        self.latency = latency
+        self.miss_rate = miss_rate
+        self.timeout_rate = timeout_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def geocode(self, address):
+        with self.lock:
+            self.calls += 1
+            draw = self.random.random()
+        time.sleep(self.latency)
+        if draw < self.timeout_rate:
+            raise TimeoutError(f"mock timeout for {address}")
+        digest = hashlib.sha256(normalize_address(address).encode('utf-8')).digest()
+        if digest[0] / 255 < self.miss_rate:
+            return None
+        # Points inside the Guadalajara metropolitan area
+        return (20.55 + digest[1] / 255 * 0.25, -103.50 + digest[2] / 255 * 0.30)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: at most `rate` requests per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_retryable(error):
+    """Timeouts and temporary unavailability are retried; other errors are not."""
+    return isinstance(error, TimeoutError) or type(error).__name__ in RETRYABLE_ERRORS
+
+
+class Geocoder:
+    """Provider chain behind the persistent cache; the first provider with a result wins.
+
+    The cache is only touched from the calling thread; GeocodingPool workers
+    make the provider requests.
+    """
+
+    def __init__(self, providers, cache=None, rate=None, retries=3, backoff=1.0):
+        self.providers = list(providers)
+        self.cache = cache if cache is not None else GeocodeCache()
+        self.bucket = TokenBucket(rate) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = {'cache_hits': 0, 'requests': 0, 'found': 0, 'errors': 0, 'retries': 0}
+        atexit.register(self.close)
+
+    def resolve(self, key, address, start=0):
+        """Walk the chain from `start` using the cache and offline providers only.
+
+        Returns (coordinates, None) when settled, or (None, index) when the
+        provider at `index` has to be requested over the network.
+        """
+        for index in range(start, len(self.providers)):
+            provider = self.providers[index]
+            if not provider.cached:
+                coordinates = provider.geocode(address)
+                if coordinates:
+                    return coordinates, None
+                continue
+            hit, coordinates = self.cache.get(provider.name, key)
+            if not hit:
+                return None, index
+            self.stats['cache_hits'] += 1
+            if coordinates:
+                return coordinates, None
+        return None, None
+
+    def request(self, index, address):
+        """Call one provider under the rate limit, retrying timeouts with exponential backoff."""
+        provider = self.providers[index]
+        for attempt in range(self.retries + 1):
+            if self.bucket:
+                self.bucket.acquire()
+            try:
+                return provider.geocode(address), attempt
+            except Exception as e:
+                if attempt == self.retries or not is_retryable(e):
+                    raise
+                time.sleep(self.backoff * 2 ** attempt * (1 + random.random() / 2))
+
+    def record(self, index, key, address, outcome):
+        """Store a request outcome in the cache; errors are logged and not cached."""
+        provider = self.providers[index]
+        self.stats['requests'] += 1
+        if isinstance(outcome, Exception):
+            # Timeouts and quota errors are not cached, so the address is retried next run
+            self.stats['errors'] += 1
+            logging.error(f"Geocoding with {provider.name} failed for {address}: {outcome}")
+            return None
+        coordinates, attempts = outcome
+        self.stats['retries'] += attempts
+        self.cache.put(provider.name, key, coordinates)
+        if coordinates:
+            self.stats['found'] += 1
+        return coordinates
+
+    def geocode(self, address):
+        """(lat, lon) of an address, or None when no provider finds it."""
+        key = normalize_address(address)
+        if not key:
+            return None
+        coordinates, index = self.resolve(key, address)
+        while index is not None:
+            try:
+                outcome = self.request(index, address)
+            except Exception as e:
+                outcome = e
+            coordinates = self.record(index, key, address, outcome)
+            if coordinates:
+                return coordinates
+            coordinates, index = self.resolve(key, address, index + 1)
+        return coordinates
+
+    def close(self):
+        if self.cache.conn is not None:
+            self.cache.close()
+            self.cache.conn = None
+            logging.info(f"Geocoding stats: {self.stats}")
+
+
+class GeocodingPool:
+    """Deduplicating worker pool in front of a Geocoder.
+
+    submit() returns immediately, so the producer (e.g. the NER loop) keeps
+    working while up to `workers` requests run under the geocoder's rate
+    limit. Each normalized address is requested at most once.
+    """
+
+    def __init__(self, geocoder, workers=4, max_pending=None):
+        self.geocoder = geocoder
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = max_pending or workers * 4
+        self.results = {}
+        self.futures = {}
+        self.pending = set()
+
+    def submit(self, address):
+        """Queue an address and return its cache key; duplicates are not queued again."""
+        key = normalize_address(address)
+        if not key or key in self.results or key in self.pending:
+            return key
+        self._advance(key, address, 0)
+        self._drain(block=len(self.futures) >= self.max_pending)
+        return key
+
+    def _advance(self, key, address, start):
+        coordinates, index = self.geocoder.resolve(key, address, start)
+        if index is None:
+            self.pending.discard(key)
+            self.results[key] = coordinates
+        else:
+            self.pending.add(key)
+            future = self.executor.submit(self.geocoder.request, index, address)
+            self.futures[future] = (key, address, index)
+
+    def _drain(self, block=False):
+        if not self.futures:
+            return
+        done, _ = wait(list(self.futures), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            key, address, index = self.futures.pop(future)
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = e
+            coordinates = self.geocoder.record(index, key, address, outcome)
+            if coordinates:
+                self.pending.discard(key)
+                self.results[key] = coordinates
+            else:
+                self._advance(key, address, index + 1)
+
+    def join(self):
+        """Wait for every queued address; returns {key: coordinates or None}."""
+        while self.futures:
+            self._drain(block=True)
+        self.geocoder.cache.flush()
+        return self.results
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build_geocoder(google_api_key=None, opencage_api_key=None, gazetteer=None, cache_path=CACHE_PATH,
+                   mock=False, rate=None, centroids=None):
+    """Geocoder with the offline centroids and gazetteer first, then the configured online providers.
+
+    centroids defaults to the table of load_centroids() when it has been built;
+    pass False to skip it. mock=True replaces the online providers with
+    MockProvider, for runs without API keys.
+    """
+    providers = []
+    if centroids is None:
+        centroids = load_centroids()
+    if centroids:
+        providers.append(CentroidProvider(centroids))
+    if gazetteer is not None:
+        providers.append(GazetteerProvider(gazetteer))
+    if mock:
+        providers.append(MockProvider())
+    else:
+        if google_api_key:
+            providers.append(GoogleV3Provider(google_api_key))
+        if opencage_api_key:
+            providers.append(OpenCageProvider(opencage_api_key))
+    return Geocoder(providers, GeocodeCache(cache_path), rate=rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exercise the geocoding pool against the mock provider.')
+    parser.add_argument('--addresses', type=int, default=500, help='Addresses to submit, with repeats')
+    parser.add_argument('--unique', type=int, default=200, help='Distinct addresses among them')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=50, help='Requests per second')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    cache_path = os.path.join(tempfile.mkdtemp(), 'mock_cache.sqlite')
+    addresses = [f"colonia prueba {i % args.unique}, Guadalajara, Jalisco, México" for i in range(args.addresses)]
+    for run in ('cold', 'warm'):
+        geocoder = build_geocoder(cache_path=cache_path, mock=True, rate=args.rate, centroids=False)
+        start = time.time()
+        with GeocodingPool(geocoder, workers=args.workers) as pool:
+            for address in addresses:
+                pool.submit(address)
+            results = pool.join()
+        elapsed = time.time() - start
+        found = sum(1 for value in results.values() if value)
+        print(f"{run}: {len(addresses)} addresses, {len(results)} unique, {found} found, "
+              f"{geocoder.providers[0].calls} provider calls in {elapsed:.2f}s, stats {geocoder.stats}")
+        geocoder.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+geohash.py - Geohash encoding of coordinates for indexed spatial lookups.
+
+A geohash interleaves the bits of longitude and latitude into a base-32
+string, so nearby points share a prefix and a spatial window becomes a
+prefix range on an ordinary B-tree index:
+
+    precision  cell size (approx.)
+    5          4.9 km x 4.9 km
+    6          1.2 km x 0.6 km
+    7          153 m x 153 m
+    9          4.8 m x 4.8 m
+
+    python geohash.py encode 20.6597 -103.3496
+    python geohash.py cover 20.60 -103.40 20.70 -103.30 --precision 5
+"""
+
+import argparse
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+DECODE = {char: i for i, char in enumerate(BASE32)}
+PRECISION = 9
+
+
+def encode(lat, lon, precision=PRECISION):
+    """Geohash of a point, or None when a coordinate is missing."""
+    if lat is None or lon is None or lat != lat or lon != lon:
+        return None
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # Even bits are longitude
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def bounds(geohash):
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = DECODE[char]
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def cover(min_lat, min_lon, max_lat, max_lon, precision=5):
+    """Sorted geohash cells of a precision that together cover a bounding box."""
+    south, west, north, east = bounds(encode(min_lat, min_lon, precision))
+    lat_step = north - south
+    lon_step = east - west
+    cells = set()
+    lat = min_lat
+    while lat <= max_lat + lat_step:
+        lon = min_lon
+        while lon <= max_lon + lon_step:
+            cells.add(encode(min(lat, max_lat), min(lon, max_lon), precision))
+            lon += lon_step
+        lat += lat_step
+    return sorted(cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Geohash encoding.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    encode_parser = subparsers.add_parser('encode', help='Geohash of a point')
+    encode_parser.add_argument('lat', type=float)
+    encode_parser.add_argument('lon', type=float)
+    encode_parser.add_argument('--precision', type=int, default=PRECISION)
+    cover_parser = subparsers.add_parser('cover', help='Cells covering a bounding box')
+    for name in ('min_lat', 'min_lon', 'max_lat', 'max_lon'):
+        cover_parser.add_argument(name, type=float)
+    cover_parser.add_argument('--precision', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'encode':
+        geohash = encode(args.lat, args.lon, args.precision)
+        print(f"{geohash}\t{bounds(geohash)}")
+    else:
+        print(' '.join(cover(args.min_lat, args.min_lon, args.max_lat, args.max_lon, args.precision)))
+
+
+if __name__ == "__main__":
+    main()
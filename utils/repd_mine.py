@@ -3,6 +3,8 @@ import mysql.connector
 import time
 import json
 
+from db import get_connection, upsert_query
+
 
 # Load configuration from config.json
 def load_config():
@@ -17,12 +19,26 @@ DB_CONFIG = {key: CONFIG[key] for key in CONFIG if key != 'google_api'}
 # Base URL of the API
 BASE_URL = "https://repd.jalisco.gob.mx/api/v1/version_publica/repd-version-publica-cedulas-busqueda/"
 
+# Columns of each table, in the order of the API fields
+PRINCIPAL_COLUMNS = [
+    'id_cedula_busqueda', 'autorizacion_informacion_publica', 'condicion_localizacion', 'nombre_completo',
+    'edad_momento_desaparicion', 'sexo', 'genero', 'complexion', 'estatura', 'tez', 'cabello', 'ojos_color',
+    'municipio', 'estado', 'fecha_desaparicion', 'estatus_persona_desaparecida', 'descripcion_desaparicion',
+    'ruta_foto',
+]
+SENA_COLUMNS = ['id', 'id_cedula_busqueda', 'especificacion_general', 'parte_cuerpo', 'tipo_sena', 'descripcion']
+VESTIMENTA_COLUMNS = ['id', 'id_cedula_busqueda', 'clase_prenda', 'grupo_prenda', 'prenda', 'marca', 'color',
+                      'material', 'talla', 'tipo', 'descripcion']
+
 
 def fetch_data(limit=3, pause_time=1):
     """Fetch all data by checking count, total pages, and iterating through all pages."""
     try:
+        # One HTTP session keeps the connection to the API open between pages
+        session = requests.Session()
+
         # First, get the total count and total pages from the API
-        initial_response = requests.get(f"{BASE_URL}?limit={limit}&page=1")
+        initial_response = session.get(f"{BASE_URL}?limit={limit}&page=1")
         initial_response.raise_for_status()
         initial_data = initial_response.json()
 
@@ -39,23 +55,34 @@ def fetch_data(limit=3, pause_time=1):
             print(
                 f"Warning: Probable total pages ({probable_total_pages}) does not match the API's total pages ({total_pages}). Proceeding cautiously.")
 
-        all_results = []
+        total_rows = 0
+        total_seconds = 0.0
 
         # Iterate through all pages based on total pages
         for page in range(1, total_pages + 1):
             print(f"Fetching page {page}/{total_pages}...")
-            response = requests.get(f"{BASE_URL}?limit={limit}&page={page}")
-            response.raise_for_status()
-            page_data = response.json()
-
-            # Iterate through the results and print the id_cedula_busqueda
-            for result in page_data.get("results", []):
-                print(f"Fetched ID: {result.get('id_cedula_busqueda')}")
-                insert_data_to_db([result])
+            if page == 1:
+                # Same request as the count above
+                page_data = initial_data
+            else:
+                response = session.get(f"{BASE_URL}?limit={limit}&page={page}")
+                response.raise_for_status()
+                page_data = response.json()
+
+            # The whole page goes to the database in one transaction
+            report = insert_data_to_db(page_data.get("results", []))
+            if report:
+                total_rows += report['rows']
+                total_seconds += report['seconds']
+                print(f"Page {page}: {report['cedulas']} cedulas, {report['senas']} señas, "
+                      f"{report['vestimenta']} prendas in {report['seconds']:.2f}s "
+                      f"({report['rows'] / max(report['seconds'], 1e-9):.0f} rows/s)")
 
             # Adding a pause between requests
             time.sleep(pause_time)
 
+        print(f"Inserted {total_rows} rows in {total_seconds:.1f}s of database time "
+              f"({total_rows / max(total_seconds, 1e-9):.0f} rows/s)")
 
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data: {e}")
@@ -64,125 +91,51 @@ def fetch_data(limit=3, pause_time=1):
 
 
 def insert_data_to_db(data):
-    """Insert the API data into the database."""
+    """Upsert a page of API records, with their señas and vestimenta, in one transaction.
+
+    Each table gets one executemany over all the rows of the page. Returns
+    the row counts and the elapsed time, or None when the page was rolled back.
+    """
+    principal_rows = [tuple(record.get(column) for column in PRINCIPAL_COLUMNS) for record in data]
+    sena_rows = [tuple(sena.get(column) for column in SENA_COLUMNS)
+                 for record in data for sena in record.get("descripcion_sena_particular") or []]
+    vestimenta_rows = [tuple(vestimenta.get(column) for column in VESTIMENTA_COLUMNS)
+                       for record in data for vestimenta in record.get("descripcion_vestimenta") or []]
+    if not principal_rows:
+        return None
+
+    start = time.time()
     conn = None
     cursor = None
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        # Connections come from the pool of db.py; close() hands them back
+        conn = get_connection(DB_CONFIG)
         cursor = conn.cursor()
-
-        for record in data:
-            # Insert into `repd_vp_cedulas_principal`
-            principal_query = """
-                INSERT INTO repd_vp_cedulas_principal (
-                    id_cedula_busqueda, autorizacion_informacion_publica, condicion_localizacion,
-                    nombre_completo, edad_momento_desaparicion, sexo, genero, complexion, estatura,
-                    tez, cabello, ojos_color, municipio, estado, fecha_desaparicion,
-                    estatus_persona_desaparecida, descripcion_desaparicion, ruta_foto
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    autorizacion_informacion_publica=VALUES(autorizacion_informacion_publica),
-                    condicion_localizacion=VALUES(condicion_localizacion),
-                    nombre_completo=VALUES(nombre_completo),
-                    edad_momento_desaparicion=VALUES(edad_momento_desaparicion),
-                    sexo=VALUES(sexo), genero=VALUES(genero),
-                    complexion=VALUES(complexion), estatura=VALUES(estatura),
-                    tez=VALUES(tez), cabello=VALUES(cabello),
-                    ojos_color=VALUES(ojos_color), municipio=VALUES(municipio),
-                    estado=VALUES(estado), fecha_desaparicion=VALUES(fecha_desaparicion),
-                    estatus_persona_desaparecida=VALUES(estatus_persona_desaparecida),
-                    descripcion_desaparicion=VALUES(descripcion_desaparicion),
-                    ruta_foto=VALUES(ruta_foto)
-            """
-            principal_values = (
-                record["id_cedula_busqueda"],
-                record["autorizacion_informacion_publica"],
-                record["condicion_localizacion"],
-                record["nombre_completo"],
-                record["edad_momento_desaparicion"],
-                record["sexo"],
-                record["genero"],
-                record["complexion"],
-                record["estatura"],
-                record["tez"],
-                record["cabello"],
-                record["ojos_color"],
-                record["municipio"],
-                record["estado"],
-                record["fecha_desaparicion"],
-                record["estatus_persona_desaparecida"],
-                record["descripcion_desaparicion"],
-                record["ruta_foto"]
-            )
-            cursor.execute(principal_query, principal_values)
-
-            # Insert into `repd_vp_cedulas_senas`
-            for sena in record.get("descripcion_sena_particular", []):
-                sena_query = """
-                    INSERT INTO repd_vp_cedulas_senas (
-                        id, id_cedula_busqueda, especificacion_general, parte_cuerpo, tipo_sena, descripcion
-                    ) VALUES (%s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        especificacion_general=VALUES(especificacion_general),
-                        parte_cuerpo=VALUES(parte_cuerpo),
-                        tipo_sena=VALUES(tipo_sena),
-                        descripcion=VALUES(descripcion)
-                """
-                sena_values = (
-                    sena["id"],
-                    sena["id_cedula_busqueda"],
-                    sena["especificacion_general"],
-                    sena["parte_cuerpo"],
-                    sena["tipo_sena"],
-                    sena["descripcion"]
-                )
-                cursor.execute(sena_query, sena_values)
-
-            # Insert into `repd_vp_cedulas_vestimenta`
-            for vestimenta in record.get("descripcion_vestimenta", []):
-                vestimenta_query = """
-                    INSERT INTO repd_vp_cedulas_vestimenta (
-                        id, id_cedula_busqueda, clase_prenda, grupo_prenda, prenda, marca, color,
-                        material, talla, tipo, descripcion
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        clase_prenda=VALUES(clase_prenda),
-                        grupo_prenda=VALUES(grupo_prenda),
-                        prenda=VALUES(prenda),
-                        marca=VALUES(marca),
-                        color=VALUES(color),
-                        material=VALUES(material),
-                        talla=VALUES(talla),
-                        tipo=VALUES(tipo),
-                        descripcion=VALUES(descripcion)
-                """
-                vestimenta_values = (
-                    vestimenta["id"],
-                    vestimenta["id_cedula_busqueda"],
-                    vestimenta["clase_prenda"],
-                    vestimenta["grupo_prenda"],
-                    vestimenta["prenda"],
-                    vestimenta["marca"],
-                    vestimenta["color"],
-                    vestimenta["material"],
-                    vestimenta["talla"],
-                    vestimenta["tipo"],
-                    vestimenta["descripcion"]
-                )
-                cursor.execute(vestimenta_query, vestimenta_values)
-
-        # Commit changes
+        for table, columns, rows in (('repd_vp_cedulas_principal', PRINCIPAL_COLUMNS, principal_rows),
+                                     ('repd_vp_cedulas_senas', SENA_COLUMNS, sena_rows),
+                                     ('repd_vp_cedulas_vestimenta', VESTIMENTA_COLUMNS, vestimenta_rows)):
+            if rows:
+                cursor.executemany(upsert_query(conn, table, columns, key_columns=columns[:1]), rows)
         conn.commit()
-        print("Data successfully inserted into the database!")
-
     except mysql.connector.Error as e:
         print(f"Error inserting data into database: {e}")
+        if conn:
+            conn.rollback()
+        return None
     finally:
         if cursor:
             cursor.close()
-        if conn and conn.is_connected():
+        if conn:
             conn.close()
 
+    return {
+        'cedulas': len(principal_rows),
+        'senas': len(sena_rows),
+        'vestimenta': len(vestimenta_rows),
+        'rows': len(principal_rows) + len(sena_rows) + len(vestimenta_rows),
+        'seconds': time.time() - start,
+    }
+
 
 if __name__ == "__main__":
     # You can now pass limit and pause_time as arguments
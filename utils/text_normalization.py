@@ -0,0 +1,183 @@
+"""
+text_normalization.py - Shared text normalization for the tattoo matchers and REPD scripts.
+
+One implementation of each normalization used across the repository:
+
+- preprocess_text: lowercase, punctuation to spaces, collapsed whitespace
+  (the former preprocess_text / clean_text of the cross_tattoos matchers).
+- normalize_text: trimmed, lowercased and transliterated to ASCII (the former
+  unidecode-based normalize_text of crossTattooDS.py).
+- clean_location_text: drops the words 'calle' and 'colonia' (repd_processing).
+
+Scalar functions are memoized, and the *_series variants normalize each
+distinct value of a column once. Punctuation and accents are handled with
+str.translate tables instead of regular expressions.
+
+    python text_normalization.py --benchmark
+"""
+
+import argparse
+import re
+import time
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+CACHE_SIZE = 262144
+
+LOCATION_STOPWORDS = frozenset(['calle', 'colonia'])
+
+
+class _PunctuationTable(dict):
+    """str.translate table mapping every character outside [\\w\\s] to a space.
+
+    Entries are filled on first use, so the table only holds characters
+    that actually occur in the data.
+    """
+
+    def __missing__(self, code):
+        char = chr(code)
+        # Same classes as re's \w and \s for str patterns
+        value = code if (char.isalnum() or char == '_' or char.isspace()) else ' '
+        self[code] = value
+        return value
+
+
+PUNCTUATION_TABLE = _PunctuationTable()
+
+# Accented Latin letters common in the registries, folded the way unidecode does
+ACCENT_TABLE = str.maketrans(
+    'áéíóúàèìòùâêîôûäëïöüãõñçÁÉÍÓÚÀÈÌÒÙÂÊÎÔÛÄËÏÖÜÃÕÑÇ',
+    'aeiouaeiouaeiouaeiouaoncAEIOUAEIOUAEIOUAEIOUAONC',
+)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _preprocess(text):
+    return ' '.join(text.lower().translate(PUNCTUATION_TABLE).split())
+
+
+def preprocess_text(text):
+    """Lowercase, replace punctuation with spaces and collapse whitespace."""
+    if not isinstance(text, str):
+        return ""
+    return _preprocess(text)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalize(text):
+    text = text.strip().lower().translate(ACCENT_TABLE)
+    if text.isascii():
+        return text
+    # Anything the table does not cover goes through unidecode
+    import unidecode
+    return unidecode.unidecode(text)
+
+
+def normalize_text(text):
+    """Trim, lowercase and transliterate to ASCII; missing values become ''."""
+    if not isinstance(text, str):
+        return ''
+    return _normalize(text)
+
+
+def strip_accents(text):
+    """Remove combining diacritics, keeping everything else unchanged."""
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_location_text(location):
+    """Remove 'calle' and 'colonia' from the location text."""
+    return ' '.join(word for word in location.lower().split() if word not in LOCATION_STOPWORDS)
+
+
+def _map_series(series, func):
+    """Apply a scalar normalizer once per distinct value and broadcast the result."""
+    codes, uniques = pd.factorize(series)
+    # Missing values (code -1) pick the trailing empty string
+    values = np.array([func(value) for value in uniques] + [''], dtype=object)
+    return pd.Series(values[codes], index=series.index, dtype=object)
+
+
+def preprocess_series(series):
+    """Vectorized preprocess_text."""
+    return _map_series(series, preprocess_text)
+
+
+def normalize_series(series):
+    """Vectorized normalize_text."""
+    return _map_series(series, normalize_text)
+
+
+def clean_location_series(series):
+    """Vectorized clean_location_text."""
+    return _map_series(series, lambda value: clean_location_text(value) if isinstance(value, str) else '')
+
+
+def _legacy_preprocess(text):
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _legacy_normalize(text):
+    import unidecode
+    if pd.isna(text):
+        return ''
+    return unidecode.unidecode(text.strip().lower())
+
+
+def benchmark(series):
+    """Time the legacy row-by-row regex versions against this module and check equality."""
+    for name, legacy, vectorized in [
+        ('preprocess_text', _legacy_preprocess, preprocess_series),
+        ('normalize_text', _legacy_normalize, normalize_series),
+    ]:
+        _preprocess.cache_clear()
+        _normalize.cache_clear()
+        start = time.perf_counter()
+        expected = series.apply(legacy)
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = vectorized(series)
+        seconds = time.perf_counter() - start
+
+        mismatches = int((expected.fillna('') != result).sum())
+        print(f"{name}: legacy {legacy_seconds:.3f}s, shared {seconds:.3f}s, "
+              f"speedup {legacy_seconds / seconds:.1f}x, mismatches {mismatches}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the shared text normalization.')
+    parser.add_argument('--benchmark', action='store_true')
+    parser.add_argument('--input', default=None, help='CSV to benchmark on (default: synthetic rows)')
+    parser.add_argument('--column', default='descripcion_tattoo')
+    parser.add_argument('--rows', type=int, default=200000, help='Synthetic rows when no CSV is given')
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        return
+    if args.input:
+        series = pd.read_csv(args.input, usecols=[args.column])[args.column]
+    else:
+        rng = np.random.default_rng(42)
+        samples = np.array([
+            'TATUAJE EN ANTEBRAZO DERECHO, "MARÍA"', 'Rosa; con espinas (color)', 'CORAZÓN-FLECHA',
+            'Leyenda: "Te amo mamá"', 'calavera  con   sombrero...', 'Águila / serpiente', None,
+            'NOMBRE "JOSÉ" EN MUÑECA IZQUIERDA', 'cruz cristiana en pecho', 'Virgen de Guadalupe',
+        ], dtype=object)
+        # Registries repeat descriptions heavily; mix in unique suffixes for the rest
+        series = pd.Series(samples[rng.integers(0, len(samples), args.rows)])
+        unique = rng.random(args.rows) < 0.3
+        series[unique] = series[unique].fillna('') + ' #' + pd.Series(np.arange(unique.sum())).astype(str).values
+    benchmark(series)
+
+
+if __name__ == "__main__":
+    main()